@@ -0,0 +1,6 @@
+"""
+Shared building blocks for the AFD pipeline processing scripts under scripts/.
+
+The package is copied into the custom container image (see the Dockerfile), so every
+processing step can import it next to the single script file SageMaker uploads.
+"""
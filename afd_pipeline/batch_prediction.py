@@ -0,0 +1,259 @@
+"""
+Sharded Amazon Fraud Detector batch predictions.
+
+A large input CSV is split, streaming, into shards sized so that every shard fits the batch prediction
+job limits and the shards spread over the allowed number of concurrent jobs. The shards are submitted
+as separate CreateBatchPredictionJob calls, never more at once than the job quota allows, and tracked
+together through one Waiter. Their output files are then merged back into one CSV in input order.
+Backfill time therefore grows with the number of waves of jobs, not with the size of the input.
+
+A manifest of the shards and their jobs is kept next to them, so an interrupted run resumes without
+resubmitting shards that already completed.
+"""
+import io
+import os
+import math
+
+import pandas as pd
+
+from afd_pipeline.scoring import error_code, RETRY_CODES
+from afd_pipeline.state import load_json, save_json
+from afd_pipeline.waiter import Waiter
+
+RUNNING_STATUSES = ['IN_PROGRESS_INITIALIZING', 'IN_PROGRESS', 'CANCEL_IN_PROGRESS']
+# errors of CreateBatchPredictionJob meaning "too many jobs right now", the shard is submitted again later
+QUOTA_CODES = RETRY_CODES | {'LimitExceededException', 'ServiceQuotaExceededException'}
+
+
+def _open(uri, mode='r'):
+    if '://' in uri:
+        import fsspec
+        return fsspec.open(uri, mode).open()
+    if 'w' in mode:
+        os.makedirs(os.path.dirname(os.path.abspath(uri)), exist_ok=True)
+    return open(uri, mode)
+
+
+def _list_csv(prefix):
+    """ CSV files under a prefix or directory, sorted """
+    if '://' in prefix:
+        import fsspec
+        fs, root = fsspec.core.url_to_fs(prefix)
+        protocol = prefix.split('://', 1)[0]
+        files = [f'{protocol}://{f}' for f in fs.find(root)]
+    else:
+        files = [os.path.join(d, f) for d, _, names in os.walk(prefix) for f in names]
+    return sorted(f for f in files if f.lower().endswith('.csv'))
+
+
+def _join(prefix, name):
+    return prefix.rstrip('/') + '/' + name
+
+
+def shard_rows(input_uri, max_rows, max_bytes, parallelism, sample_rows=10000):
+    """ Rows per shard: an even split of the estimated row count over parallelism jobs,
+        capped by the per-job row and byte limits
+    """
+    sample = pd.read_csv(input_uri, dtype=str, keep_default_na=False, nrows=sample_rows)
+    if sample.empty:
+        return max_rows
+    row_bytes = max(len(sample.to_csv(index=False).encode('utf-8')) / len(sample), 1)
+    if '://' in input_uri:
+        import fsspec
+        fs, path = fsspec.core.url_to_fs(input_uri)
+        size = fs.size(path)
+    else:
+        size = os.path.getsize(input_uri)
+    estimated_rows = size / row_bytes
+    by_bytes = int(max_bytes / row_bytes * 0.9)
+    return max(1, min(max_rows, by_bytes, math.ceil(estimated_rows / parallelism)))
+
+
+def _split_by_bytes(chunk, max_bytes):
+    """ Serialized pieces of a chunk, halved until each fits max_bytes """
+    body = chunk.to_csv(index=False)
+    if len(body.encode('utf-8')) <= max_bytes or len(chunk) == 1:
+        return [(chunk, body)]
+    half = len(chunk) // 2
+    return _split_by_bytes(chunk.iloc[:half], max_bytes) + _split_by_bytes(chunk.iloc[half:], max_bytes)
+
+
+class BatchPredictionManager(object):
+    """ Splits, submits, tracks and merges the shards of one batch prediction backfill
+        Args:
+            client: boto3 frauddetector client
+            detector_name (str): detector id
+            detector_version (str): detector version id
+            event_type (str): event type of the input events
+            role_arn (str): IAM role AFD reads the shards and writes the outputs with
+            work_uri (str): S3 prefix (or local directory) for the shards, outputs and manifest
+            job_prefix (str): prefix of the job ids, lowercase letters, digits and underscores
+            max_concurrent_jobs (int): batch prediction jobs running at once, the account quota
+            max_rows (int): events per shard at most
+            max_bytes (int): bytes per shard file at most
+            max_attempts (int): submissions of a shard in one run before its failure fails the run
+            waiter (Waiter): polls the jobs, a new one polling up to every minute when omitted
+    """
+    def __init__(self, client, detector_name, detector_version, event_type, role_arn, work_uri, job_prefix,
+                 max_concurrent_jobs=2, max_rows=100000, max_bytes=50 * 1024 * 1024, max_attempts=3, waiter=None):
+        self.client = client
+        self.detector_name = detector_name
+        self.detector_version = detector_version
+        self.event_type = event_type
+        self.role_arn = role_arn
+        self.work_uri = work_uri.rstrip('/')
+        self.job_prefix = job_prefix
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.concurrency = max_concurrent_jobs
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_attempts = max_attempts
+        self.waiter = waiter or Waiter(initial_delay=15, max_delay=60)
+        self.manifest_uri = _join(self.work_uri, 'manifest.json')
+        self.manifest = None
+
+    def _save(self):
+        save_json(self.manifest_uri, self.manifest)
+
+    def split(self, input_uri, event_id_column='EVENT_ID'):
+        """ Stream the input CSV into shard files, or pick up the manifest of an earlier split of it
+            Returns:
+                the shard entries of the manifest
+        """
+        manifest = load_json(self.manifest_uri)
+        if manifest is not None and manifest['input'] == input_uri:
+            print(f"Resuming {len(manifest['shards'])} shards from {self.manifest_uri}")
+            for shard in manifest['shards']:
+                # attempts only grows, it numbers the job ids and output prefixes of the shard; a resumed
+                # run gives failed shards a new retry budget, their next job gets the next number
+                if shard['status'] in ('FAILED', 'CANCELED'):
+                    shard.update(status='PENDING', retries_left=self.max_attempts)
+                else:
+                    shard.setdefault('retries_left', self.max_attempts - shard['attempts'])
+            self.manifest = manifest
+            return manifest['shards']
+
+        rows = shard_rows(input_uri, self.max_rows, self.max_bytes, self.max_concurrent_jobs)
+        shards = []
+        reader = pd.read_csv(input_uri, dtype=str, keep_default_na=False, chunksize=rows)
+        for chunk in reader:
+            for piece, body in _split_by_bytes(chunk, self.max_bytes):
+                i = len(shards)
+                shard_uri = _join(self.work_uri, f'input/shard-{i:05d}.csv')
+                with _open(shard_uri, 'w') as f:
+                    f.write(body)
+                shards.append({
+                    'index'   : i,
+                    'input'   : shard_uri,
+                    'output'  : None,
+                    'rows'    : len(piece),
+                    'job_id'  : None,
+                    'attempts': 0,
+                    'retries_left': self.max_attempts,
+                    'status'  : 'PENDING',
+                    'failure' : None
+                })
+        print(f'Split {input_uri} into {len(shards)} shards of up to {rows} rows')
+        self.manifest = {'input': input_uri, 'event_id_column': event_id_column, 'shards': shards}
+        self._save()
+        return shards
+
+    def _submit(self, shard):
+        job_id = f"{self.job_prefix}_{shard['index']:05d}_{shard['attempts']}"
+        # every attempt writes to its own prefix, so a failed attempt's partial output is never merged
+        output = _join(self.work_uri, f"output/shard-{shard['index']:05d}/{job_id}/")
+        try:
+            self.client.create_batch_prediction_job(jobId=job_id,
+                                                    inputPath=shard['input'],
+                                                    outputPath=output,
+                                                    eventTypeName=self.event_type,
+                                                    detectorName=self.detector_name,
+                                                    detectorVersion=self.detector_version,
+                                                    iamRoleArn=self.role_arn)
+        except Exception as e:
+            if error_code(e) in QUOTA_CODES:
+                # fewer jobs fit than configured; try again once one of the running jobs finishes
+                return False
+            raise
+        shard.update(job_id=job_id, output=output, status='IN_PROGRESS_INITIALIZING', attempts=shard['attempts'] + 1,
+                     retries_left=shard['retries_left'] - 1)
+        return True
+
+    def _step(self):
+        """ One poll of the waiter: refresh the running jobs, then fill the free job slots """
+        shards = self.manifest['shards']
+        for shard in shards:
+            if shard['status'] in RUNNING_STATUSES:
+                job = self.client.get_batch_prediction_jobs(jobId=shard['job_id'])['batchPredictions'][0]
+                shard['status'] = job['status']
+                if job['status'] in ('FAILED', 'CANCELED'):
+                    shard['failure'] = job.get('failureReason')
+                    print(f"Shard {shard['index']} job {shard['job_id']} {job['status']}: {shard['failure']}")
+                    if shard['retries_left'] > 0:
+                        shard['status'] = 'PENDING'
+
+        running = sum(s['status'] in RUNNING_STATUSES for s in shards)
+        for shard in shards:
+            if running >= self.concurrency:
+                break
+            if shard['status'] == 'PENDING':
+                if not self._submit(shard):
+                    self.concurrency = max(1, running)
+                    break
+                running += 1
+        if running and running == self.concurrency < self.max_concurrent_jobs:
+            # probe one more slot on the next poll, in case the quota was only hit transiently
+            self.concurrency += 1
+        self._save()
+
+        done = sum(s['status'] == 'COMPLETE' for s in shards)
+        if done == len(shards):
+            status = 'COMPLETE'
+        elif any(s['status'] in ('FAILED', 'CANCELED') for s in shards):
+            status = 'FAILED'
+        else:
+            status = f'{done}/{len(shards)} shards complete, {running} running'
+        return {'status': status, 'shards': shards}
+
+    def run(self, timeout=24 * 3600):
+        """ Submit every shard not completed yet and wait for all of them
+            Returns:
+                the shard entries of the manifest
+        """
+        if self.manifest is None:
+            raise ValueError('split() the input first')
+        response = self.waiter.wait_for(f"Batch prediction {self.job_prefix} ({len(self.manifest['shards'])} shards)",
+                                        poll=self._step, get_status=lambda r: r['status'],
+                                        success=['COMPLETE'], failure=['FAILED'], timeout=timeout)
+        return response['shards']
+
+    def merge(self, output_uri):
+        """ Concatenate the shard outputs into one CSV, shard by shard, in input order.
+            Rows of a shard output are put back in the order of the shard input by event id.
+            Returns:
+                number of rows written
+        """
+        column = self.manifest.get('event_id_column', 'EVENT_ID')
+        rows = 0
+        first = True
+        with _open(output_uri, 'w') as out:
+            for shard in self.manifest['shards']:
+                files = _list_csv(shard['output'])
+                if not files:
+                    raise FileNotFoundError(f"No output for shard {shard['index']} under {shard['output']}")
+                part = pd.concat([pd.read_csv(f, dtype=str, keep_default_na=False) for f in files], ignore_index=True)
+                match = [c for c in part.columns if c.upper() == column.upper()]
+                if match:
+                    order = pd.read_csv(shard['input'], dtype=str, keep_default_na=False, usecols=[column])[column]
+                    position = pd.Series(range(len(order)), index=order.to_numpy())
+                    position = position[~position.index.duplicated()]
+                    # rows whose event id is not in the shard input go last
+                    keys = position.reindex(part[match[0]].to_numpy()).fillna(len(order)).to_numpy()
+                    part = part.iloc[keys.argsort(kind='stable')]
+                buffer = io.StringIO()
+                part.to_csv(buffer, index=False, header=first)
+                out.write(buffer.getvalue())
+                rows += len(part)
+                first = False
+        print(f'Merged {rows} predictions of {len(self.manifest["shards"])} shards into {output_uri}')
+        return rows
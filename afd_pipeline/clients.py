@@ -0,0 +1,51 @@
+"""
+boto3 clients of a processing step, created on first use and shared by everything in the step.
+
+Creating a session loads the botocore data files and every client loads its service model, a good
+part of the start-up of a step. Created lazily, they are only paid for by steps that get as far as
+calling the service, and only once however many helpers use them.
+"""
+import threading
+
+
+class Clients(object):
+    """ Lazily created boto3 session and clients of one region
+        Args:
+            region (str): region of the session, None for the region of the environment
+            metrics (StepMetrics): records the API calls of every client, see afd_pipeline.metrics
+            session: boto3 Session to create the clients from, instead of a new one
+    """
+    def __init__(self, region=None, metrics=None, session=None):
+        self.region = region
+        self.metrics = metrics
+        self._session = session
+        self._clients = {}
+        self.lock = threading.Lock()
+        if session is not None and metrics is not None:
+            metrics.instrument(session)
+
+    def _get_session(self):
+        if self._session is None:
+            import boto3
+            self._session = boto3.Session(region_name=self.region)
+            if self.metrics is not None:
+                self.metrics.instrument(self._session)
+        return self._session
+
+    @property
+    def session(self):
+        with self.lock:
+            return self._get_session()
+
+    def client(self, service_name, **kwargs):
+        """ The client of a service, created on first use
+            Args:
+                service_name (str): e.g. 'frauddetector' or 's3'
+                kwargs: further arguments of Session.client, clients with different ones are kept apart
+        """
+        key = (service_name, tuple(sorted(kwargs.items())))
+        with self.lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = self._get_session().client(service_name, **kwargs)
+            return client
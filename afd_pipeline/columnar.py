@@ -0,0 +1,229 @@
+"""
+Typed, columnar copy of the training dataset.
+
+The AFD training data has to be a CSV file, which every consumer reparses into object columns.
+The typed copy keeps the same rows as Parquet: numeric columns are parsed once and loaded downcast
+to the smallest lossless type, and low-cardinality strings (customer_state, user_agent, ...) are stored
+dictionary-encoded and loaded as pandas categoricals. read_typed memory-maps local files.
+Codes written with leading zeros (customer_postal, ...) stay strings, since parsing them loses the zeros.
+"""
+import os
+import re
+
+import pandas as pd
+
+
+def downcast(s):
+    """ Smallest integer type holding an integer column, float32 for a float column it represents exactly """
+    if pd.api.types.is_bool_dtype(s.dtype) or not pd.api.types.is_numeric_dtype(s.dtype):
+        return s
+    if pd.api.types.is_integer_dtype(s.dtype):
+        return pd.to_numeric(s, downcast='integer')
+    narrow = s.astype('float32')
+    same = (narrow.astype('float64') == s) | s.isna()
+    return narrow if same.all() else s.astype('float64')
+
+
+# integers written with a leading zero or sign, e.g. the zip code 02134, do not survive a round trip through a number
+_PADDED = re.compile(r'^\s*[+-]?0\d|^\s*\+')
+
+
+def to_number(s):
+    """ A column of strings parsed to numbers, None when a value does not parse or would not be written
+        back the same way
+    """
+    try:
+        # raises at the first value that does not parse, so text columns are rejected quickly
+        numbers = pd.to_numeric(s)
+    except (ValueError, TypeError):
+        return None
+    if s.dtype == object and s.dropna().astype(str).str.contains(_PADDED).any():
+        return None
+    return numbers
+
+
+def compact_column(s, category_ratio=0.5):
+    """ Parse a column of strings to numbers when every value parses without loss, otherwise store it
+        as a categorical when it has at most category_ratio distinct values per row
+    """
+    if not (s.dtype == object or pd.api.types.is_string_dtype(s.dtype)):
+        return downcast(s)
+    numbers = to_number(s)
+    if numbers is not None:
+        return downcast(numbers)
+    codes, uniques = pd.factorize(s)
+    if len(uniques) <= category_ratio * len(s):
+        return pd.Series(pd.Categorical.from_codes(codes, uniques), index=s.index, name=s.name)
+    return s
+
+
+def compact_frame(df, category_ratio=0.5):
+    """ Apply compact_column to every column of a DataFrame """
+    return pd.DataFrame({c: compact_column(df[c], category_ratio) for c in df.columns}, index=df.index)
+
+
+def _column_type(s):
+    """ Arrow type a compacted column is written as. Integers and floats are kept at full width, as a
+        later chunk may not fit the type the first one downcasts to; read_typed downcasts them on load.
+    """
+    import pyarrow as pa
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return pa.dictionary(pa.int32(), pa.string())
+    if pd.api.types.is_bool_dtype(s.dtype):
+        return pa.bool_()
+    if pd.api.types.is_integer_dtype(s.dtype):
+        return pa.int64()
+    if pd.api.types.is_float_dtype(s.dtype):
+        return pa.float64()
+    if s.dtype == object or pd.api.types.is_string_dtype(s.dtype):
+        return pa.string()
+    return pa.Array.from_pandas(s).type
+
+
+class TypeDrift(ValueError):
+    """ A chunk does not fit the type the earlier chunks settled for a column """
+
+
+def _column_array(s, arrow_type):
+    """ A column of a chunk as an array of the type fixed by the earlier chunks """
+    import pyarrow as pa
+    if pa.types.is_dictionary(arrow_type) or pa.types.is_string(arrow_type):
+        values = pa.array(s.astype(object).where(s.isna(), s.astype(str)), type=pa.string(), from_pandas=True)
+        return values.dictionary_encode() if pa.types.is_dictionary(arrow_type) else values
+    if pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type):
+        numbers = to_number(s)
+        try:
+            if numbers is not None:
+                return pa.array(numbers, type=arrow_type, from_pandas=True)
+        except (ValueError, TypeError, pa.ArrowInvalid):
+            pass
+        raise TypeDrift(f'column {s.name} does not fit {arrow_type}')
+    return pa.array(s, type=arrow_type, from_pandas=True)
+
+
+class TypedCopyWriter(object):
+    """ Builds the typed copy from the chunks a CSV is streamed in.
+        The column types are settled on the first chunk: columns that parse as numbers are numeric and
+        strings with at most category_ratio distinct values per row are dictionary-encoded. Every chunk
+        is then written as a row group of that schema as it arrives, so memory stays at one chunk.
+        A numeric column a later chunk does not fit (a zip code "A1B" after 5-digit ones) is widened
+        to strings, rewriting the row groups already written.
+        Args:
+            path (str or Path): Parquet file to write
+            category_ratio (float): distinct values per row at or below which strings become categoricals
+    """
+    def __init__(self, path, category_ratio=0.5):
+        self.path = path
+        self.category_ratio = category_ratio
+        self.schema = None
+        self.writer = None
+        self.rows = 0
+        self.memory = 0
+        self.widened = []
+
+    def _open(self, schema):
+        import pyarrow.parquet as pq
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.schema = schema
+        self.writer = pq.ParquetWriter(str(self.path), schema, compression='snappy')
+
+    def _widen(self, names):
+        """ Turn numeric columns into strings, in the schema and in the row groups already written """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.writer.close()
+        written = f'{self.path}.widen'
+        os.replace(str(self.path), written)
+        schema = self.schema
+        for name in names:
+            schema = schema.set(schema.get_field_index(name), pa.field(name, pa.string()))
+        self._open(schema)
+        self.memory = 0
+        source = pq.ParquetFile(written)
+        for i in range(source.num_row_groups):
+            table = source.read_row_group(i).cast(schema)
+            self.writer.write_table(table)
+            self.memory += table.nbytes
+        source.close()
+        os.remove(written)
+        self.widened += names
+        print(f'Typed copy: columns {names} widened to strings')
+
+    def append(self, chunk):
+        import pyarrow as pa
+        chunk = chunk.reset_index(drop=True)
+        if self.writer is None:
+            first = compact_frame(chunk, self.category_ratio)
+            self._open(pa.schema([(str(c), _column_type(first[c])) for c in first.columns]))
+        arrays, drifted = [], []
+        for c, t in zip(chunk.columns, self.schema.types):
+            try:
+                arrays.append(_column_array(chunk[c], t))
+            except TypeDrift:
+                drifted.append(str(c))
+        if drifted:
+            self._widen(drifted)
+            arrays = [_column_array(chunk[c], t) for c, t in zip(chunk.columns, self.schema.types)]
+        table = pa.Table.from_arrays(arrays, schema=self.schema)
+        self.writer.write_table(table)
+        self.rows += len(chunk)
+        self.memory += table.nbytes
+
+    def close(self):
+        """ Finish the file
+            Returns:
+                dict with the rows, in-memory (Arrow) bytes of the typed data, the file size and the
+                columns widened to strings
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if self.writer is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            pq.write_table(pa.table({}), str(self.path), compression='snappy')
+        else:
+            self.writer.close()
+            self.writer = None
+        return {
+            'rows'      : self.rows,
+            'memory'    : int(self.memory),
+            'file_bytes': os.path.getsize(self.path),
+            'widened'   : list(self.widened)
+        }
+
+    def abort(self):
+        """ Give up on the copy: close the writer and remove what was written """
+        if self.writer is not None:
+            try:
+                self.writer.close()
+            except Exception:
+                pass
+            self.writer = None
+        for path in (str(self.path), f'{self.path}.widen'):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def write_typed(df, path, category_ratio=0.5):
+    """ Write the typed copy of an in-memory DataFrame, see TypedCopyWriter """
+    writer = TypedCopyWriter(path, category_ratio)
+    writer.append(df)
+    return writer.close()
+
+
+def read_typed(path, columns=None):
+    """ Load a typed copy, memory-mapping local files; categoricals come back as pandas categoricals
+        Args:
+            path (str): local path or s3:// uri of the Parquet file
+            columns (list): columns to load, all when omitted
+    """
+    import pyarrow.parquet as pq
+    if '://' in str(path):
+        import fsspec
+        with fsspec.open(path, 'rb') as f:
+            df = pq.read_table(f, columns=columns).to_pandas()
+    else:
+        df = pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+    # numerics are stored at full width, see TypedCopyWriter
+    for c in df.columns:
+        df[c] = downcast(df[c])
+    return df
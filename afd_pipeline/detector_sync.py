@@ -0,0 +1,145 @@
+"""
+Diff-based synchronization of Amazon Fraud Detector outcomes and rules.
+
+Existing outcomes and rules are read once with paginated bulk calls into an in-memory index,
+the desired state is compared against it, and only the differences are written, concurrently.
+A detector setup where nothing changed costs two list calls, however many rules there are.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# One planned change: action is 'create', 'update' or 'unchanged'; current is the existing detail or None
+RuleChange = namedtuple('RuleChange', ['action', 'rule_id', 'expression', 'outcomes', 'current'])
+
+
+def paginate(call, result_key, **kwargs):
+    """ Collect every page of a nextToken-paginated frauddetector list call
+        Args:
+            call (callable): client method, e.g. client.get_rules
+            result_key (str): key of the list in each response
+            kwargs: request parameters
+    """
+    items = []
+    token = None
+    while True:
+        params = dict(kwargs, nextToken=token) if token else kwargs
+        response = call(**params)
+        items.extend(response.get(result_key, []))
+        token = response.get('nextToken')
+        if not token:
+            return items
+
+
+def load_outcomes(client):
+    """ Returns:
+            dict of outcome name to outcome detail
+    """
+    return {o['name']: o for o in paginate(client.get_outcomes, 'outcomes', maxResults=100)}
+
+
+def load_rules(client, detector_id):
+    """ Index the latest version of every rule of a detector
+        Returns:
+            dict of rule id to the rule detail of its highest version
+    """
+    index = {}
+    for detail in paginate(client.get_rules, 'ruleDetails', detectorId=detector_id, maxResults=100):
+        current = index.get(detail['ruleId'])
+        if current is None or int(detail['ruleVersion']) > int(current['ruleVersion']):
+            index[detail['ruleId']] = detail
+    return index
+
+
+def _run(fn, items, workers):
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(fn, items))
+
+
+def sync_outcomes(client, outcome_list, workers=8):
+    """ Create missing outcomes and update changed descriptions
+        Args:
+            outcome_list (list): dicts with the outcome name and desc
+        Returns:
+            names of the outcomes that were written
+    """
+    existing = load_outcomes(client)
+    changed = [o for o in outcome_list
+               if o['name'] not in existing or existing[o['name']].get('description', '') != o.get('desc', '')]
+    for o in outcome_list:
+        if o not in changed:
+            print(f"Outcome {o['name']} already exists ...")
+    _run(lambda o: client.put_outcome(name=o['name'], description=o.get('desc', '')), changed, workers)
+    for o in changed:
+        print(f"Outcome {o['name']} {'updated' if o['name'] in existing else 'created'}")
+    return [o['name'] for o in changed]
+
+
+class RuleSync(object):
+    """ Brings the rules of a detector in line with a desired rule set
+        Args:
+            client: frauddetector client
+            detector_id (str): detector name
+            language (str): rule language
+            workers (int): number of concurrent create/update calls
+    """
+    def __init__(self, client, detector_id, language='DETECTORPL', workers=8):
+        self.client = client
+        self.detector_id = detector_id
+        self.language = language
+        self.workers = workers
+
+    def plan(self, desired):
+        """ Diff the desired rules against the detector
+            Args:
+                desired (list): dicts with ruleId, expression and outcomes, in detector order
+            Returns:
+                list of RuleChange, in the order of desired
+        """
+        index = load_rules(self.client, self.detector_id)
+        changes = []
+        for rule in desired:
+            current = index.get(rule['ruleId'])
+            if current is None:
+                action = 'create'
+            elif (current.get('expression') == rule['expression'] and list(current.get('outcomes', [])) == list(rule['outcomes'])
+                  and current.get('language', self.language) == self.language):
+                action = 'unchanged'
+            else:
+                action = 'update'
+            changes.append(RuleChange(action, rule['ruleId'], rule['expression'], list(rule['outcomes']), current))
+        return changes
+
+    def _apply_one(self, change):
+        if change.action == 'unchanged':
+            return change.current['ruleVersion']
+        if change.action == 'create':
+            response = self.client.create_rule(ruleId=change.rule_id,
+                                               detectorId=self.detector_id,
+                                               expression=change.expression,
+                                               language=self.language,
+                                               outcomes=change.outcomes)
+        else:
+            response = self.client.update_rule_version(rule={
+                                                           'detectorId': self.detector_id,
+                                                           'ruleId': change.rule_id,
+                                                           'ruleVersion': change.current['ruleVersion']
+                                                       },
+                                                       expression=change.expression,
+                                                       language=self.language,
+                                                       outcomes=change.outcomes)
+        return response['rule']['ruleVersion']
+
+    def apply(self, changes):
+        """ Write the planned creates and updates concurrently
+            Returns:
+                the rule list for create_detector_version, in the order of changes
+        """
+        for c in changes:
+            print(f"Rule {c.rule_id}: {c.action} - IF {c.expression} THEN {','.join(c.outcomes)}")
+        versions = _run(self._apply_one, changes, self.workers)
+        return [{'ruleId': c.rule_id, 'ruleVersion': v, 'detectorId': self.detector_id} for c, v in zip(changes, versions)]
+
+    def sync(self, desired):
+        return self.apply(self.plan(desired))
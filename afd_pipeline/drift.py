@@ -0,0 +1,303 @@
+"""
+Drift of live events against the training data, from fixed-size sketches.
+
+A baseline is built from the training data in one streaming pass. For every event variable it keeps
+the null rate and either a histogram over quantile bins (NUMERIC) or the frequencies of the most
+common values with the rest pooled into one bucket (CATEGORY; EMAIL_ADDRESS and IP_ADDRESS are
+sketched by email domain and /16 network). Live events are then counted into the same bins, chunk by
+chunk, so the state of a monitor is a few counters per feature and batch of events. The counters are
+kept per batch for a rolling window of the latest batches, and counting a batch again replaces its
+counters. The report gives the population stability index (PSI) of every feature, the
+Kolmogorov-Smirnov distance of the numeric ones and the change in null rate, over the window and over
+the latest batch, and flags the features over threshold.
+"""
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from afd_pipeline.profiling import feature_types as classify_types
+
+# columns of the training data that are not event variables
+RESERVED_COLUMNS = ['EVENT_LABEL', 'EVENT_TIMESTAMP', 'LABEL_TIMESTAMP', 'EVENT_ID', 'ENTITY_ID', 'ENTITY_TYPE']
+SKETCHED_TYPES = ['NUMERIC', 'CATEGORY', 'EMAIL_ADDRESS', 'IP_ADDRESS']
+
+# floor of a bin fraction in the PSI, so an empty bin does not make it infinite
+PSI_EPSILON = 1e-4
+
+# latest batches of events the monitor state keeps the counters of
+WINDOW_BATCHES = 30
+
+
+def feature_types(df_stats):
+    """ Feature type of every event variable of a data_profiler summary statistics frame """
+    return {n: t for n, t in zip(df_stats['feature_name'], df_stats['feature_type'])
+            if n not in RESERVED_COLUMNS and t in SKETCHED_TYPES}
+
+
+def sketch_values(s, feature_type):
+    """ Non-null values of a column in the form they are counted in: floats for NUMERIC,
+        strings for CATEGORY, the domain of an email address and the first two octets of an IP address
+    """
+    s = s.dropna()
+    if feature_type == 'NUMERIC':
+        values = pd.to_numeric(s, errors='coerce').to_numpy(dtype='float64')
+        return values[~np.isnan(values)]
+    s = s.astype(str)
+    if feature_type == 'EMAIL_ADDRESS':
+        s = s.str.rsplit('@', n=1).str[-1].str.lower()
+    elif feature_type == 'IP_ADDRESS':
+        s = s.str.extract(r'^([^.:]*[.:][^.:]*)', expand=False).fillna(s)
+    return s.to_numpy(dtype=object)
+
+
+class _NumericBuilder(object):
+    """ Reservoir sample of a numeric column, the bin edges are its quantiles """
+    def __init__(self, sample_size, rng):
+        self.sample = np.empty(sample_size, dtype='float64')
+        self.seen = 0
+        self.rng = rng
+
+    def update(self, values):
+        size = len(self.sample)
+        fill = min(max(size - self.seen, 0), len(values))
+        self.sample[self.seen:self.seen + fill] = values[:fill]
+        rest = values[fill:]
+        if len(rest):
+            # algorithm R, vectorized: the i-th value seen replaces a random slot with probability size / i
+            slots = (self.rng.random(len(rest)) * (self.seen + fill + np.arange(1, len(rest) + 1))).astype(np.int64)
+            keep = slots < size
+            self.sample[slots[keep]] = rest[keep]
+        self.seen += len(values)
+
+    def finish(self, bins):
+        sample = self.sample[:min(self.seen, len(self.sample))]
+        if len(sample) == 0:
+            return {'edges': [], 'expected': [1.0]}
+        edges = np.unique(np.quantile(sample, np.linspace(0, 1, bins + 1)[1:-1]))
+        counts = np.bincount(np.searchsorted(edges, sample, side='right'), minlength=len(edges) + 1)
+        return {'edges': edges.tolist(), 'expected': (counts / counts.sum()).tolist()}
+
+
+class _CategoryBuilder(object):
+    """ Misra-Gries frequent values of a categorical column, kept to at most capacity counters """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = pd.Series([], dtype='int64')
+        self.total = 0
+
+    def update(self, values):
+        self.total += len(values)
+        counts = self.counts.add(pd.Series(values).value_counts(sort=False), fill_value=0).astype('int64')
+        if len(counts) > self.capacity:
+            # subtracting the (capacity + 1)-th largest count bounds every undercount by total / capacity
+            floor = counts.nlargest(self.capacity + 1).iloc[-1]
+            counts = counts[counts > floor] - floor
+        self.counts = counts
+
+    def finish(self, top):
+        counts = self.counts.sort_values(ascending=False, kind='mergesort').iloc[:top]
+        if self.total == 0:
+            return {'categories': [], 'expected': [1.0]}
+        expected = (counts / self.total).tolist()
+        # the last bucket holds every value outside the top categories
+        return {'categories': counts.index.tolist(), 'expected': expected + [max(0.0, 1.0 - sum(expected))]}
+
+
+class BaselineBuilder(object):
+    """ Builds the drift baseline of a training dataset streamed in chunks
+        Args:
+            feature_types (dict): column -> feature type, see feature_types(); inferred from the first chunk when omitted
+            bins (int): quantile bins of a numeric feature
+            top_categories (int): categories of a categorical feature counted on their own
+            sample_size (int): reservoir the bin edges of a numeric feature are computed from
+            capacity (int): counters of the frequent value sketch of a categorical feature
+            seed (int): seed of the reservoir sampling
+    """
+    def __init__(self, feature_types=None, bins=20, top_categories=50, sample_size=100000, capacity=2000, seed=0):
+        self.types = dict(feature_types) if feature_types is not None else None
+        self.bins = bins
+        self.top_categories = top_categories
+        self.sample_size = sample_size
+        self.capacity = capacity
+        self.rng = np.random.default_rng(seed)
+        self.rows = 0
+        self.nulls = {}
+        self.builders = {}
+
+    def update(self, chunk):
+        if self.types is None:
+            # classified like the training statistics of data_profiler, which uses the same rules
+            self.types = {c: t for c, t in zip(chunk.columns, classify_types(chunk.columns, chunk.dtypes))
+                          if c not in RESERVED_COLUMNS and t in SKETCHED_TYPES}
+        self.rows += len(chunk)
+        for col, ftype in self.types.items():
+            if col not in self.builders:
+                self.nulls[col] = 0
+                self.builders[col] = _NumericBuilder(self.sample_size, self.rng) if ftype == 'NUMERIC' \
+                    else _CategoryBuilder(self.capacity)
+            if col not in chunk.columns:
+                self.nulls[col] += len(chunk)
+                continue
+            values = sketch_values(chunk[col], ftype)
+            self.nulls[col] += len(chunk) - len(values)
+            self.builders[col].update(values)
+        return self
+
+    def finish(self):
+        """ Returns:
+                the baseline document, JSON serializable
+        """
+        features = {}
+        for col, builder in self.builders.items():
+            if isinstance(builder, _NumericBuilder):
+                feature = builder.finish(self.bins)
+            else:
+                feature = builder.finish(self.top_categories)
+            feature.update(type=self.types[col], null_rate=self.nulls[col] / self.rows if self.rows else 0.0)
+            features[col] = feature
+        return {'version': 1, 'rows': self.rows, 'features': features}
+
+
+def build_baseline(chunks, feature_types=None, **kwargs):
+    """ Baseline of the training data in an iterable of chunks, see BaselineBuilder """
+    builder = BaselineBuilder(feature_types, **kwargs)
+    for chunk in chunks:
+        builder.update(chunk)
+    return builder.finish()
+
+
+def baseline_id(baseline):
+    """ Short digest of a baseline, monitor state is only carried over between runs against the same one """
+    return hashlib.sha256(json.dumps(baseline, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def psi(expected, actual, epsilon=PSI_EPSILON):
+    """ Population stability index of two bin fractions arrays """
+    e = np.clip(np.asarray(expected, dtype='float64'), epsilon, None)
+    a = np.clip(np.asarray(actual, dtype='float64'), epsilon, None)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def ks_distance(expected, actual):
+    """ Largest gap between the cumulative distributions of two bin fractions arrays, i.e. the KS statistic at the bin edges """
+    return float(np.max(np.abs(np.cumsum(expected) - np.cumsum(actual))))
+
+
+class DriftMonitor(object):
+    """ Counts a batch of live events into the bins of a baseline
+        Args:
+            baseline (dict): see BaselineBuilder.finish
+            state (dict): counters of the batches of earlier runs, see to_dict; ignored when they were
+                          counted against another baseline
+            batch (str): id of the batch this monitor counts, e.g. a digest of the input; counters of the
+                         same batch in state are replaced, so counting a batch again does not add it twice
+            window (int): latest batches kept in the state and summed in the report
+    """
+    def __init__(self, baseline, state=None, batch='latest', window=WINDOW_BATCHES):
+        self.baseline = baseline
+        self.baseline_id = baseline_id(baseline)
+        self.features = baseline['features']
+        self.edges = {c: np.asarray(f['edges'], dtype='float64') for c, f in self.features.items() if f['type'] == 'NUMERIC'}
+        self.categories = {c: pd.Index(f['categories']) for c, f in self.features.items() if f['type'] != 'NUMERIC'}
+        self.batch = batch
+        self.window = window
+        self.rows = 0
+        self.nulls = {c: 0 for c in self.features}
+        self.counts = {c: np.zeros(len(f['expected']), dtype='int64') for c, f in self.features.items()}
+        # counters of the earlier batches, oldest first
+        self.batches = {}
+        if state is not None and state.get('baseline') == self.baseline_id:
+            self.batches = {b: counters for b, counters in state.get('batches', {}).items() if b != batch}
+
+    def update(self, chunk):
+        """ Count a chunk of events, a DataFrame with the event variables as columns """
+        self.rows += len(chunk)
+        for col, feature in self.features.items():
+            if col not in chunk.columns:
+                self.nulls[col] += len(chunk)
+                continue
+            values = sketch_values(chunk[col], feature['type'])
+            self.nulls[col] += len(chunk) - len(values)
+            if feature['type'] == 'NUMERIC':
+                idx = np.searchsorted(self.edges[col], values, side='right')
+            else:
+                idx = self.categories[col].get_indexer(values)
+                idx[idx < 0] = len(self.categories[col])
+            self.counts[col] += np.bincount(idx, minlength=len(self.counts[col]))
+        return self
+
+    def merge(self, other):
+        """ Add the counters of a monitor of the same baseline and batch, e.g. one per processing instance """
+        self.rows += other.rows
+        for col in self.features:
+            self.counts[col] += other.counts[col]
+            self.nulls[col] += other.nulls[col]
+        return self
+
+    def to_dict(self):
+        """ JSON serializable counters of the batches in the window, this monitor's batch last """
+        batches = dict(self.batches)
+        batches[self.batch] = {
+            'rows'  : self.rows,
+            'nulls' : dict(self.nulls),
+            'counts': {c: v.tolist() for c, v in self.counts.items()}
+        }
+        return {'baseline': self.baseline_id, 'batches': dict(list(batches.items())[-self.window:])}
+
+    def report(self, psi_threshold=0.2, ks_threshold=0.1, null_threshold=0.1, min_rows=1000):
+        """ Drift of every feature and the overall verdict, over the batches in the window
+            Args:
+                psi_threshold (float): PSI above which a feature has drifted, 0.1-0.2 is a moderate and
+                                       over 0.2 a significant shift by the usual rule of thumb
+                ks_threshold (float): KS distance above which a numeric feature has drifted
+                null_threshold (float): change of null rate above which a feature has drifted
+                min_rows (int): events needed before drift is reported
+            Returns:
+                dict with the status (OK, DRIFT or INSUFFICIENT_DATA), max_psi, drift_detected (1 or 0, for a
+                pipeline condition), the drifted features and the per-feature metrics of the window and the
+                number of batches in it, with the same figures for this monitor's batch alone under 'batch'
+        """
+        batches = list(self.to_dict()['batches'].values())
+        rows = sum(b['rows'] for b in batches)
+        nulls = {c: sum(b['nulls'][c] for b in batches) for c in self.features}
+        counts = {c: np.sum([b['counts'][c] for b in batches], axis=0, dtype='int64') for c in self.features}
+        thresholds = (psi_threshold, ks_threshold, null_threshold, min_rows)
+        report = self._report(rows, nulls, counts, *thresholds)
+        report['batches'] = len(batches)
+        report['batch'] = dict(self._report(self.rows, self.nulls, self.counts, *thresholds), id=self.batch)
+        return report
+
+    def _report(self, rows, nulls, counts, psi_threshold, ks_threshold, null_threshold, min_rows):
+        features = {}
+        drifted = []
+        for col, feature in self.features.items():
+            total = counts[col].sum()
+            actual = counts[col] / total if total else np.zeros(len(counts[col]))
+            metrics = {
+                'type'              : feature['type'],
+                'psi'               : round(psi(feature['expected'], actual), 4) if total else None,
+                'ks'                : round(ks_distance(feature['expected'], actual), 4) if total and feature['type'] == 'NUMERIC' else None,
+                'null_rate_expected': round(feature['null_rate'], 4),
+                'null_rate_actual'  : round(nulls[col] / rows, 4) if rows else None
+            }
+            if rows and ((metrics['psi'] is not None and metrics['psi'] > psi_threshold) or
+                         (metrics['ks'] is not None and metrics['ks'] > ks_threshold) or
+                         abs(metrics['null_rate_actual'] - metrics['null_rate_expected']) > null_threshold):
+                drifted.append(col)
+            features[col] = metrics
+
+        max_psi = max([m['psi'] for m in features.values() if m['psi'] is not None], default=0.0)
+        if rows < min_rows:
+            status = 'INSUFFICIENT_DATA'
+        else:
+            status = 'DRIFT' if drifted else 'OK'
+        return {
+            'status'          : status,
+            'rows'            : rows,
+            'max_psi'         : max_psi,
+            'drift_detected'  : int(status == 'DRIFT'),
+            'drifted_features': drifted if status != 'INSUFFICIENT_DATA' else [],
+            'features'        : features
+        }
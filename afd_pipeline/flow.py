@@ -0,0 +1,625 @@
+"""
+Local, chunked execution of SageMaker Data Wrangler .flow files.
+
+Runs the operators this project's flows use (S3/CSV source, infer_and_cast_type, handle_missing,
+manage_columns and custom_pandas) over a stream of pandas chunks, so a flow can be applied to
+daily-sized data without a Spark processing cluster and with memory bounded by the chunk size.
+
+Operators that need the whole dataset (joins, imputation with a median, ...) are rejected with
+UnsupportedOperator, and those flows still have to run as a Data Wrangler job.
+
+By default the node chain is compiled into a Plan first: source columns that are dropped before
+anything reads them are not read, the type casts are pushed into the reader and consecutive
+Fill missing nodes run as one fillna. Plan.explain() shows the result.
+"""
+import os
+import re
+import json
+import time
+import builtins
+import types
+
+import numpy as np
+import pandas as pd
+
+
+class UnsupportedOperator(ValueError):
+    """ The flow uses an operator, or operator mode, the local executor cannot run chunk by chunk """
+
+
+def load_flow(flow):
+    """ Parse a .flow file (local path or s3:// uri) or pass through an already parsed flow """
+    if isinstance(flow, dict):
+        return flow
+    if '://' in str(flow):
+        import fsspec
+        with fsspec.open(flow, 'r') as f:
+            return json.load(f)
+    with open(flow) as f:
+        return json.load(f)
+
+
+#----- operators
+class Operator(object):
+    """ One flow node. apply() is called once per chunk, in input order """
+    def __init__(self, node):
+        self.node = node
+        self.node_id = node['node_id']
+        self.params = node.get('parameters', {})
+
+    def apply(self, df):
+        raise NotImplementedError
+
+    def describe(self):
+        return self.node['operator']
+
+
+_LONG = re.compile(r'^\s*[+-]?\d+\s*$')
+_FLOAT = re.compile(r'^\s*[+-]?(\d+\.?\d*([eE][+-]?\d+)?|\.\d+([eE][+-]?\d+)?|nan|inf|infinity)\s*$', re.IGNORECASE)
+_BOOL = {'true': True, 'false': False}
+
+
+def infer_type(values, threshold=1.0):
+    """ Data Wrangler type of a column of strings: long, float, bool or string.
+        A type is picked when at least threshold of the non-null values parse as it.
+    """
+    values = values.dropna().astype(str)
+    if values.empty:
+        return 'string'
+    n = len(values)
+    if values.str.match(_LONG).sum() >= threshold * n:
+        return 'long'
+    if values.str.match(_FLOAT).sum() >= threshold * n:
+        return 'float'
+    if values.str.strip().str.lower().isin(_BOOL).sum() >= threshold * n:
+        return 'bool'
+    return 'string'
+
+
+def cast_column(values, dtype):
+    """ Cast a column to a Data Wrangler type; values that do not parse become missing """
+    if dtype == 'long':
+        numbers = pd.to_numeric(values, errors='coerce')
+        numbers = numbers.where(numbers == np.floor(numbers))
+        return numbers.astype('Int64')
+    if dtype == 'float':
+        return pd.to_numeric(values, errors='coerce').astype('float64')
+    if dtype == 'bool':
+        return values.astype(str).str.strip().str.lower().map(_BOOL).astype('boolean')
+    return values.where(values.isna(), values.astype(str)).astype(object)
+
+
+class InferAndCastType(Operator):
+    """ Infers the column types from the first chunk, the way Data Wrangler infers them from a
+        sample, and casts every chunk to those types
+    """
+    def __init__(self, node, threshold=1.0):
+        super().__init__(node)
+        self.threshold = threshold
+        self.types = None
+
+    def apply(self, df):
+        if self.types is None:
+            self.types = {c: infer_type(df[c], self.threshold) for c in df.columns}
+        return pd.DataFrame({c: cast_column(df[c], self.types.get(c, 'string')) for c in df.columns}, index=df.index)
+
+    def describe(self):
+        return 'infer_and_cast_type'
+
+
+def fill_value_for(values, fill_value):
+    """ Convert a Fill missing value (always a string in the flow) to the column's type """
+    if pd.api.types.is_bool_dtype(values.dtype):
+        return str(fill_value).strip().lower() == 'true'
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return int(float(fill_value))
+    if pd.api.types.is_float_dtype(values.dtype):
+        return float(fill_value)
+    return fill_value
+
+
+class HandleMissing(Operator):
+    """ handle_missing: Fill missing and Drop missing """
+    def __init__(self, node):
+        super().__init__(node)
+        self.operator = self.params.get('operator')
+        if self.operator == 'Fill missing':
+            p = self.params['fill_missing_parameters']
+            self.column, self.fill_value = p['input_column'], p['fill_value']
+            self.output_column = p.get('output_column') or self.column
+        elif self.operator == 'Drop missing':
+            self.column = self.params.get('drop_missing_parameters', {}).get('input_column')
+        else:
+            raise UnsupportedOperator(f'handle_missing operator {self.operator!r} needs the whole dataset')
+
+    def apply(self, df):
+        if self.operator == 'Drop missing':
+            return df.dropna(subset=[self.column] if self.column else None)
+        values = df[self.column]
+        try:
+            fill_value = fill_value_for(values, self.fill_value)
+        except ValueError:
+            # a fill value that is not of the column's type turns the column into strings
+            values = cast_column(values, 'string')
+            fill_value = self.fill_value
+        df = df.copy()
+        df[self.output_column] = values.fillna(fill_value)
+        return df
+
+    def describe(self):
+        return f'{self.operator} {self.column}'
+
+
+class ManageColumns(Operator):
+    """ manage_columns: Rename, Drop, Duplicate and Move column """
+    def __init__(self, node):
+        super().__init__(node)
+        self.operator = self.params.get('operator')
+        if self.operator not in ('Rename column', 'Drop column', 'Duplicate column', 'Move column'):
+            raise UnsupportedOperator(f'manage_columns operator {self.operator!r} is not supported')
+
+    def apply(self, df):
+        if self.operator == 'Rename column':
+            p = self.params['rename_column_parameters']
+            return df.rename(columns={p['input_column']: p['new_name']})
+        if self.operator == 'Drop column':
+            return df.drop(columns=_dropped_columns(self))
+        if self.operator == 'Duplicate column':
+            p = self.params['duplicate_column_parameters']
+            return df.assign(**{p['new_name']: df[p['input_column']]})
+        p = self.params['move_column_parameters']
+        columns = [c for c in df.columns if c != p['column_to_move']]
+        if p.get('move_type') == 'Move to start':
+            columns = [p['column_to_move']] + columns
+        elif p.get('move_type') in ('Move after', 'Move before'):
+            pos = columns.index(p['target_column']) + (1 if p['move_type'] == 'Move after' else 0)
+            columns = columns[:pos] + [p['column_to_move']] + columns[pos:]
+        else:
+            columns = columns + [p['column_to_move']]
+        return df[columns]
+
+    def describe(self):
+        return self.operator
+
+
+class _FrozenPandas(types.ModuleType):
+    """ pandas with 'now' pinned to the start of the run, so code like pd.to_datetime('now')
+        gives every chunk the single value the Spark job computes once
+    """
+    def __init__(self, now):
+        super().__init__('pandas')
+        self._now = now
+
+    def __getattr__(self, name):
+        return getattr(pd, name)
+
+    def to_datetime(self, arg, *args, **kwargs):
+        if isinstance(arg, str) and arg.strip().lower() == 'now':
+            return self._now
+        return pd.to_datetime(arg, *args, **kwargs)
+
+
+class CustomPandas(Operator):
+    """ custom_pandas: runs the node's code with the chunk as `df`.
+        The code must be row-local (no aggregations across rows), which holds for this project's flows.
+    """
+    def __init__(self, node, now=None):
+        super().__init__(node)
+        self.code = compile(self.params['code'], f'<custom_pandas {self.node_id}>', 'exec')
+        frozen = _FrozenPandas(now if now is not None else pd.Timestamp.utcnow().tz_localize(None))
+
+        def _import(name, *args, **kwargs):
+            return frozen if name == 'pandas' else builtins.__import__(name, *args, **kwargs)
+
+        self.builtins = dict(vars(builtins), __import__=_import)
+        self.frozen = frozen
+
+    def apply(self, df):
+        namespace = {'__builtins__': self.builtins, 'pd': self.frozen, 'np': np, 'df': df.copy()}
+        exec(self.code, namespace)
+        return namespace['df']
+
+    def describe(self):
+        return 'custom_pandas'
+
+
+OPERATORS = {
+    'sagemaker.spark.infer_and_cast_type_0.1': InferAndCastType,
+    'sagemaker.spark.handle_missing_0.1'     : HandleMissing,
+    'sagemaker.spark.manage_columns_0.1'     : ManageColumns,
+    'sagemaker.spark.custom_pandas_0.1'      : CustomPandas
+}
+
+SOURCE_OPERATORS = ('sagemaker.s3_source_0.1',)
+
+
+#----- graph
+def source_definition(node):
+    """ (name, s3 uri, content type, has header) of a source node """
+    data_def = node['parameters']['dataset_definition']
+    ctx = data_def['s3ExecutionContext']
+    return data_def['name'], ctx['s3Uri'], ctx.get('s3ContentType', 'csv'), ctx.get('s3HasHeader', True)
+
+
+def node_chain(flow, output_node=None):
+    """ Nodes from the source to output_node (the last node by default), in execution order.
+        Every transform must have exactly one input, which is how Data Wrangler lays out
+        a flow without joins or concatenations.
+    """
+    nodes = {n['node_id']: n for n in flow['nodes']}
+    node_id = output_node.split('.')[0] if output_node else flow['nodes'][-1]['node_id']
+    chain = []
+    while True:
+        node = nodes[node_id]
+        chain.append(node)
+        inputs = node.get('inputs', [])
+        if node['type'] == 'SOURCE':
+            break
+        if len(inputs) != 1:
+            raise UnsupportedOperator(f"node {node_id} ({node['operator']}) has {len(inputs)} inputs, only linear flows run locally")
+        node_id = inputs[0]['node_id']
+    return chain[::-1]
+
+
+def _open_parquet(uri):
+    import pyarrow.parquet as pq
+    if '://' in str(uri):
+        import fsspec
+        return pq.ParquetFile(fsspec.open(uri, 'rb').open())
+    return pq.ParquetFile(uri)
+
+
+def _is_parquet(uri, content_type):
+    return content_type == 'parquet' or str(uri).lower().endswith(('.parquet', '.pq'))
+
+
+def source_columns(uri, content_type='csv', has_header=True):
+    """ Column names of a source, read from the CSV header or the Parquet schema """
+    if _is_parquet(uri, content_type):
+        return list(_open_parquet(uri).schema_arrow.names)
+    header = pd.read_csv(uri, nrows=0 if has_header else 1, header=0 if has_header else None)
+    return list(header.columns) if has_header else [f'_c{i}' for i in range(header.shape[1])]
+
+
+def read_source(uri, chunksize, content_type='csv', has_header=True, usecols=None, types=None):
+    """ Read a source in chunks.
+        Without types every value is read as a string, as Data Wrangler does before infer_and_cast_type.
+        With types (column -> long/float/bool/string) the cast happens in the reader: numeric columns are
+        parsed by the CSV parser itself and only fall back to the coercing cast when a chunk holds
+        values that do not parse.
+        Args:
+            usecols (list): columns to read, all when omitted
+            types (dict): Data Wrangler type per column
+    """
+    if _is_parquet(uri, content_type):
+        for batch in _open_parquet(uri).iter_batches(batch_size=chunksize, columns=usecols):
+            chunk = batch.to_pandas()
+            if types:
+                chunk = pd.DataFrame({c: cast_column(chunk[c], types.get(c, 'string')) for c in chunk.columns}, index=chunk.index)
+            yield chunk
+        return
+    names = None
+    if not has_header:
+        names = [f'_c{i}' for i in range(len(source_columns(uri, content_type, has_header)))]
+    if types:
+        dtype = {c: str for c, t in types.items() if t in ('string', 'bool')}
+    else:
+        dtype = str
+    reader = pd.read_csv(uri, chunksize=chunksize, dtype=dtype, header=0 if has_header else None, names=names,
+                         usecols=usecols, keep_default_na=False, na_values=[''])
+    for chunk in reader:
+        if usecols is not None:
+            chunk = chunk[[c for c in usecols if c in chunk.columns]]
+        if types:
+            for c in chunk.columns:
+                t = types.get(c, 'string')
+                values = chunk[c]
+                if t == 'float' and pd.api.types.is_numeric_dtype(values.dtype):
+                    chunk[c] = values.astype('float64')
+                elif t == 'long' and pd.api.types.is_integer_dtype(values.dtype):
+                    chunk[c] = values.astype('Int64')
+                elif t != 'string':
+                    chunk[c] = cast_column(values, t)
+        yield chunk
+
+
+#----- plan
+class Stage(object):
+    """ One step of a compiled plan, running one operator or several fused ones
+        Args:
+            name (str): label shown by Plan.explain
+            nodes (list): ids of the flow nodes the stage executes
+            fn (callable): DataFrame -> DataFrame
+    """
+    def __init__(self, name, nodes, fn):
+        self.name = name
+        self.nodes = nodes
+        self.fn = fn
+        self.seconds = 0.0
+        self.rows = 0
+
+    def apply(self, df):
+        stime = time.perf_counter()
+        df = self.fn(df)
+        self.seconds += time.perf_counter() - stime
+        self.rows += len(df)
+        return df
+
+
+class FusedFill(object):
+    """ Consecutive Fill missing operators applied as a single fillna over all their columns """
+    def __init__(self, ops):
+        self.ops = ops
+
+    def __call__(self, df):
+        df = df.copy()
+        values = {}
+        for op in self.ops:
+            if op.column in values:
+                # an earlier fill already removed every missing value of this column
+                continue
+            try:
+                values[op.column] = fill_value_for(df[op.column], op.fill_value)
+            except ValueError:
+                df[op.column] = cast_column(df[op.column], 'string')
+                values[op.column] = op.fill_value
+        return df.fillna(value=values)
+
+
+def _dropped_columns(op):
+    p = op.params['drop_column_parameters']
+    columns = p.get('column_to_drop') or p.get('input_column')
+    return [columns] if isinstance(columns, str) else list(columns)
+
+
+def _reads(op, names):
+    """ Whether the result of op depends on the values (or the position) of any of names """
+    if isinstance(op, CustomPandas):
+        # custom code is opaque, a column it mentions is assumed to be read
+        return any(n in op.params.get('code', '') for n in names)
+    if isinstance(op, HandleMissing):
+        if op.operator == 'Drop missing':
+            return op.column is None or op.column in names
+        return op.column in names and op.output_column != op.column
+    if isinstance(op, ManageColumns):
+        if op.operator == 'Duplicate column':
+            return op.params['duplicate_column_parameters']['input_column'] in names
+        if op.operator == 'Move column':
+            return op.params['move_column_parameters'].get('target_column') in names
+    return False
+
+
+def _source_of(names, name):
+    return names.get(name) if name is not None else None
+
+
+def prune_columns(columns, ops):
+    """ Find source columns that a later Drop column removes before anything reads them,
+        and remove the operators that only touch those columns.
+        A column name can refer to different columns over the flow (Drop a, then Rename b to a), so
+        every operator is matched to the source columns its names refer to at its own position.
+        Args:
+            columns (list): source columns
+            ops (list): operators in execution order
+        Returns:
+            (source columns to read, remaining operators, pruned source columns)
+    """
+    current = {c: c for c in columns}     # current name -> source column
+    names_at = []                         # the current names before each operator
+    pruned = set()
+    for i, op in enumerate(ops):
+        names_at.append(dict(current))
+        if isinstance(op, ManageColumns) and op.operator == 'Rename column':
+            p = op.params['rename_column_parameters']
+            source = current.pop(p['input_column'], None)
+            current.pop(p['new_name'], None)
+            if source is not None:
+                current[p['new_name']] = source
+        elif isinstance(op, ManageColumns) and op.operator == 'Drop column':
+            for name in _dropped_columns(op):
+                source = current.pop(name, None)
+                if source is not None and not any(
+                        _reads(o, {n for n, s in names_at[j].items() if s == source}) for j, o in enumerate(ops[:i])):
+                    pruned.add(source)
+        elif isinstance(op, ManageColumns) and op.operator == 'Duplicate column':
+            current.pop(op.params['duplicate_column_parameters']['new_name'], None)
+        elif isinstance(op, HandleMissing) and op.operator == 'Fill missing' and op.output_column != op.column:
+            current.pop(op.output_column, None)
+        elif isinstance(op, CustomPandas):
+            # the code may create or overwrite any column, and names it mentions are no longer source columns
+            current = {n: s for n, s in current.items() if n not in op.params.get('code', '')}
+    if not pruned:
+        return list(columns), list(ops), []
+
+    remaining = []
+    for op, names in zip(ops, names_at):
+        if isinstance(op, HandleMissing) and op.operator == 'Fill missing' and _source_of(names, op.column) in pruned:
+            continue
+        if isinstance(op, ManageColumns):
+            p = op.params
+            if op.operator == 'Rename column' and _source_of(names, p['rename_column_parameters']['input_column']) in pruned:
+                continue
+            if op.operator == 'Move column' and _source_of(names, p['move_column_parameters']['column_to_move']) in pruned:
+                continue
+            if op.operator == 'Drop column':
+                kept = [c for c in _dropped_columns(op) if _source_of(names, c) not in pruned]
+                if not kept:
+                    continue
+                if len(kept) < len(_dropped_columns(op)):
+                    op = ManageColumns(dict(op.node, parameters=dict(p, drop_column_parameters={'column_to_drop': kept})))
+        remaining.append(op)
+    return [c for c in columns if c not in pruned], remaining, sorted(pruned)
+
+
+class Plan(object):
+    """ Compiled execution plan of a flow: a reader followed by stages.
+        Use explain() to inspect it and timings() after a run.
+    """
+    def __init__(self, source, usecols, types, stages, node_count, pruned, fused_casts):
+        self.source = source
+        self.usecols = usecols
+        self.types = types
+        self.stages = stages
+        self.node_count = node_count
+        self.pruned = pruned
+        self.fused_casts = fused_casts
+        self.read_seconds = 0.0
+
+    @property
+    def passes_before(self):
+        # one pass to read, plus one per transform node
+        return 1 + self.node_count
+
+    @property
+    def passes_after(self):
+        return 1 + len(self.stages)
+
+    def explain(self):
+        lines = [f'read {self.source}' +
+                 (f' columns={self.usecols}' if self.usecols is not None else '') +
+                 (f' pruned={self.pruned}' if self.pruned else '') +
+                 (f' casts={self.types} (infer_and_cast_type fused into the reader)' if self.fused_casts else '')]
+        for i, stage in enumerate(self.stages):
+            fused = f' (fuses {len(stage.nodes)} nodes)' if len(stage.nodes) > 1 else ''
+            lines.append(f'stage {i}: {stage.name}{fused}')
+        lines.append(f'estimated passes over each chunk: {self.passes_before} -> {self.passes_after} '
+                     f'({self.passes_before - self.passes_after} saved)')
+        return '\n'.join(lines)
+
+    def timings(self):
+        """ Measured seconds per stage, read first """
+        rows = [{'stage': 'read', 'nodes': 1 + (1 if self.fused_casts else 0), 'seconds': round(self.read_seconds, 4)}]
+        for stage in self.stages:
+            rows.append({'stage': stage.name, 'nodes': len(stage.nodes), 'seconds': round(stage.seconds, 4)})
+        return pd.DataFrame(rows)
+
+
+def _is_fusable_fill(op):
+    return isinstance(op, HandleMissing) and op.operator == 'Fill missing' and op.output_column == op.column
+
+
+def compile_plan(operators, uri, chunksize, content_type='csv', has_header=True):
+    """ Optimize the operators of a linear flow into a Plan:
+        - source columns dropped before anything reads them are not read at all (column pruning)
+        - an infer_and_cast_type right after the source infers from the first chunk and casts in the reader
+        - consecutive Fill missing operators run as a single fillna (operator fusion)
+        Args:
+            operators (list): Operator of every transform node, in execution order
+            uri (str): source uri
+            chunksize (int): rows per chunk, the first chunk is the type inference sample
+    """
+    columns = source_columns(uri, content_type, has_header)
+    usecols, ops, pruned = prune_columns(columns, operators)
+    types = None
+    if ops and isinstance(ops[0], InferAndCastType):
+        cast, ops = ops[0], ops[1:]
+        sample = next(read_source(uri, chunksize, content_type, has_header, usecols=usecols if pruned else None), None)
+        if sample is not None:
+            types = {c: infer_type(sample[c], cast.threshold) for c in sample.columns}
+            cast.types = types
+
+    stages = []
+    i = 0
+    while i < len(ops):
+        j = i
+        while j < len(ops) and _is_fusable_fill(ops[j]):
+            j += 1
+        if j - i > 1:
+            group = ops[i:j]
+            stages.append(Stage(f"fill_missing {','.join(op.column for op in group)}", [op.node_id for op in group], FusedFill(group)))
+            i = j
+        else:
+            stages.append(Stage(ops[i].describe(), [ops[i].node_id], ops[i].apply))
+            i += 1
+    return Plan(uri, usecols if pruned else None, types, stages, len(operators), pruned, types is not None)
+
+
+class FlowExecutor(object):
+    """ Executes a linear .flow graph chunk by chunk
+        Args:
+            flow (str or dict): .flow file path/uri or parsed flow
+            sources (dict): source dataset name -> local path or uri overriding the s3Uri in the flow,
+                            e.g. the /opt/ml/processing/<name> input of a processing job
+            chunksize (int): rows per chunk
+            output_node (str): node id (or '<node id>.default' output name) to produce, the last node by default
+            optimize (bool): run the compiled Plan (pruning, cast pushdown, fill fusion) instead of one pass per node
+    """
+    def __init__(self, flow, sources=None, chunksize=100000, output_node=None, optimize=True):
+        self.flow = load_flow(flow)
+        self.sources = sources or {}
+        self.chunksize = chunksize
+        self.chain = node_chain(self.flow, output_node)
+        self.now = pd.Timestamp.utcnow().tz_localize(None)
+        self.operators = [self._operator(n) for n in self.chain[1:]]
+        self.optimize = optimize
+        self.plan = None
+
+    def _operator(self, node):
+        cls = OPERATORS.get(node['operator'])
+        if cls is None:
+            raise UnsupportedOperator(f"operator {node['operator']} of node {node['node_id']} is not supported locally")
+        if cls is CustomPandas:
+            return cls(node, now=self.now)
+        return cls(node)
+
+    def source_uri(self):
+        name, uri, content_type, has_header = source_definition(self.chain[0])
+        return self.sources.get(name, uri), content_type, has_header
+
+    def compile(self):
+        """ Compile (once) and return the optimized Plan, see Plan.explain """
+        if self.plan is None:
+            uri, content_type, has_header = self.source_uri()
+            self.plan = compile_plan(self.operators, uri, self.chunksize, content_type, has_header)
+        return self.plan
+
+    def iter_chunks(self):
+        """ Yield the transformed chunks of the output node """
+        uri, content_type, has_header = self.source_uri()
+        if not self.optimize:
+            for chunk in read_source(uri, self.chunksize, content_type, has_header):
+                for op in self.operators:
+                    chunk = op.apply(chunk)
+                yield chunk
+            return
+        plan = self.compile()
+        chunks = read_source(uri, self.chunksize, content_type, has_header, usecols=plan.usecols, types=plan.types)
+        while True:
+            stime = time.perf_counter()
+            chunk = next(chunks, None)
+            plan.read_seconds += time.perf_counter() - stime
+            if chunk is None:
+                break
+            for stage in plan.stages:
+                chunk = stage.apply(chunk)
+            yield chunk
+
+    def tee(self, output_path, file_format='csv'):
+        """ Yield the output chunks while also writing them to a CSV or Parquet file """
+        writer = None
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        try:
+            for i, chunk in enumerate(self.iter_chunks()):
+                if file_format == 'parquet':
+                    import pyarrow as pa
+                    import pyarrow.parquet as pq
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(output_path, table.schema)
+                    writer.write_table(table.cast(writer.schema))
+                else:
+                    chunk.to_csv(output_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+                yield chunk
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def run(self, output_path, file_format='csv'):
+        """ Write the output node to a CSV or Parquet file
+            Returns:
+                number of rows written
+        """
+        stime = time.time()
+        rows = sum(len(chunk) for chunk in self.tee(output_path, file_format))
+        print(f'{rows} rows written to {output_path} in {time.time() - stime:.1f} seconds')
+        return rows
@@ -0,0 +1,284 @@
+"""
+Parallel ingestion of CSV or Parquet data into a SageMaker Feature Store feature group.
+
+The input is read in fixed-size batches and fanned out to a pool of processes. Each process
+writes its batch with PutRecord from a thread pool whose effective concurrency adapts to
+throttling (halved on a throttle, grown by one after a run of successes). At most two
+batches per process are in flight, so memory stays bounded however large the input is.
+Completed batches are checkpointed, and a rerun with the same checkpoint skips them.
+"""
+import os
+import time
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+from afd_pipeline.scoring import error_code, THROTTLE_CODES, RETRY_CODES
+from afd_pipeline.state import load_json, save_json
+
+
+class RuntimeClientFactory(object):
+    """ Picklable factory of featurestore-runtime clients, called once in every worker process
+        Args:
+            region (str): AWS region
+            max_pool_connections (int): connection pool size, match the threads per process
+    """
+    def __init__(self, region=None, max_pool_connections=10):
+        self.region = region
+        self.max_pool_connections = max_pool_connections
+
+    def __call__(self):
+        import boto3
+        from botocore.config import Config
+        config = Config(max_pool_connections=self.max_pool_connections, retries={'max_attempts': 0})
+        return boto3.client('sagemaker-featurestore-runtime', region_name=self.region, config=config)
+
+
+class AdaptiveLimiter(object):
+    """ Concurrency limit adjusted by additive increase, multiplicative decrease
+        Args:
+            max_limit (int): upper bound, the number of threads available
+            initial (int): starting limit, defaults to half of max_limit
+            increase_after (int): consecutive successes before the limit grows by one
+    """
+    def __init__(self, max_limit, initial=None, increase_after=50):
+        self.max_limit = max_limit
+        self.limit = initial or max(1, max_limit // 2)
+        self.increase_after = increase_after
+        self.active = 0
+        self.successes = 0
+        self.cond = threading.Condition()
+
+    def __enter__(self):
+        with self.cond:
+            while self.active >= self.limit:
+                self.cond.wait()
+            self.active += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify()
+
+    def success(self):
+        with self.cond:
+            self.successes += 1
+            if self.successes >= self.increase_after and self.limit < self.max_limit:
+                self.limit += 1
+                self.successes = 0
+                self.cond.notify()
+
+    def throttled(self):
+        with self.cond:
+            self.limit = max(1, self.limit // 2)
+            self.successes = 0
+
+
+# per worker process: client, thread pool and limiter for each client configuration, created on the first batch
+_WORKER = {}
+
+
+def _worker_state(client_factory, threads):
+    key = (type(client_factory).__name__, repr(sorted(getattr(client_factory, '__dict__', {}).items())), threads)
+    if key not in _WORKER:
+        _WORKER[key] = (client_factory(), ThreadPoolExecutor(max_workers=threads), AdaptiveLimiter(threads))
+    return _WORKER[key]
+
+
+def to_record(row, columns):
+    """ PutRecord Record of a row; null values are left out, as FeatureGroup.ingest does """
+    return [{'FeatureName': c, 'ValueAsString': str(v)} for c, v in zip(columns, row) if not pd.isna(v)]
+
+
+def _put(client, limiter, feature_group_name, record, max_retries):
+    retries = throttles = 0
+    while True:
+        with limiter:
+            try:
+                client.put_record(FeatureGroupName=feature_group_name, Record=record)
+                limiter.success()
+                return None, retries, throttles
+            except Exception as e:
+                code = error_code(e)
+                if code in THROTTLE_CODES:
+                    throttles += 1
+                    limiter.throttled()
+                if code not in RETRY_CODES or retries >= max_retries:
+                    return f'{code or type(e).__name__}: {e}', retries, throttles
+        time.sleep(random.uniform(0, min(5.0, 0.05 * 2 ** retries)))
+        retries += 1
+
+
+def ingest_batch(feature_group_name, batch_id, frame, client_factory, threads=8, max_retries=8):
+    """ Write one batch of rows with PutRecord, runs in a worker process
+        Returns:
+            dict with the batch id, row counts, throttles, retries, elapsed seconds,
+            a sample of the errors and the limiter's concurrency when the batch finished
+    """
+    client, pool, limiter = _worker_state(client_factory, threads)
+    stime = time.monotonic()
+    columns = list(frame.columns)
+    futures = [pool.submit(_put, client, limiter, feature_group_name, to_record(row, columns), max_retries)
+               for row in frame.itertuples(index=False, name=None)]
+    results = [f.result() for f in futures]
+    errors = [r[0] for r in results if r[0] is not None]
+    return {
+        'batch_id'   : batch_id,
+        'rows'       : len(frame),
+        'failed'     : len(errors),
+        'retries'    : sum(r[1] for r in results),
+        'throttles'  : sum(r[2] for r in results),
+        'elapsed'    : time.monotonic() - stime,
+        'errors'     : errors[:5],
+        'concurrency': limiter.limit,
+        'pid'        : os.getpid()
+    }
+
+
+def list_input_files(path):
+    """ CSV and Parquet files under path (a file, a directory or an S3 prefix), sorted """
+    if '://' in path:
+        import fsspec
+        fs, root = fsspec.core.url_to_fs(path)
+        protocol = path.split('://', 1)[0]
+        files = [f'{protocol}://{f}' for f in (fs.find(root) if fs.isdir(root) else [root])]
+    elif os.path.isdir(path):
+        files = [os.path.join(d, f) for d, _, names in os.walk(path) for f in names]
+    else:
+        files = [path]
+    return sorted(f for f in files if f.lower().endswith(('.csv', '.parquet', '.pq')))
+
+
+def read_batches(path, batch_size, **read_kwargs):
+    """ Yield (batch id, DataFrame) for every batch_size rows of every input file """
+    for file in list_input_files(path):
+        if file.lower().endswith(('.parquet', '.pq')):
+            import pyarrow.parquet as pq
+            if '://' in file:
+                import fsspec
+                with fsspec.open(file, 'rb') as f:
+                    for i, batch in enumerate(pq.ParquetFile(f).iter_batches(batch_size=batch_size)):
+                        yield f'{file}#{i}', batch.to_pandas()
+            else:
+                for i, batch in enumerate(pq.ParquetFile(file).iter_batches(batch_size=batch_size)):
+                    yield f'{file}#{i}', batch.to_pandas()
+        else:
+            for i, chunk in enumerate(pd.read_csv(file, chunksize=batch_size, **read_kwargs)):
+                yield f'{file}#{i}', chunk
+
+
+def frame_batches(df, batch_size, name='frame'):
+    """ Yield (batch id, DataFrame) slices of an in-memory DataFrame """
+    for i, start in enumerate(range(0, len(df), batch_size)):
+        yield f'{name}#{i}', df.iloc[start:start + batch_size]
+
+
+class FeatureIngestor(object):
+    """ Streams batches into a feature group from a pool of processes.
+        Args:
+            feature_group_name (str): target feature group
+            client_factory (callable): picklable, returns a featurestore-runtime client in each process
+            processes (int): worker processes, 0 writes from the calling process
+            threads (int): PutRecord threads per process, the upper bound of its adaptive concurrency
+            checkpoint_uri (str): JSON checkpoint of completed batches (S3 or local), None disables resuming
+            batch_size (int): rows per batch, part of the checkpoint identity
+            event_time_feature_name (str): added with the current time when the input lacks it
+            max_retries (int): retries of a throttled or transient PutRecord failure
+    """
+    def __init__(self, feature_group_name, client_factory, processes=4, threads=8, checkpoint_uri=None,
+                 batch_size=1000, event_time_feature_name='EventTime', max_retries=8, checkpoint_interval=10):
+        self.feature_group_name = feature_group_name
+        self.client_factory = client_factory
+        self.processes = processes
+        self.threads = threads
+        self.checkpoint_uri = checkpoint_uri
+        self.batch_size = batch_size
+        self.event_time_feature_name = event_time_feature_name
+        self.max_retries = max_retries
+        self.checkpoint_interval = checkpoint_interval
+        self.event_time = time.time()
+
+    def _load_checkpoint(self):
+        empty = {'feature_group': self.feature_group_name, 'batch_size': self.batch_size, 'done': []}
+        if self.checkpoint_uri is None:
+            return empty
+        checkpoint = load_json(self.checkpoint_uri, default=empty)
+        if checkpoint.get('batch_size') != self.batch_size or checkpoint.get('feature_group') != self.feature_group_name:
+            print(f'Checkpoint {self.checkpoint_uri} was written for another feature group or batch size, starting over')
+            return empty
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint):
+        if self.checkpoint_uri is not None:
+            save_json(self.checkpoint_uri, checkpoint)
+
+    def _prepare(self, frame):
+        if self.event_time_feature_name and self.event_time_feature_name not in frame.columns:
+            frame = frame.assign(**{self.event_time_feature_name: self.event_time})
+        return frame
+
+    def ingest(self, batches):
+        """ Ingest (batch id, DataFrame) pairs, see read_batches and frame_batches
+            Returns:
+                dict with row counts, throughput in rows per second and the failed batch ids
+        """
+        checkpoint = self._load_checkpoint()
+        done = set(checkpoint['done'])
+        stats = {'rows': 0, 'failed': 0, 'retries': 0, 'throttles': 0, 'batches': 0, 'skipped': 0, 'failed_batches': []}
+        stime = last_save = time.monotonic()
+
+        if self.processes > 0:
+            executor = ProcessPoolExecutor(max_workers=self.processes)
+        else:
+            executor = ThreadPoolExecutor(max_workers=1)
+        max_pending = 2 * max(self.processes, 1)
+        pending = set()
+
+        def collect(futures):
+            nonlocal last_save
+            for f in futures:
+                result = f.result()
+                stats['batches'] += 1
+                for k in ('rows', 'failed', 'retries', 'throttles'):
+                    stats[k] += result[k]
+                if result['failed']:
+                    # not checkpointed, so a rerun retries the whole batch
+                    stats['failed_batches'].append(result['batch_id'])
+                    print(f"Batch {result['batch_id']}: {result['failed']} of {result['rows']} rows failed, e.g. {result['errors'][0]}")
+                else:
+                    checkpoint['done'].append(result['batch_id'])
+                elapsed = time.monotonic() - stime
+                print(f"Batch {result['batch_id']} done in {result['elapsed']:.1f}s, {stats['rows']} rows, "
+                      f"{stats['rows'] / elapsed:.0f} rows/s, concurrency {result['concurrency']} in pid {result['pid']}")
+            if time.monotonic() - last_save >= self.checkpoint_interval:
+                self._save_checkpoint(checkpoint)
+                last_save = time.monotonic()
+
+        try:
+            for batch_id, frame in batches:
+                if batch_id in done:
+                    stats['skipped'] += 1
+                    continue
+                pending.add(executor.submit(ingest_batch, self.feature_group_name, batch_id, self._prepare(frame),
+                                            self.client_factory, self.threads, self.max_retries))
+                if len(pending) >= max_pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+            collect(pending)
+        finally:
+            executor.shutdown(wait=True)
+            self._save_checkpoint(checkpoint)
+
+        elapsed = time.monotonic() - stime
+        stats['elapsed_s'] = round(elapsed, 3)
+        stats['throughput'] = round(stats['rows'] / elapsed, 2) if elapsed > 0 else 0.0
+        return stats
+
+    def ingest_path(self, path, **read_kwargs):
+        return self.ingest(read_batches(path, self.batch_size, **read_kwargs))
+
+    def ingest_frame(self, df, name='frame'):
+        return self.ingest(frame_batches(df, self.batch_size, name))
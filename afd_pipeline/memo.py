@@ -0,0 +1,154 @@
+"""
+Content-addressed memoization of AFD model training.
+
+A training run is identified by a digest of its inputs: the bytes of the training data, the training
+data schema and the model parameters. New model versions are tagged with that digest, so a later run
+with byte-identical inputs finds the version already trained from them instead of training again.
+
+The data is hashed as a stream, one block at a time, into one digest per file, and the file digests are
+combined into the digest of the data. File digests are also cached by object identity (key, ETag and
+size on S3, path, size and mtime locally), so only new or changed files are read again.
+"""
+import os
+import json
+import time
+import hashlib
+
+from afd_pipeline.detector_sync import paginate
+from afd_pipeline.scoring import error_code
+from afd_pipeline.state import load_json, save_json
+
+DIGEST_TAG = 'afd-pipeline:training-digest'
+
+# model version statuses whose training result can be reused (activate_afd waits out an activation
+# already under way), and those still training
+REUSABLE_STATUSES = ['TRAINING_COMPLETE', 'ACTIVATE_REQUESTED', 'ACTIVATE_IN_PROGRESS', 'ACTIVE', 'INACTIVE']
+TRAINING_STATUSES = ['TRAINING_IN_PROGRESS']
+
+BLOCK_SIZE = 8 * 1024 * 1024
+
+# file digests kept in the cache document, the least recently used are dropped beyond it
+MAX_CACHED_OBJECTS = 10000
+
+
+def _split(uri):
+    bucket, key = uri[len('s3://'):].split('/', 1)
+    return bucket, key
+
+
+def data_objects(uri, s3_client=None):
+    """ (location, identity) of the data behind uri: the file itself, or every file under a prefix or directory,
+        sorted by location. The identity changes whenever the content may have changed.
+    """
+    if not uri.startswith('s3://'):
+        if os.path.isdir(uri):
+            paths = sorted(os.path.join(d, f) for d, _, names in os.walk(uri) for f in names)
+        else:
+            paths = [uri]
+        return [(p, f'{os.path.getsize(p)}:{os.stat(p).st_mtime_ns}') for p in paths]
+    bucket, key = _split(uri)
+    objects = []
+    for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=key):
+        for obj in page.get('Contents', []):
+            if obj['Key'] == key or obj['Key'].startswith(key.rstrip('/') + '/'):
+                objects.append((f"s3://{bucket}/{obj['Key']}", f"{obj['Size']}:{obj['ETag'].strip(chr(34))}"))
+    if not objects:
+        raise FileNotFoundError(f'No training data at {uri}')
+    return sorted(objects)
+
+
+def _blocks(location, s3_client, block_size):
+    if location.startswith('s3://'):
+        bucket, key = _split(location)
+        body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+        for block in body.iter_chunks(block_size):
+            yield block
+    else:
+        with open(location, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                yield block
+
+
+def object_digest(location, s3_client=None, block_size=BLOCK_SIZE):
+    """ sha256 of one file or S3 object, streamed block by block
+        Returns:
+            (hex digest, size in bytes)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    for block in _blocks(location, s3_client, block_size):
+        digest.update(block)
+        size += len(block)
+    return digest.hexdigest(), size
+
+
+def data_digest(uri, s3_client=None, cache_uri=None, block_size=BLOCK_SIZE):
+    """ sha256 of the training data under uri: the digests of its files, combined in location order
+        Args:
+            uri (str): s3:// uri or local path of a file, prefix or directory
+            s3_client: boto3 s3 client, created on demand for s3:// uris
+            cache_uri (str): JSON document (S3 or local) caching file digests by object identity, None disables it
+        Returns:
+            (hex digest, True when no file had to be read)
+    """
+    if uri.startswith('s3://') and s3_client is None:
+        import boto3
+        s3_client = boto3.client('s3')
+    objects = data_objects(uri, s3_client)
+    root = uri.rstrip('/')
+    cache_client = s3_client if cache_uri and cache_uri.startswith('s3://') else None
+    cache = load_json(cache_uri, default={}, s3_client=cache_client) if cache_uri else {}
+    # {location: {'identity', 'digest', 'size', 'used'}}, one entry per location so rewritten files replace theirs
+    cached = cache.get('objects', {})
+
+    now = time.time()
+    digest = hashlib.sha256()
+    read = 0
+    for location, identity in objects:
+        entry = cached.get(location)
+        if entry is None or entry['identity'] != identity:
+            file_digest, size = object_digest(location, s3_client, block_size)
+            entry = {'identity': identity, 'digest': file_digest, 'size': size}
+            read += 1
+        cached[location] = dict(entry, used=now)
+        # file names relative to the root and lengths delimit the files, so moving bytes between files changes the digest
+        digest.update(f"{location[len(root):]}\0{entry['size']}\0{entry['digest']}\0".encode('utf-8'))
+
+    if cache_uri:
+        # files that are gone from under uri are dropped, and the document is bounded for every other uri
+        current = {location for location, _ in objects}
+        cached = {loc: e for loc, e in cached.items()
+                  if loc in current or not (loc == root or loc.startswith(f'{root}/'))}
+        kept = sorted(cached, key=lambda loc: cached[loc]['used'], reverse=True)[:MAX_CACHED_OBJECTS]
+        save_json(cache_uri, {'objects': {loc: cached[loc] for loc in kept}}, s3_client=cache_client)
+    return digest.hexdigest(), read == 0
+
+
+def training_digest(data_digest, schema, params):
+    """ Digest identifying a training run
+        Args:
+            data_digest (str): see data_digest
+            schema (dict): trainingDataSchema
+            params (dict): model parameters that change the trained model, e.g. modelId, modelType and trainingDataSource
+    """
+    document = json.dumps({'data': data_digest, 'schema': schema, 'params': params}, sort_keys=True)
+    return hashlib.sha256(document.encode('utf-8')).hexdigest()
+
+
+def find_model_version(client, model_id, model_type, digest):
+    """ Newest version of the model tagged with digest that is trained, or still training
+        Returns:
+            the version's describe_model_versions details, None when there is none
+    """
+    try:
+        versions = paginate(client.describe_model_versions, 'modelVersionDetails', modelId=model_id, modelType=model_type, maxResults=10)
+    except Exception as e:
+        if error_code(e) == 'ResourceNotFoundException':
+            return None
+        raise
+    versions = [v for v in versions if v['status'] in REUSABLE_STATUSES + TRAINING_STATUSES]
+    for version in sorted(versions, key=lambda v: float(v['modelVersionNumber']), reverse=True):
+        tags = paginate(client.list_tags_for_resource, 'tags', resourceARN=version['arn'])
+        if any(t['key'] == DIGEST_TAG and t['value'] == digest for t in tags):
+            return version
+    return None
@@ -0,0 +1,352 @@
+"""
+Performance instrumentation of the pipeline processing scripts.
+
+StepMetrics collects, for one processing step, nested timing spans, the count, errors and latency of
+every AWS API call, bytes read and written, named counters (e.g. Athena queue time), the time from
+process start to its creation (interpreter start-up and imports) and the peak RSS. API calls are
+recorded through botocore event hooks, so every client of an instrumented session is covered
+without touching the call sites. The metrics are written as a JSON file into the step's processing
+output, and aggregate() merges the files of all the steps of a pipeline run into one breakdown.
+
+Only the standard library is imported here, so the module can be imported before anything else.
+"""
+import os
+import time
+import threading
+import contextlib
+from datetime import datetime, timezone
+
+from afd_pipeline.state import load_json, save_json
+
+# request context key holding the start time of an API call between the before and after hooks
+_START_KEY = 'afd_pipeline_metrics_start'
+
+
+def process_uptime():
+    """ Seconds since the current process started, None where /proc is not available """
+    try:
+        with open('/proc/self/stat') as f:
+            # the command name in parentheses may hold spaces, starttime is the 20th field after it
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return round(uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK'), 3)
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    """ Peak resident set size of the current process in MB, None where neither /proc nor getrusage is available """
+    try:
+        # VmHWM starts over at exec, whereas ru_maxrss keeps the peak of the process that started this one
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in KB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+class _CountingFile(object):
+    """ File object wrapper adding the bytes passed through read and write to a StepMetrics """
+    def __init__(self, f, metrics, label):
+        self._f = f
+        self._metrics = metrics
+        self._label = label
+
+    def read(self, *args):
+        data = self._f.read(*args)
+        self._metrics.add_bytes('read', len(data), self._label)
+        return data
+
+    def read1(self, *args):
+        # io.TextIOWrapper, which pandas wraps binary files in, reads through read1
+        data = self._f.read1(*args)
+        self._metrics.add_bytes('read', len(data), self._label)
+        return data
+
+    def readinto(self, b):
+        n = self._f.readinto(b)
+        self._metrics.add_bytes('read', n or 0, self._label)
+        return n
+
+    def readline(self, *args):
+        data = self._f.readline(*args)
+        self._metrics.add_bytes('read', len(data), self._label)
+        return data
+
+    def __iter__(self):
+        for line in self._f:
+            self._metrics.add_bytes('read', len(line), self._label)
+            yield line
+
+    def write(self, data):
+        self._metrics.add_bytes('written', len(data), self._label)
+        return self._f.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._f.close()
+
+
+class StepMetrics(object):
+    """ Metrics of one processing step, see module docstring
+        Args:
+            step (str): step name, also the name of the metrics file
+            clock (callable): monotonic clock, replaceable for tests
+    """
+    def __init__(self, step, clock=time.perf_counter):
+        self.step = step
+        self.clock = clock
+        self.started = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        self.t0 = clock()
+        self.startup_s = process_uptime()
+        self.status = 'running'
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.spans = {}      # path -> totals, in the order the spans were first entered
+        self.calls = {}      # service.Operation -> latencies and errors
+        self.bytes = {'read': 0, 'written': 0}
+        self.bytes_by_label = {}
+        self.counters = {}
+
+    def _stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """ Time a block; spans opened inside it are nested under name, e.g. train/wait """
+        stack = self._stack()
+        stack.append(name)
+        path = '/'.join(stack)
+        with self.lock:
+            if path not in self.spans:
+                self.spans[path] = {'count': 0, 'seconds': 0.0, 'api_calls': 0, 'api_ms': 0.0}
+        stime = self.clock()
+        try:
+            yield
+        finally:
+            elapsed = self.clock() - stime
+            stack.pop()
+            with self.lock:
+                self.spans[path]['count'] += 1
+                self.spans[path]['seconds'] += elapsed
+
+    def add(self, name, value):
+        """ Add value to a named counter """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_bytes(self, direction, n, label=None):
+        """ Count bytes read or written, optionally under a label such as s3 or csv """
+        with self.lock:
+            self.bytes[direction] += n
+            if label is not None:
+                totals = self.bytes_by_label.setdefault(label, {'read': 0, 'written': 0})
+                totals[direction] += n
+
+    def add_file(self, direction, path, label=None):
+        """ Count the size of a local file that was read or written in full """
+        self.add_bytes(direction, os.path.getsize(path), label)
+
+    def open(self, uri, mode='rb', label=None):
+        """ Open a local file or, through fsspec, a remote one, counting the bytes read and written """
+        if '://' in str(uri):
+            import fsspec
+            f = fsspec.open(uri, mode).open()
+        else:
+            f = open(uri, mode)
+        return _CountingFile(f, self, label or ('s3' if str(uri).startswith('s3://') else 'file'))
+
+    #------API call hooks
+    def instrument(self, target):
+        """ Record the API calls of a boto3 Session, and of every client created from it afterwards,
+            or of a single client
+        """
+        events = target.meta.events if hasattr(target, 'meta') else target.events
+        events.register('before-call', self._before_call, unique_id=f'afd-metrics-before-{id(self)}')
+        events.register('after-call', self._after_call, unique_id=f'afd-metrics-after-{id(self)}')
+        events.register('after-call-error', self._after_call_error, unique_id=f'afd-metrics-error-{id(self)}')
+        return target
+
+    def _before_call(self, params=None, context=None, **kwargs):
+        if context is not None:
+            context[_START_KEY] = self.clock()
+        body = (params or {}).get('body')
+        if isinstance(body, (bytes, bytearray, str)):
+            self.add_bytes('written', len(body), 'api')
+        elif hasattr(body, 'seek') and hasattr(body, 'tell'):
+            # streamed bodies (e.g. PutObject) are counted from their current position to the end
+            try:
+                position = body.tell()
+                size = body.seek(0, os.SEEK_END) - position
+                body.seek(position)
+                self.add_bytes('written', size, 'api')
+            except (OSError, ValueError):
+                pass
+
+    def _record_call(self, event_name, context, error, response_bytes=0):
+        start = (context or {}).pop(_START_KEY, None)
+        # a call answered by an earlier before-call handler (e.g. botocore's Stubber) has no start time
+        latency = (self.clock() - start) * 1000 if start is not None else 0.0
+        # event names are after-call.<service>.<Operation>
+        name = '.'.join(event_name.split('.')[1:3])
+        with self.lock:
+            call = self.calls.setdefault(name, {'latencies': [], 'errors': 0})
+            call['latencies'].append(latency)
+            call['errors'] += int(error)
+            for path in self._paths():
+                self.spans[path]['api_calls'] += 1
+                self.spans[path]['api_ms'] += latency
+        if response_bytes:
+            self.add_bytes('read', response_bytes, 'api')
+
+    def _paths(self):
+        stack = self._stack()
+        return ['/'.join(stack[:i + 1]) for i in range(len(stack))]
+
+    def _after_call(self, http_response=None, context=None, event_name='', **kwargs):
+        status = getattr(http_response, 'status_code', 200)
+        headers = getattr(http_response, 'headers', None) or {}
+        self._record_call(event_name, context, status >= 300, int(headers.get('content-length') or 0))
+
+    def _after_call_error(self, context=None, event_name='', **kwargs):
+        self._record_call(event_name, context, True)
+
+    #------Report
+    def report(self):
+        """ Returns:
+                the metrics document, JSON serializable
+        """
+        with self.lock:
+            calls = {}
+            for name, call in sorted(self.calls.items()):
+                ordered = sorted(call['latencies'])
+                calls[name] = {
+                    'count'   : len(ordered),
+                    'errors'  : call['errors'],
+                    'total_ms': round(sum(ordered), 1),
+                    'p50_ms'  : round(_percentile(ordered, 50), 1),
+                    'p99_ms'  : round(_percentile(ordered, 99), 1),
+                    'max_ms'  : round(ordered[-1], 1) if ordered else 0.0
+                }
+            spans = [{'path'     : path,
+                      'count'    : s['count'],
+                      'seconds'  : round(s['seconds'], 3),
+                      'api_calls': s['api_calls'],
+                      'api_ms'   : round(s['api_ms'], 1)} for path, s in self.spans.items()]
+            return {
+                'step'       : self.step,
+                'status'     : self.status,
+                'started'    : self.started,
+                'elapsed_s'  : round(self.clock() - self.t0, 3),
+                'startup_s'  : self.startup_s,
+                'peak_rss_mb': peak_rss_mb(),
+                'spans'      : spans,
+                'api_calls'  : calls,
+                'bytes'      : dict(self.bytes, by_label={k: dict(v) for k, v in self.bytes_by_label.items()}),
+                'counters'   : dict(self.counters)
+            }
+
+    def write(self, directory, status='succeeded', s3_client=None):
+        """ Write the report as <directory>/<step>.json, directory being local or an s3:// prefix
+            Returns:
+                the report
+        """
+        self.status = status
+        report = self.report()
+        uri = f"{str(directory).rstrip('/')}/{self.step}.json"
+        try:
+            save_json(uri, report, s3_client=s3_client)
+            print(f"Step metrics written to {uri}: {report['elapsed_s']}s, peak RSS {report['peak_rss_mb']} MB")
+        except Exception as e:
+            # metrics never fail the step they measure
+            print(f'Unable to write step metrics to {uri}: {e}')
+        return report
+
+
+def load_step_metrics(uri, s3_client=None):
+    """ Step metrics documents under a local directory or an s3:// prefix """
+    if not uri.startswith('s3://'):
+        names = sorted(f for f in os.listdir(uri) if f.endswith('.json'))
+        return [load_json(os.path.join(uri, f)) for f in names]
+    if s3_client is None:
+        import boto3
+        s3_client = boto3.client('s3')
+    bucket, prefix = uri[len('s3://'):].split('/', 1)
+    documents = []
+    for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['Key'].endswith('.json'):
+                documents.append(load_json(f"s3://{bucket}/{obj['Key']}", s3_client=s3_client))
+    return documents
+
+
+def aggregate(documents, top_spans=5):
+    """ Merge the step metrics of a pipeline run into one breakdown
+        Args:
+            documents (list): StepMetrics reports, one per step
+            top_spans (int): longest spans listed per step
+        Returns:
+            dict with the per-step breakdown in start order, the API calls and bytes of the whole run and its peak RSS
+    """
+    documents = sorted((d for d in documents if d), key=lambda d: d['started'])
+    total = sum(d['elapsed_s'] for d in documents)
+    steps = []
+    calls = {}
+    read = written = 0
+    for d in documents:
+        # a span's time includes its children's, so only top level spans add up to the step
+        spans = sorted(d['spans'], key=lambda s: s['seconds'], reverse=True)
+        steps.append({
+            'step'         : d['step'],
+            'status'       : d['status'],
+            'elapsed_s'    : d['elapsed_s'],
+            'share'        : round(d['elapsed_s'] / total, 4) if total else 0.0,
+            'startup_s'    : d.get('startup_s'),
+            'peak_rss_mb'  : d.get('peak_rss_mb'),
+            'api_calls'    : sum(c['count'] for c in d['api_calls'].values()),
+            'api_s'        : round(sum(c['total_ms'] for c in d['api_calls'].values()) / 1000, 3),
+            'bytes_read'   : d['bytes']['read'],
+            'bytes_written': d['bytes']['written'],
+            'top_spans'    : [{'path': s['path'], 'seconds': s['seconds']} for s in spans[:top_spans]],
+            'counters'     : d.get('counters', {})
+        })
+        for name, c in d['api_calls'].items():
+            merged = calls.setdefault(name, {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            merged['count'] += c['count']
+            merged['errors'] += c['errors']
+            merged['total_ms'] = round(merged['total_ms'] + c['total_ms'], 1)
+            merged['max_ms'] = max(merged['max_ms'], c['max_ms'])
+        read += d['bytes']['read']
+        written += d['bytes']['written']
+    rss = [d['peak_rss_mb'] for d in documents if d.get('peak_rss_mb') is not None]
+    return {
+        'steps'        : steps,
+        'elapsed_s'    : round(total, 3),
+        'startup_s'    : round(sum(d.get('startup_s') or 0 for d in documents), 3),
+        'api_calls'    : dict(sorted(calls.items(), key=lambda kv: kv[1]['total_ms'], reverse=True)),
+        'bytes_read'   : read,
+        'bytes_written': written,
+        'peak_rss_mb'  : max(rss) if rss else None
+    }
@@ -0,0 +1,137 @@
+"""
+Deduplicating cache of GetEventPrediction results.
+
+Events are keyed by a canonical hash of what the detector version scores: detector, version, event
+type, entity type and the event variables (entity id and timestamp are left out unless asked for).
+Identical events within the TTL are answered from the cache, and identical events that arrive while
+the first one is still being scored wait for its result instead of sending their own request.
+Entries are evicted least recently used first once the cache exceeds its memory bound.
+"""
+import sys
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# rough per-entry overhead of the OrderedDict slot, the tuple and the float/str objects, in bytes
+ENTRY_OVERHEAD = 240
+
+
+def event_key(detector_id, detector_version_id, event_type, entity_type, event_variables, entity_id=None):
+    """ 16 byte blake2b digest of the canonical JSON form of an event, see module docstring """
+    document = json.dumps([detector_id, str(detector_version_id), event_type, entity_type,
+                           sorted(event_variables.items()), entity_id], separators=(',', ':'))
+    return hashlib.blake2b(document.encode('utf-8'), digest_size=16).digest()
+
+
+def _size(value):
+    return ENTRY_OVERHEAD + sum(sys.getsizeof(v) for v in value if v is not None)
+
+
+class PredictionCache(object):
+    """ Thread-safe TTL + LRU cache with in-flight request coalescing
+        Args:
+            ttl (float): seconds a prediction stays valid
+            max_bytes (int): approximate memory bound of the cached entries
+            include_entity (bool): key on the entity id too, for models that use the entity's history
+            clock (callable): monotonic clock, replaceable for tests
+    """
+    def __init__(self, ttl=300, max_bytes=64 * 1024 * 1024, include_entity=False, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.include_entity = include_entity
+        self.clock = clock
+        self.entries = OrderedDict()   # key -> (expires, size, value)
+        self.inflight = {}             # key -> Future of the request being made
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.counts = {'hits': 0, 'misses': 0, 'coalesced': 0, 'expired': 0, 'evicted': 0, 'uncacheable': 0}
+
+    def key(self, request):
+        """ Cache key of a get_event_prediction request """
+        entity = request['entities'][0] if request.get('entities') else {}
+        return event_key(request['detectorId'], request['detectorVersionId'], request['eventTypeName'],
+                         entity.get('entityType'), request['eventVariables'],
+                         entity.get('entityId') if self.include_entity else None)
+
+    def get_or_compute(self, key, compute, cacheable=lambda value: True):
+        """ Cached value of key, or compute() it once however many threads ask at the same time
+            Args:
+                key (bytes): see key()
+                compute (callable): makes the request, returns the value to cache
+                cacheable (callable): whether a computed value may be cached, e.g. not an error
+            Returns:
+                (value, 'hit' | 'coalesced' | 'miss')
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > self.clock():
+                    self.entries.move_to_end(key)
+                    self.counts['hits'] += 1
+                    return entry[2], 'hit'
+                self._remove(key)
+                self.counts['expired'] += 1
+            future = self.inflight.get(key)
+            if future is None:
+                future = self.inflight[key] = Future()
+                owner = True
+                self.counts['misses'] += 1
+            else:
+                owner = False
+                self.counts['coalesced'] += 1
+        if not owner:
+            return future.result(), 'coalesced'
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self.lock:
+                del self.inflight[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            del self.inflight[key]
+            if cacheable(value):
+                self._put(key, value)
+            else:
+                self.counts['uncacheable'] += 1
+        future.set_result(value)
+        return value, 'miss'
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+
+    def _put(self, key, value):
+        if key in self.entries:
+            self._remove(key)
+        size = _size(value) + len(key)
+        self.entries[key] = (self.clock() + self.ttl, size, value)
+        self.bytes += size
+        while self.bytes > self.max_bytes and self.entries:
+            self._remove(next(iter(self.entries)))
+            self.counts['evicted'] += 1
+
+    def invalidate(self):
+        """ Drop every cached prediction, e.g. after the detector version's rules changed """
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """ Returns:
+                dict with the hit, miss, coalesced, expiry and eviction counts, the hit rate
+                (hits and coalesced requests over all lookups) and the memory held
+        """
+        with self.lock:
+            counts = dict(self.counts)
+            lookups = counts['hits'] + counts['misses'] + counts['coalesced']
+            counts.update({
+                'hit_rate': round((counts['hits'] + counts['coalesced']) / lookups, 4) if lookups else 0.0,
+                'entries' : len(self.entries),
+                'bytes'   : self.bytes
+            })
+        return counts
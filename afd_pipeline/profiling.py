@@ -0,0 +1,97 @@
+"""
+Dataset reading and feature classification shared by data_profiler and the processing steps.
+
+data_profiler.py sits next to the notebooks and is not part of the processing image, so what the steps
+need of it lives here and data_profiler imports it back: the drift baseline and the training statistics
+classify features with the same rules.
+"""
+import numpy as np
+import pandas as pd
+
+
+def read_chunks(path, chunksize=500000, file_format=None, **read_kwargs):
+    """ Iterate over a CSV or Parquet file (local or S3) as DataFrames of at most chunksize rows
+        Args:
+            path (str): local path or s3:// uri of the dataset
+            chunksize (int): number of rows per chunk
+            file_format (str): 'csv' or 'parquet', inferred from the file extension when omitted
+            read_kwargs: additional keyword arguments passed to pd.read_csv
+        Local Parquet files are memory-mapped, and their dictionary-encoded columns come back as categoricals.
+    """
+    if file_format is None:
+        file_format = 'parquet' if str(path).lower().endswith(('.parquet', '.pq')) else 'csv'
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        if '://' in str(path):
+            # remote files are opened through fsspec, which s3fs installs
+            import fsspec
+            with fsspec.open(path, 'rb') as f:
+                for batch in pq.ParquetFile(f).iter_batches(batch_size=chunksize):
+                    yield batch.to_pandas()
+        else:
+            for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunksize):
+                yield batch.to_pandas()
+    else:
+        for chunk in pd.read_csv(path, chunksize=chunksize, **read_kwargs):
+            yield chunk
+
+
+def _is_numeric(dtypes):
+    # any width of int or float counts as numeric (the typed Parquet copy downcasts them), and
+    # categoricals, like object columns, have kind 'O'
+    kind = np.array([getattr(d, 'kind', 'O') for d in dtypes])
+    return np.isin(kind, ['i', 'u', 'f']), kind
+
+
+def feature_types(names, dtypes):
+    """ Feature type of every column, the rules are listed from highest to lowest precedence
+        Args:
+            names (list): column names
+            dtypes (list): dtype of each column
+        Returns:
+            ndarray of EVENT_TIMESTAMP, TARGET, EMAIL_ADDRESS, IP_ADDRESS, NUMERIC, CATEGORY or UNKOWN
+    """
+    name = pd.Series(list(names), dtype=object).astype(str)
+    is_numeric, kind = _is_numeric(dtypes)
+    return np.select(
+        [
+            (name == "EVENT_TIMESTAMP").to_numpy(),
+            (name == "EVENT_LABEL").to_numpy(),
+            name.str.contains("email|email_address|emailaddr").to_numpy(dtype=bool),
+            name.str.contains("ipaddress|ip_address|ipaddr").to_numpy(dtype=bool),
+            is_numeric,
+            kind == 'O'
+        ],
+        ["EVENT_TIMESTAMP", "TARGET", "EMAIL_ADDRESS", "IP_ADDRESS", "NUMERIC", "CATEGORY"],
+        default="UNKOWN")
+
+
+def classify_features(df_stats):
+    """ Add the feature_type and feature_warning columns to a summary statistics frame.
+        Rules are listed from highest to lowest precedence.
+        Args:
+            df_stats (DataFrame): one row per feature with feature_name, dtype, nunique, null_pct and nunique_pct
+        Returns:
+            the same DataFrame with feature_type and feature_warning populated
+    """
+    name = df_stats['feature_name']
+    is_numeric, _ = _is_numeric(df_stats['dtype'])
+
+    # -- variable type mapper --
+    feature_type = feature_types(name, df_stats['dtype'])
+
+    # -- variable warnings --
+    null_pct = df_stats['null_pct'].to_numpy()
+    df_stats['feature_type'] = feature_type
+    df_stats['feature_warning'] = np.select(
+        [
+            is_numeric & (df_stats['nunique'] < 0.2).to_numpy(),
+            null_pct > 0.5,
+            (null_pct > 0.2) & (null_pct <= 0.5),
+            (df_stats['nunique_pct'] > 0.9).to_numpy() & (feature_type == "CATEGORY"),
+            ((df_stats['nunique'] != 2) & (name == "EVENT_LABEL")).to_numpy()
+        ],
+        ["LIKELY CATEGORICAL, NUMERIC w. LOW CARDINALITY", "EXCLUDE, GT 50% MISSING", "NULL WARNING, GT 20% MISSING",
+         "EXCLUDE, GT 90% UNIQUE", "LABEL WARNING, NON-BINARY EVENT LABEL"],
+        default="NO WARNING")
+    return df_stats
@@ -0,0 +1,204 @@
+"""
+Result cache of Athena queries over the Feature Store offline stores.
+
+A query is fingerprinted by its normalized text together with the state (object count, bytes and
+latest modification) of the S3 prefixes of the tables it reads. Any record written to an offline
+store adds objects under its prefix and therefore changes the fingerprint. When nothing changed,
+the result CSV of the earlier execution is reused instead of running the query again.
+
+The cache index is a JSON document on S3 (or local disk). Entries older than the retention period,
+or beyond the most recent max_entries, are evicted, and so are their result objects. The sweep also
+deletes result objects under the results prefix that no live entry references.
+"""
+import os
+import re
+import time
+import json
+import hashlib
+
+from afd_pipeline.state import load_json, save_json
+
+
+def _split(uri):
+    bucket, key = uri[len('s3://'):].split('/', 1)
+    return bucket, key
+
+
+def normalize_query(query):
+    """ Query text with whitespace runs collapsed, so reformatting does not change the fingerprint """
+    return re.sub(r'\s+', ' ', query).strip()
+
+
+def prefix_state(uri, s3_client=None):
+    """ Object count, total bytes and latest modification time under an s3:// prefix or a local directory """
+    count, size, latest = 0, 0, 0.0
+    if uri.startswith('s3://'):
+        if s3_client is None:
+            import boto3
+            s3_client = boto3.client('s3')
+        bucket, prefix = _split(uri)
+        for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                count += 1
+                size += obj['Size']
+                latest = max(latest, obj['LastModified'].timestamp())
+    else:
+        for directory, _, names in os.walk(uri):
+            for name in names:
+                stat = os.stat(os.path.join(directory, name))
+                count += 1
+                size += stat.st_size
+                latest = max(latest, stat.st_mtime)
+    return {'objects': count, 'bytes': size, 'last_modified': latest}
+
+
+def query_fingerprint(query, table_states):
+    """ sha256 of the normalized query and the state of every table it reads
+        Args:
+            query (str): SQL text
+            table_states (dict): table name -> prefix_state of its data
+    """
+    document = json.dumps({'query': normalize_query(query), 'tables': table_states}, sort_keys=True)
+    return hashlib.sha256(document.encode('utf-8')).hexdigest()
+
+
+class QueryResultCache(object):
+    """ Fingerprint -> Athena result location, persisted as a JSON index
+        Args:
+            index_uri (str): s3:// uri or local path of the index document
+            results_uri (str): s3:// prefix the query results are written to, swept by evict()
+            retention_days (float): age after which entries and unreferenced results are evicted
+            max_entries (int): entries kept, the most recently used first
+            s3_client: boto3 s3 client, created on demand
+            clock (callable): returns the current time in seconds since the epoch
+    """
+    def __init__(self, index_uri, results_uri=None, retention_days=7, max_entries=20, s3_client=None, clock=time.time):
+        self.index_uri = index_uri
+        self.results_uri = results_uri
+        self.retention_days = retention_days
+        self.max_entries = max_entries
+        self.s3_client = s3_client
+        self.clock = clock
+        self.index = None
+
+    def _client(self):
+        if self.s3_client is None:
+            import boto3
+            self.s3_client = boto3.client('s3')
+        return self.s3_client
+
+    def _index_client(self):
+        return self._client() if self.index_uri.startswith('s3://') else None
+
+    def _entries(self):
+        if self.index is None:
+            self.index = load_json(self.index_uri, default={'entries': {}}, s3_client=self._index_client())
+        return self.index['entries']
+
+    def _save(self):
+        save_json(self.index_uri, self.index, s3_client=self._index_client())
+
+    def _exists(self, location):
+        if not location.startswith('s3://'):
+            return os.path.exists(location)
+        bucket, key = _split(location)
+        try:
+            self._client().head_object(Bucket=bucket, Key=key)
+            return True
+        except Exception:
+            return False
+
+    def lookup(self, fingerprint):
+        """ Result location cached for the fingerprint, None on a miss or when the result object is gone """
+        entries = self._entries()
+        entry = entries.get(fingerprint)
+        if entry is None:
+            return None
+        if self.clock() - entry['created'] > self.retention_days * 86400 or not self._exists(entry['output_location']):
+            del entries[fingerprint]
+            self._save()
+            return None
+        entry['last_used'] = self.clock()
+        entry['hits'] = entry.get('hits', 0) + 1
+        self._save()
+        return entry['output_location']
+
+    def store(self, fingerprint, query_execution_id, output_location, tables=None):
+        """ Record the result of a query execution """
+        now = self.clock()
+        self._entries()[fingerprint] = {
+            'query_execution_id': query_execution_id,
+            'output_location'   : output_location,
+            'tables'            : tables or {},
+            'created'           : now,
+            'last_used'         : now,
+            'hits'              : 0
+        }
+        self._save()
+
+    def invalidate(self, fingerprint=None):
+        """ Drop one entry, or every entry when no fingerprint is given, and delete their result objects
+            Returns:
+                number of entries dropped
+        """
+        entries = self._entries()
+        dropped = [fingerprint] if fingerprint is not None else list(entries)
+        dropped = [f for f in dropped if f in entries]
+        self._delete_results([entries.pop(f)['output_location'] for f in dropped])
+        self._save()
+        return len(dropped)
+
+    def evict(self):
+        """ Apply the retention policy to the index and to the results prefix
+            Returns:
+                dict with the number of entries evicted and result objects deleted
+        """
+        entries = self._entries()
+        now = self.clock()
+        cutoff = now - self.retention_days * 86400
+        expired = [f for f, e in entries.items() if e['created'] < cutoff]
+        recent = sorted((f for f in entries if f not in expired), key=lambda f: entries[f]['last_used'], reverse=True)
+        expired += recent[self.max_entries:]
+        locations = [entries.pop(f)['output_location'] for f in expired]
+        deleted = self._delete_results(locations)
+        if expired:
+            self._save()
+
+        # results of queries that were never cached, or whose entries are gone, once they are past retention
+        if self.results_uri and self.results_uri.startswith('s3://'):
+            live = set()
+            for e in entries.values():
+                live.add(e['output_location'])
+                live.add(e['output_location'] + '.metadata')
+            bucket, prefix = _split(self.results_uri)
+            stale = []
+            for page in self._client().get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+                for obj in page.get('Contents', []):
+                    uri = f"s3://{bucket}/{obj['Key']}"
+                    if uri not in live and obj['LastModified'].timestamp() < cutoff:
+                        stale.append(uri)
+            deleted += self._delete_uris(stale)
+        return {'entries': len(expired), 'objects': deleted}
+
+    def _delete_results(self, locations):
+        # Athena writes a .metadata object next to every result CSV
+        return self._delete_uris([u for loc in locations for u in (loc, loc + '.metadata')])
+
+    def _delete_uris(self, uris):
+        deleted = 0
+        keys = {}
+        for u in uris:
+            if u.startswith('s3://'):
+                bucket, key = _split(u)
+                keys.setdefault(bucket, []).append(key)
+        for bucket, bucket_keys in keys.items():
+            # DeleteObjects takes up to 1000 keys per call
+            for start in range(0, len(bucket_keys), 1000):
+                objects = [{'Key': k} for k in bucket_keys[start:start + 1000]]
+                self._client().delete_objects(Bucket=bucket, Delete={'Objects': objects, 'Quiet': True})
+                deleted += len(objects)
+        for u in uris:
+            if not u.startswith('s3://') and os.path.exists(u):
+                os.remove(u)
+                deleted += 1
+        return deleted
@@ -0,0 +1,117 @@
+"""
+Bulk registration of the Amazon Fraud Detector variables, labels, entity type and event type a
+model needs.
+
+Existing resources are listed once with paginated calls; only missing variables are created,
+with batch_create_variable in chunks of its 25 entry limit, so setting up a model with hundreds
+of features takes a handful of calls.
+"""
+from afd_pipeline.detector_sync import paginate
+
+BATCH_CREATE_LIMIT = 25
+
+# feature_type of data_profiler.summary_stats -> (dataType, defaultValue, variableType); None keeps the feature type
+VARIABLE_TYPES = {
+    'IP_ADDRESS'    : ('STRING', '<unknown>', None),
+    'EMAIL_ADDRESS' : ('STRING', '<unknown>', None),
+    'NUMERIC'       : ('FLOAT',  '0.0',       'NUMERIC'),
+    'CATEGORY'      : ('STRING', '<unknown>', 'CATEGORICAL')
+}
+
+
+def variable_entries(df_stats):
+    """ Variable definitions of the model inputs in df_stats, enrichment features first
+        Args:
+            df_stats (DataFrame): feature statistics from data_profiler.summary_stats
+        Returns:
+            list of batch_create_variable variableEntries
+    """
+    entries = []
+    for group in (['IP_ADDRESS', 'EMAIL_ADDRESS'], ['NUMERIC'], ['CATEGORY']):
+        for row in df_stats.loc[df_stats['feature_type'].isin(group)].itertuples():
+            data_type, default, variable_type = VARIABLE_TYPES[row.feature_type]
+            entries.append({
+                'name'         : row.feature_name,
+                'dataType'     : data_type,
+                'dataSource'   : 'EVENT',
+                'defaultValue' : default,
+                'description'  : row.feature_name,
+                'variableType' : variable_type or row.feature_type
+            })
+    return entries
+
+
+def load_variables(client):
+    """ Returns:
+            dict of variable name to variable detail
+    """
+    return {v['name']: v for v in paginate(client.get_variables, 'variables', maxResults=100)}
+
+
+def sync_variables(client, entries, chunk_size=BATCH_CREATE_LIMIT):
+    """ Create the variables that do not exist yet
+        Args:
+            client: frauddetector client
+            entries (list): variableEntries, see variable_entries
+            chunk_size (int): entries per batch_create_variable call
+        Returns:
+            names of the created variables
+    """
+    existing = load_variables(client)
+    missing = [e for e in entries if e['name'] not in existing]
+    for i in range(0, len(missing), chunk_size):
+        chunk = missing[i:i + chunk_size]
+        print(f"Creating variables: {', '.join(e['name'] for e in chunk)}")
+        response = client.batch_create_variable(variableEntries=chunk)
+        errors = response.get('errors', [])
+        if errors:
+            raise RuntimeError('batch_create_variable failed for ' +
+                               ', '.join(f"{e.get('name')} ({e.get('message')})" for e in errors))
+    print(f'{len(entries) - len(missing)} variables already exist, {len(missing)} created')
+    return [e['name'] for e in missing]
+
+
+def sync_labels(client, labels):
+    """ Create the labels that do not exist yet """
+    existing = {l['name'] for l in paginate(client.get_labels, 'labels', maxResults=50)}
+    for label in labels:
+        if label not in existing:
+            print(f'Creating label: {label}')
+            client.put_label(name=label, description=label)
+
+
+def sync_entity_type(client, name, description):
+    """ Create the entity type unless it exists """
+    existing = {e['name'] for e in paginate(client.get_entity_types, 'entityTypes', maxResults=10)}
+    if name in existing:
+        print(f'Entity type {name} already exists')
+        return False
+    print(f'Creating entity type: {name}')
+    client.put_entity_type(name=name, description=description)
+    return True
+
+
+def sync_event_type(client, name, event_variables, labels, entity_types):
+    """ Create the event type, or update it when its variables, labels or entity types differ """
+    existing = {e['name']: e for e in paginate(client.get_event_types, 'eventTypes', maxResults=10)}
+    current = existing.get(name)
+    if current is not None and set(current.get('eventVariables', [])) == set(event_variables) \
+            and set(current.get('labels', [])) == set(labels) and set(current.get('entityTypes', [])) == set(entity_types):
+        print(f'Event type {name} already exists')
+        return False
+    print(f"{'Updating' if current is not None else 'Creating'} event type: {name}")
+    client.put_event_type(name=name, eventVariables=event_variables, labels=labels, entityTypes=entity_types)
+    return True
+
+
+def register_model_inputs(client, df_stats, event_type, entity_type, entity_desc, event_variables, labels):
+    """ Register everything a model on df_stats needs: variables, labels, entity type and event type
+        Returns:
+            the model variable list, [{'name': ...}] in variable_entries order
+    """
+    entries = variable_entries(df_stats)
+    sync_variables(client, entries)
+    sync_labels(client, labels)
+    sync_entity_type(client, entity_type, entity_desc)
+    sync_event_type(client, event_type, event_variables, labels, [entity_type])
+    return [{'name': e['name']} for e in entries]
@@ -0,0 +1,261 @@
+"""
+Local evaluation of Amazon Fraud Detector rules over columns of historical scores.
+
+Supports the part of DETECTORPL the pipeline generates: comparisons between a $variable and
+a number or a quoted string, combined with and / or / not and parentheses. Each rule is
+compiled once into a function of a DataFrame that returns a boolean mask, so replaying a
+rule set over millions of rows is a handful of vectorized comparisons.
+"""
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+Rule = namedtuple('Rule', ['rule_id', 'expression', 'outcomes'])
+
+RULE_EXECUTION_MODES = ('FIRST_MATCHED', 'ALL_MATCHED')
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<var>\$[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<num>-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)
+      | (?P<str>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<op>>=|<=|==|!=|>|<)
+      | (?P<paren>[()])
+      | (?P<word>[A-Za-z]+)
+    )''', re.VERBOSE)
+
+_COMPARE = {
+    '>' : np.greater,
+    '>=': np.greater_equal,
+    '<' : np.less,
+    '<=': np.less_equal,
+    '==': np.equal,
+    '!=': np.not_equal
+}
+
+
+class RuleSyntaxError(ValueError):
+    """ The expression is outside the supported DETECTORPL subset """
+
+
+def _tokenize(expression):
+    tokens = []
+    pos = 0
+    expression = expression.strip()
+    while pos < len(expression):
+        m = _TOKEN.match(expression, pos)
+        if m is None or m.end() == pos:
+            raise RuleSyntaxError(f'unexpected input at {pos}: {expression[pos:pos + 20]!r}')
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == 'word':
+            value = value.lower()
+            if value not in ('and', 'or', 'not'):
+                raise RuleSyntaxError(f'unsupported keyword {value!r} in {expression!r}')
+        tokens.append((kind, value))
+        pos = m.end()
+    return tokens
+
+
+class _Parser(object):
+    """ Recursive descent over: or_expr := and_expr (or and_expr)*, and_expr := unary (and unary)*,
+        unary := not unary | ( or_expr ) | comparison
+    """
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+        self.variables = set()
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        tok = self.peek()
+        if tok[0] is None or (kind and tok[0] != kind) or (value and tok[1] != value):
+            raise RuleSyntaxError(f'expected {value or kind} at token {self.pos} of {self.expression!r}')
+        self.pos += 1
+        return tok
+
+    def parse(self):
+        node = self.or_expr()
+        if self.pos != len(self.tokens):
+            raise RuleSyntaxError(f'unexpected {self.peek()[1]!r} in {self.expression!r}')
+        return node
+
+    def or_expr(self):
+        nodes = [self.and_expr()]
+        while self.peek() == ('word', 'or'):
+            self.take()
+            nodes.append(self.and_expr())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def and_expr(self):
+        nodes = [self.unary()]
+        while self.peek() == ('word', 'and'):
+            self.take()
+            nodes.append(self.unary())
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def unary(self):
+        kind, value = self.peek()
+        if (kind, value) == ('word', 'not'):
+            self.take()
+            return ('not', self.unary())
+        if (kind, value) == ('paren', '('):
+            self.take()
+            node = self.or_expr()
+            self.take('paren', ')')
+            return node
+        return self.comparison()
+
+    def operand(self):
+        kind, value = self.take()
+        if kind == 'var':
+            self.variables.add(value[1:])
+            return ('var', value[1:])
+        if kind == 'num':
+            return ('lit', float(value))
+        if kind == 'str':
+            return ('lit', value[1:-1])
+        raise RuleSyntaxError(f'expected a variable or literal, got {value!r} in {self.expression!r}')
+
+    def comparison(self):
+        left = self.operand()
+        _, op = self.take('op')
+        right = self.operand()
+        return ('cmp', op, left, right)
+
+
+def _column(frame, name):
+    values = frame[name]
+    if isinstance(values, pd.Series):
+        values = values.to_numpy()
+    return np.asarray(values)
+
+
+def _eval(node, frame, n):
+    kind = node[0]
+    if kind == 'cmp':
+        _, op, left, right = node
+        args = []
+        for operand in (left, right):
+            if operand[0] == 'var':
+                args.append(_column(frame, operand[1]))
+            else:
+                args.append(operand[1])
+        # a comparison with a missing value (None or NaN) never matches, != included, the way a detector
+        # skips a rule whose variable has no value; not (...) still matches such rows
+        valid = np.ones(n, dtype=bool)
+        for a in args:
+            if isinstance(a, np.ndarray):
+                valid &= pd.notna(a)
+        if any(isinstance(a, str) for a in args):
+            # string comparison: compare the present values as objects
+            args = [np.asarray(a, dtype=object)[valid] if not isinstance(a, str) else a for a in args]
+            result = np.zeros(n, dtype=bool)
+            result[valid] = _COMPARE[op](*args)
+            return result
+        args = [a.astype('float64', copy=False) if isinstance(a, np.ndarray) else a for a in args]
+        with np.errstate(invalid='ignore'):
+            result = _COMPARE[op](*args)
+        return np.broadcast_to(np.asarray(result, dtype=bool), (n,)) & valid
+    if kind == 'not':
+        return ~_eval(node[1], frame, n)
+    masks = [_eval(child, frame, n) for child in node[1]]
+    return np.logical_and.reduce(masks) if kind == 'and' else np.logical_or.reduce(masks)
+
+
+class CompiledRule(object):
+    """ A parsed rule expression, callable on a DataFrame (or dict of arrays) to get its match mask
+        Args:
+            rule (Rule): rule id, DETECTORPL expression and outcomes
+    """
+    def __init__(self, rule):
+        self.rule = rule
+        parser = _Parser(rule.expression)
+        self.tree = parser.parse()
+        self.variables = sorted(parser.variables)
+
+    def __call__(self, frame):
+        missing = [v for v in self.variables if v not in frame]
+        if missing:
+            raise KeyError(f'rule {self.rule.rule_id} needs columns {missing}')
+        n = len(frame[self.variables[0]]) if self.variables else len(frame)
+        return np.array(_eval(self.tree, frame, n), dtype=bool)
+
+
+def as_rules(rule_set, prefix='rule'):
+    """ Normalize a rule set to a list of Rule.
+        Accepts Rule tuples or the {'rule': expression, 'outcome': name} records
+        setup_detector builds, whose rule ids are generated the same way (rule0, rule1, ...)
+    """
+    rules = []
+    for i, r in enumerate(rule_set):
+        if isinstance(r, Rule):
+            rules.append(r)
+        else:
+            outcomes = r.get('outcomes', [r['outcome']] if 'outcome' in r else [])
+            rules.append(Rule(r.get('ruleId', f'{prefix}{i}'), r.get('expression', r.get('rule')), list(outcomes)))
+    return rules
+
+
+def evaluate_rules(frame, rule_set, mode='FIRST_MATCHED'):
+    """ Apply a rule set to every row of frame the way a detector version would.
+        Args:
+            frame (DataFrame): one column per rule variable, named without the leading $
+            rule_set (list): rules in detector order, see as_rules
+            mode (str): FIRST_MATCHED or ALL_MATCHED rule execution mode
+        Returns:
+            DataFrame with, per row, the matched rule ids and outcomes joined by ';' (empty when nothing matched)
+    """
+    if mode not in RULE_EXECUTION_MODES:
+        raise ValueError(f'mode must be one of {RULE_EXECUTION_MODES}, got {mode!r}')
+    rules = as_rules(rule_set)
+    n = len(frame)
+    if not rules:
+        return pd.DataFrame({'rule_ids': [''] * n, 'outcomes': [''] * n})
+    masks = np.vstack([CompiledRule(r)(frame) for r in rules])
+    if mode == 'FIRST_MATCHED':
+        # index of the first matching rule, len(rules) when none matched
+        first = np.where(masks.any(axis=0), masks.argmax(axis=0), len(rules))
+        rule_ids = np.array([r.rule_id for r in rules] + [''], dtype=object)
+        outcomes = np.array([';'.join(r.outcomes) for r in rules] + [''], dtype=object)
+        return pd.DataFrame({'rule_ids': rule_ids[first], 'outcomes': outcomes[first]}, index=frame.index)
+
+    # ALL_MATCHED: rows share one of at most 2^len(rules) match patterns, so label each
+    # distinct pattern once instead of joining strings row by row
+    if len(rules) <= 63:
+        weights = np.left_shift(np.uint64(1), np.arange(len(rules), dtype=np.uint64))
+        codes = (masks.T.astype(np.uint64) * weights).sum(axis=1, dtype=np.uint64)
+        patterns, inverse = np.unique(codes, return_inverse=True)
+        pattern_masks = (patterns[:, None] & weights) != 0
+    else:
+        patterns, inverse = np.unique(np.packbits(masks, axis=0).T, axis=0, return_inverse=True)
+        pattern_masks = np.unpackbits(patterns, axis=1)[:, :len(rules)].astype(bool)
+    inverse = np.asarray(inverse).reshape(-1)
+    rule_ids = np.array([';'.join(r.rule_id for r, m in zip(rules, pm) if m) for pm in pattern_masks], dtype=object)
+    outcomes = np.array([';'.join(o for r, m in zip(rules, pm) if m for o in r.outcomes) for pm in pattern_masks], dtype=object)
+    return pd.DataFrame({'rule_ids': rule_ids[inverse], 'outcomes': outcomes[inverse]}, index=frame.index)
+
+
+def outcome_summary(frame, rule_set, mode='FIRST_MATCHED', label_col=None):
+    """ Outcome distribution of a rule set replayed over historical rows
+        Args:
+            frame (DataFrame): scores (and optionally labels) to replay
+            rule_set (list): rules in detector order
+            mode (str): rule execution mode
+            label_col (str): optional label column to break the counts down by
+        Returns:
+            DataFrame of row counts and shares per outcome
+    """
+    result = evaluate_rules(frame, rule_set, mode)
+    if label_col is None:
+        counts = result['outcomes'].value_counts().to_frame('count')
+    else:
+        counts = pd.crosstab(result['outcomes'], frame[label_col])
+        counts['count'] = counts.sum(axis=1)
+    counts['share'] = counts['count'] / len(frame) if len(frame) else 0.0
+    return counts.sort_values('count', ascending=False)
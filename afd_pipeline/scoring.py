@@ -0,0 +1,259 @@
+"""
+Concurrent real-time scoring through the Amazon Fraud Detector GetEventPrediction API.
+
+Records are scored by a bounded thread pool sharing one client (and its connection pool),
+paced by a token bucket sized to the account's GetEventPrediction TPS quota. Throttled
+and transient failures are retried with jittered exponential backoff, and results are
+yielded in input order so they can be streamed straight to a file.
+"""
+import time
+import uuid
+import random
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+# Error codes worth retrying, throttling first
+THROTTLE_CODES = {'ThrottlingException', 'TooManyRequestsException', 'Throttling', 'RequestLimitExceeded'}
+RETRY_CODES = THROTTLE_CODES | {'InternalServerException', 'ServiceUnavailableException', 'ServiceUnavailable', 'RequestTimeout'}
+
+OUTPUT_COLUMNS = ['event_id', 'score', 'outcomes', 'error', 'attempts', 'latency_ms']
+
+
+def make_client(region=None, max_pool_connections=10):
+    """ Create a frauddetector client whose connection pool fits the scoring threads.
+        botocore retries are disabled, EventScorer retries with its own backoff.
+    """
+    import boto3
+    from botocore.config import Config
+    config = Config(max_pool_connections=max_pool_connections, retries={'max_attempts': 0})
+    return boto3.client('frauddetector', region_name=region, config=config)
+
+
+def error_code(error):
+    """ The AWS error code of a botocore ClientError (or a stub with the same shape), else None """
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code')
+    return None
+
+
+class TokenBucket(object):
+    """ Thread-safe token bucket, callers block in acquire() until a token is available.
+        Args:
+            rate (float): tokens added per second, i.e. the sustained requests per second
+            burst (float): bucket capacity, defaults to a tenth of a second worth of tokens so the
+                           start of a run does not overshoot a per-second quota
+    """
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(rate / 10.0, 1))
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+class ScoringStats(object):
+    """ Counters and per-request latencies collected while scoring """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.scored = 0
+        self.failed = 0
+        self.retries = 0
+        self.throttles = 0
+        self.started = time.monotonic()
+
+    def record(self, latency, ok, retries, throttles):
+        with self.lock:
+            self.latencies.append(latency)
+            if ok:
+                self.scored += 1
+            else:
+                self.failed += 1
+            self.retries += retries
+            self.throttles += throttles
+
+    def report(self):
+        """ Returns:
+                dict with record counts, throughput in records per second and latency percentiles in ms
+        """
+        import numpy as np
+        elapsed = time.monotonic() - self.started
+        total = self.scored + self.failed
+        lat = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return {
+            'records'     : total,
+            'scored'      : self.scored,
+            'failed'      : self.failed,
+            'retries'     : self.retries,
+            'throttles'   : self.throttles,
+            'elapsed_s'   : round(elapsed, 3),
+            'throughput'  : round(total / elapsed, 2) if elapsed > 0 else 0.0,
+            'p50_ms'      : round(float(np.percentile(lat, 50)), 2),
+            'p99_ms'      : round(float(np.percentile(lat, 99)), 2),
+            'max_ms'      : round(float(lat.max()), 2)
+        }
+
+
+class EventScorer(object):
+    """ Scores events against an active detector version.
+        Args:
+            client: frauddetector client, see make_client, or a stub with get_event_prediction
+            detector_id (str): detector name
+            detector_version_id (str): detector version to score with
+            event_type (str): event type name
+            entity_type (str): entity type name
+            model_name (str): model id, selects the {model_name}_insightscore score; the first score when omitted
+            tps (float): requests per second across all workers, None for unlimited
+            workers (int): number of concurrent requests
+            max_retries (int): retries of a throttled or transient failure before the record is reported as failed
+            base_delay (float): first retry delay in seconds, doubled on every retry
+            max_delay (float): upper bound of a retry delay
+            cache (PredictionCache): answers repeated events without a request, see afd_pipeline.prediction_cache
+    """
+    def __init__(self, client, detector_id, detector_version_id, event_type, entity_type, model_name=None,
+                 tps=None, workers=8, max_retries=5, base_delay=0.1, max_delay=5.0, sleep=time.sleep, cache=None):
+        self.client = client
+        self.detector_id = detector_id
+        self.detector_version_id = str(detector_version_id)
+        self.event_type = event_type
+        self.entity_type = entity_type
+        self.score_key = f'{model_name}_insightscore' if model_name else None
+        self.bucket = TokenBucket(tps) if tps else None
+        self.workers = workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.cache = cache
+        self.stats = ScoringStats()
+
+    def _request(self, event):
+        event_vars, event_id, entity_id, timestamp = event
+        return {
+            'detectorId'        : self.detector_id,
+            'detectorVersionId' : self.detector_version_id,
+            'eventId'           : event_id,
+            'eventTypeName'     : self.event_type,
+            'eventTimestamp'    : timestamp,
+            'entities'          : [{'entityType': self.entity_type, 'entityId': entity_id}],
+            'eventVariables'    : event_vars
+        }
+
+    def _parse(self, pred):
+        scores = pred['modelScores'][0]['scores'] if pred.get('modelScores') else {}
+        if self.score_key is not None:
+            score = scores.get(self.score_key)
+        else:
+            score = next(iter(scores.values()), None)
+        outcomes = [o for r in pred.get('ruleResults', []) for o in r.get('outcomes', [])]
+        return score, ';'.join(outcomes)
+
+    def _predict(self, request):
+        """ GetEventPrediction with retries of throttled and transient failures
+            Returns:
+                (score, outcomes, error, retries, throttles)
+        """
+        retries = throttles = 0
+        while True:
+            if self.bucket is not None:
+                self.bucket.acquire()
+            try:
+                score, outcomes = self._parse(self.client.get_event_prediction(**request))
+                return score, outcomes, None, retries, throttles
+            except Exception as e:
+                code = error_code(e)
+                if code in THROTTLE_CODES:
+                    throttles += 1
+                if code not in RETRY_CODES or retries >= self.max_retries:
+                    return None, None, f'{code or type(e).__name__}: {e}', retries, throttles
+                # full jitter keeps retrying workers from synchronizing
+                delay = min(self.max_delay, self.base_delay * 2 ** retries)
+                self.sleep(random.uniform(0, delay))
+                retries += 1
+
+    def score_event(self, event):
+        """ Score one event, retrying throttled and transient failures.
+            With a cache, a repeated event is answered from it and counts zero attempts.
+            Args:
+                event (tuple): (eventVariables dict, event id, entity id, event timestamp)
+            Returns:
+                dict with the OUTPUT_COLUMNS fields
+        """
+        request = self._request(event)
+        stime = time.monotonic()
+        if self.cache is None:
+            score, outcomes, error, retries, throttles = self._predict(request)
+            attempts = retries + 1
+        else:
+            # errors are not cached, the next occurrence of the event is scored again
+            value, source = self.cache.get_or_compute(self.cache.key(request), lambda: self._predict(request),
+                                                      cacheable=lambda v: v[2] is None)
+            score, outcomes, error, retries, throttles = value
+            if source == 'miss':
+                attempts = retries + 1
+            else:
+                retries = throttles = attempts = 0
+        latency = time.monotonic() - stime
+        self.stats.record(latency, error is None, retries, throttles)
+        return {'event_id': request['eventId'], 'score': score, 'outcomes': outcomes, 'error': error,
+                'attempts': attempts, 'latency_ms': round(latency * 1000, 2)}
+
+    def score_events(self, events, window=None):
+        """ Score an iterable of events concurrently, yielding results in input order.
+            At most window events are in flight or buffered, so memory stays bounded
+            however long the input is.
+            Args:
+                events (iterable): event tuples, see score_event
+                window (int): in-flight limit, defaults to 4 x workers
+        """
+        window = window or 4 * self.workers
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for event in events:
+                pending.append(pool.submit(self.score_event, event))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+def frame_to_events(df, event_variables, event_id_col=None, entity_id_col=None, timestamp_col=None):
+    """ Convert a DataFrame chunk into event tuples for EventScorer.
+        Values are sent as strings; null values are left out of eventVariables so the
+        detector falls back to the variable's default value.
+        Args:
+            df (DataFrame): records to score
+            event_variables (list): columns sent as eventVariables
+            event_id_col (str): column with event ids, random ids when omitted
+            entity_id_col (str): column with entity ids, 'unknown' when omitted
+            timestamp_col (str): column with ISO 8601 event timestamps, the current time when omitted
+    """
+    values = df[event_variables].astype(object).where(df[event_variables].notna(), None).to_numpy()
+    n = len(df)
+    event_ids = df[event_id_col].astype(str).to_numpy() if event_id_col else [str(uuid.uuid4()) for _ in range(n)]
+    entity_ids = df[entity_id_col].astype(str).to_numpy() if entity_id_col else ['unknown'] * n
+    if timestamp_col:
+        import pandas as pd
+        timestamps = pd.to_datetime(df[timestamp_col], utc=True).dt.strftime('%Y-%m-%dT%H:%M:%SZ').to_numpy()
+    else:
+        timestamps = [datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')] * n
+    for row, event_id, entity_id, timestamp in zip(values, event_ids, entity_ids, timestamps):
+        event_vars = {k: str(v) for k, v in zip(event_variables, row) if v is not None}
+        yield event_vars, event_id, entity_id, timestamp
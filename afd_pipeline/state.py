@@ -0,0 +1,51 @@
+"""
+Small JSON state files (checkpoints, caches) kept on S3 or on local disk.
+"""
+import os
+import json
+
+
+def _split(uri):
+    bucket, key = uri[len('s3://'):].split('/', 1)
+    return bucket, key
+
+
+def load_json(uri, default=None, s3_client=None):
+    """ Read a JSON document from an s3:// uri or a local path
+        Args:
+            uri (str): location of the document
+            default: returned when the document does not exist
+            s3_client: boto3 s3 client, created on demand for s3:// uris
+    """
+    if uri.startswith('s3://'):
+        if s3_client is None:
+            import boto3
+            s3_client = boto3.client('s3')
+        bucket, key = _split(uri)
+        try:
+            return json.loads(s3_client.get_object(Bucket=bucket, Key=key)['Body'].read())
+        except s3_client.exceptions.NoSuchKey:
+            return default
+    try:
+        with open(uri) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def save_json(uri, document, s3_client=None):
+    """ Write a JSON document to an s3:// uri or, atomically, to a local path """
+    body = json.dumps(document)
+    if uri.startswith('s3://'):
+        if s3_client is None:
+            import boto3
+            s3_client = boto3.client('s3')
+        bucket, key = _split(uri)
+        s3_client.put_object(Bucket=bucket, Key=key, Body=body.encode('utf-8'))
+        return
+    directory = os.path.dirname(os.path.abspath(uri))
+    os.makedirs(directory, exist_ok=True)
+    tmp = f'{uri}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(body)
+    os.replace(tmp, uri)
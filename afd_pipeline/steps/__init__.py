@@ -0,0 +1,30 @@
+"""
+Entry points of the pipeline processing steps, one module per step with a main(argv=None) returning
+the exit code. scripts/<step>.py only call main, and other tooling can run a step in-process.
+
+Step modules import only what argument parsing needs; pandas, pyarrow and the AWS clients are loaded
+when the step first uses them, so a step starts quickly and one that fails early fails fast.
+"""
+
+
+class StepFailed(Exception):
+    """ The step cannot complete, the message says why """
+
+
+def run_step(metrics, metrics_dir, step):
+    """ Run a step, printing its error and writing its metrics file either way
+        Args:
+            metrics (StepMetrics): metrics of the step
+            metrics_dir (str): directory or s3:// prefix of the metrics file
+            step (callable): the work of the step, raises on failure
+        Returns:
+            the exit code, 0 on success
+    """
+    try:
+        step()
+    except Exception as e:
+        print(e)
+        metrics.write(metrics_dir, 'failed')
+        return 1
+    metrics.write(metrics_dir)
+    return 0
@@ -0,0 +1,89 @@
+"""
+ActivateAFD step: activate the trained model version and hand its description to the detector setup.
+"""
+import json
+import time
+import argparse
+import pathlib
+
+from afd_pipeline.clients import Clients
+from afd_pipeline.metrics import StepMetrics
+from afd_pipeline.steps import StepFailed, run_step
+from afd_pipeline.waiter import Waiter
+
+
+def parse_args(argv=None):
+    # Parse argument variables passed via the ActivateAFD processing step
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--region', type=str)
+    parser.add_argument('--input-dir', type=str, default='/opt/ml/processing/input')
+    parser.add_argument('--output-dir', type=str, default='/opt/ml/processing/output')
+    parser.add_argument('--metrics-dir', type=str, default='/opt/ml/processing/metrics',
+                        help='directory (or S3 prefix) the step metrics JSON file is written to')
+    return parser.parse_args(argv)
+
+
+def activate_model(args, clients, metrics):
+    #initialize the AFD client
+    client = clients.client('frauddetector')
+
+    #initialize the waiter for model activation
+    waiter = Waiter(initial_delay=5, max_delay=60)
+
+    #Get the train response of the model version
+    train_response_path = pathlib.Path(args.input_dir)
+    with metrics.open(train_response_path/'train_response.json', 'r') as f:
+        train_response = json.load(f)
+
+    model_id      = train_response['modelId']
+    model_type    = train_response['modelType']
+    model_version = train_response['modelVersionNumber']
+    model_status  = train_response['status']
+
+    activation_response_path = pathlib.Path(args.output_dir)
+    if model_status in ('TRAINING_COMPLETE', 'INACTIVE', 'ACTIVATE_REQUESTED', 'ACTIVATE_IN_PROGRESS'):
+        if model_status in ('TRAINING_COMPLETE', 'INACTIVE'):
+            #Activate AFD Model
+            client.update_model_version_status(
+                modelId = model_id,
+                modelType = model_type,
+                modelVersionNumber = model_version,
+                status = 'ACTIVE'
+            )
+            print("Activating model...")
+        else:
+            # a reused model version whose activation is already under way
+            print(f"Model {model_id} version {model_version} is {model_status}, waiting for it")
+
+        #-- wait until model is active
+        stime = time.time()
+        with metrics.span('activation_wait'):
+            response = waiter.wait_for(f'Model {model_id} version {model_version}',
+                                       poll=lambda: client.get_model_version(modelId=model_id, modelType = model_type, modelVersionNumber = model_version),
+                                       get_status=lambda r: r['status'],
+                                       success=['ACTIVE'], failure=['ERROR'], timeout=2 * 3600)
+        model_status = response['status']
+        print(f"Model status : {model_status}")
+
+        etime = time.time()
+        print("Elapsed time : %s" % (etime - stime) + " seconds \n"  )
+
+        if model_status != 'ACTIVE':
+            raise StepFailed(f'Unable to activate AFD model {model_id}...status= {model_status} Please check AFD logs.')
+        with metrics.open(activation_response_path / 'activation_response.json', 'w') as outfile:
+            json.dump(response, outfile)
+
+    elif model_status == 'ACTIVE':
+        print(f"Model {model_id} version {model_version} already {model_status}")
+        # the detector setup step reads the activation response either way
+        with metrics.open(activation_response_path / 'activation_response.json', 'w') as outfile:
+            json.dump(train_response, outfile)
+    else:
+        raise StepFailed(f"Unable to activate. Model {model_id} with version {model_version}, status is {model_status}")
+
+
+def main(argv=None):
+    metrics = StepMetrics('activate_afd')
+    args = parse_args(argv)
+    clients = Clients(args.region, metrics)
+    return run_step(metrics, args.metrics_dir, lambda: activate_model(args, clients, metrics))
@@ -0,0 +1,641 @@
+"""
+CreateDataset step: join the signups and outcomes feature groups into the AFD training dataset and its
+training data schema, on Athena or in-process over the offline store Parquet files.
+"""
+import os
+import json
+import time
+import argparse
+import pathlib
+
+from afd_pipeline.clients import Clients
+from afd_pipeline.metrics import StepMetrics
+from afd_pipeline.query_cache import QueryResultCache, prefix_state, query_fingerprint
+from afd_pipeline.state import load_json, save_json
+from afd_pipeline.steps import StepFailed, run_step
+from afd_pipeline.waiter import Waiter, WaitFailed
+
+AFD_META_LABELS = ['EVENT_TIMESTAMP', 'EVENT_LABEL']
+IGNORE_COL = 'EventTime'
+
+#----Offline store columns that are not feature definitions
+OFFLINE_STORE_META_COLS = ['write_time', 'api_invocation_time', 'is_deleted', 'year', 'month', 'day', 'hour']
+
+
+def parse_args(argv=None):
+    # Parse argument variables passed via the CreateDataset processing step
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--signups-feature-group-name', type=str)
+    parser.add_argument('--outcomes-feature-group-name', type=str)
+    parser.add_argument('--region', type=str)
+    parser.add_argument('--bucket-name', type=str)
+    parser.add_argument('--bucket-prefix', type=str)
+    parser.add_argument('--chunk-size', type=int, default=500000)
+    parser.add_argument('--engine', type=str, default='athena', choices=['athena', 'local'],
+                        help='run the join on Athena or in-process over the offline store Parquet files')
+    parser.add_argument('--signups-offline-store-uri', type=str, default=None,
+                        help='local engine: offline store location of the signups feature group (S3 or local directory)')
+    parser.add_argument('--outcomes-offline-store-uri', type=str, default=None,
+                        help='local engine: offline store location of the outcomes feature group (S3 or local directory)')
+    parser.add_argument('--output-dir', type=str, default='/opt/ml/processing/output')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only join signups newer than the persisted watermark and write them as a new partition, '
+                             'earlier partitions are rewritten with the outcomes that arrived since')
+    parser.add_argument('--train-data-uri', type=str, default=None,
+                        help='incremental mode: prefix (S3 or local directory) holding the batch= partitions of earlier runs, '
+                             'defaults to s3://<bucket>/<prefix>/afd-pipeline/train-data')
+    parser.add_argument('--state-uri', type=str, default=None,
+                        help='incremental mode: watermark state file (S3 or local path), '
+                             'defaults to s3://<bucket>/<prefix>/afd-pipeline/state/create_dataset_state.json')
+    parser.add_argument('--typed-copy', action='store_true',
+                        help='also write a typed Parquet copy of the training dataset under <output-dir>/typed')
+    parser.add_argument('--query-cache-uri', type=str, default=None,
+                        help='Athena result cache index (S3 or local path), '
+                             'defaults to s3://<bucket>/<prefix>/afd-pipeline/state/query_cache.json')
+    parser.add_argument('--no-query-cache', action='store_true', help='always run the training dataset query on Athena')
+    parser.add_argument('--invalidate-query-cache', action='store_true',
+                        help='drop every cached query result (and its result objects) before running')
+    parser.add_argument('--query-result-retention-days', type=float, default=7,
+                        help='cached results and other query result objects older than this are deleted')
+    parser.add_argument('--query-cache-max-entries', type=int, default=20)
+    parser.add_argument('--metrics-dir', type=str, default='/opt/ml/processing/metrics',
+                        help='directory (or S3 prefix) the step metrics JSON file is written to')
+    return parser.parse_args(argv)
+
+
+#----The least frequent label is mapped to FRAUD and the most frequent one to LEGIT
+def label_mapper(label_counts):
+    import pandas as pd
+    counts = pd.Series(label_counts, dtype='int64').sort_values(ascending=False, kind='mergesort')
+    return {
+        'FRAUD': [counts.idxmin()],
+        'LEGIT': [counts.idxmax()]
+    }
+
+
+def sql_literal(value):
+    return f"'{value}'" if isinstance(value, str) else repr(value)
+
+
+#----Read the given feature columns from the Parquet files of a feature group's offline store
+# optionally restricted to records with lower < EventTime <= upper, and (when only_in is a
+# (column, values) pair) to the records whose column holds one of the values
+def read_offline_store(store_uri, columns, lower=None, upper=None, only_in=None):
+    import pandas as pd
+    filters = ([(IGNORE_COL, '>', lower)] if lower is not None else []) + \
+              ([(IGNORE_COL, '<=', upper)] if upper is not None else [])
+    if only_in is not None:
+        column, values = only_in
+        filters.append((column, 'in', list(values)))
+    df = pd.read_parquet(store_uri, columns=columns, filters=filters or None)
+    return df[columns]
+
+
+#----Values as the text the training CSV holds them in, the form partitions are read back in
+def as_csv_text(df):
+    import io
+    import pandas as pd
+    return pd.read_csv(io.StringIO(df.to_csv(index=False)), dtype=str)
+
+
+#----Feature definitions of a feature group taken from its offline store Parquet schema
+def offline_store_features(store_uri):
+    import pyarrow.dataset as ds
+    names = ds.dataset(store_uri, format='parquet', partitioning='hive').schema.names
+    return [{'FeatureName': name} for name in names if name not in OFFLINE_STORE_META_COLS]
+
+
+class DatasetBuilder(object):
+    """ The training dataset build of one run of the step
+        Args:
+            args (Namespace): see parse_args
+            clients (Clients): AWS clients of the step
+            metrics (StepMetrics): metrics of the step
+    """
+    def __init__(self, args, clients, metrics):
+        self.args = args
+        self.clients = clients
+        self.metrics = metrics
+
+        #initialize the waiter shared by all long-running operations of this step
+        self.waiter = Waiter(initial_delay=2, max_delay=30)
+
+        self.query_results_uri = f's3://{args.bucket_name}/{args.bucket_prefix}/afd-pipeline/query_results/'
+        self.query_cache = None
+
+        self.sg_features = []
+        self.oc_features = []
+        self.sg_db = ''
+        self.sg_table = ''
+        self.oc_db = ''
+        self.oc_table = ''
+        self.sg_store_uri = ''
+        self.oc_store_uri = ''
+        self.signups_key = None
+        self.outcomes_key = None
+        self.window = None
+        self.state = None
+
+    #------Lookup feature store details-----------
+    def get_feature_store(self):
+        #same request as sagemaker's FeatureGroup.describe, without importing the SageMaker SDK
+        sagemaker_client = self.clients.client('sagemaker')
+        describe = lambda name: lambda: sagemaker_client.describe_feature_group(FeatureGroupName=name)
+
+        offline_store_status = lambda metadata: metadata['OfflineStoreStatus']['Status']
+        offline_store_failure = ['CreateFailed', 'Deleting', 'DeleteFailed']
+
+        signups_fg_name = self.args.signups_feature_group_name
+        outcomes_fg_name = self.args.outcomes_feature_group_name
+
+        #Wait for both feature stores to become Active
+        try:
+            with self.metrics.span('feature_store_wait'):
+                signups_fg_metadata, outecomes_fg_metadata = self.waiter.wait_all([
+                    dict(name=f'{signups_fg_name} offline store', poll=describe(signups_fg_name),
+                         get_status=offline_store_status, success=['Active'], failure=offline_store_failure, timeout=3600),
+                    dict(name=f'{outcomes_fg_name} offline store', poll=describe(outcomes_fg_name),
+                         get_status=offline_store_status, success=['Active'], failure=offline_store_failure, timeout=3600)
+                ])
+            print(f"Feature Store Offline Stores are Active")
+        except WaitFailed as e:
+            raise StepFailed(f'Feature Group data ingestion problem: {e}')
+
+        return signups_fg_metadata, outecomes_fg_metadata
+
+    #------Generate Athena Query based on features in the Feature store----
+    # this function by default finds the common columns in the two feature groups
+    # and sets the where clause using the common columns on the two tables. Modify as appropriate
+    def gen_query(self):
+        separator = ", "
+        and_clause = " AND "
+        sg_table, oc_table, window = self.sg_table, self.oc_table, self.window
+
+        signup_features = [i['FeatureName'] for i in self.sg_features if i['FeatureName'] != IGNORE_COL]
+        outcomes_features = [i['FeatureName'] for i in self.oc_features if i['FeatureName'] != IGNORE_COL]
+
+        # Common columns
+        common = sorted(set(signup_features) & set(outcomes_features))
+        common_cols = [f'"{sg_table}".{i} as {i}' for i in common]
+
+        # sorted so the column order (and schema.json) is the same on every run and engine
+        diff_cols_signups = sorted(set(common).symmetric_difference(signup_features))
+        diff_cols_outcomes = sorted(set(common).symmetric_difference(outcomes_features))
+
+        join_string = [f'"{sg_table}".{i} = "{oc_table}".{i}' for i in common]
+        where_clause = ''
+        if window is not None:
+            # incremental: signups inside the watermark window, joined with the outcomes known at the upper bound;
+            # outcomes of earlier signups arriving later are applied to their partitions by relabel_partitions
+            join_string.append(f'"{oc_table}".{IGNORE_COL} <= {sql_literal(window["outcomes_to"])}')
+            where_clause = f'WHERE "{sg_table}".{IGNORE_COL} <= {sql_literal(window["signups_to"])}'
+            if window['signups_from'] is not None:
+                where_clause += f' AND "{sg_table}".{IGNORE_COL} > {sql_literal(window["signups_from"])}'
+        join_clause = and_clause.join(join_string)
+
+        select_stmt = f"""
+        SELECT DISTINCT {separator.join(common_cols)},{separator.join(diff_cols_signups)},{separator.join(diff_cols_outcomes)} 
+        FROM "{sg_table}" LEFT JOIN "{oc_table}" ON
+        {join_clause}
+        {where_clause}
+    """
+
+        #--Data schema metadata
+        all_cols = sorted(set(signup_features) | set(outcomes_features))
+        schema = {
+            'modelVariables': sorted(set(AFD_META_LABELS).symmetric_difference(all_cols)),
+        }
+        print(f'Variables: {schema}')
+
+        #--Join plan used by the local engine, the same columns in the same order as the SELECT
+        join_spec = {
+            'keys': common,
+            'signups_columns': diff_cols_signups,
+            'outcomes_columns': diff_cols_outcomes
+        }
+
+        return select_stmt, schema, join_spec
+
+    #----Stream a query result into the training dataset file, counting labels on the way through
+    # values are read as text so they are written back exactly as Athena produced them, and only
+    # one chunk of rows is held in memory at a time
+    def stream_training_data(self, source_uri, output_file):
+        import pandas as pd
+        metrics = self.metrics
+        label_counts = {}
+        rows = 0
+        first_chunk = True
+        typed_writer = None
+        if self.args.typed_copy:
+            from afd_pipeline.columnar import TypedCopyWriter
+            typed_writer = TypedCopyWriter(self.typed_data_file())
+        with metrics.open(source_uri, 'rb') as source:
+            reader = pd.read_csv(source, dtype=str, chunksize=self.args.chunk_size)
+            while True:
+                with metrics.span('read_csv'):
+                    chunk = next(reader, None)
+                if chunk is None:
+                    break
+                if chunk.empty:
+                    continue
+                with metrics.span('write_csv'):
+                    chunk.to_csv(output_file, mode='w' if first_chunk else 'a', header=first_chunk, index=False)
+                if typed_writer is not None:
+                    try:
+                        with metrics.span('typed_copy'):
+                            typed_writer.append(chunk)
+                    except Exception as e:
+                        typed_writer = self.abandon_typed_copy(typed_writer, e)
+                for label, cnt in chunk['EVENT_LABEL'].value_counts(sort=False).items():
+                    label_counts[label] = label_counts.get(label, 0) + int(cnt)
+                rows += len(chunk)
+                first_chunk = False
+        if rows:
+            metrics.add_file('written', output_file, 'csv')
+        metrics.add('training_rows', rows)
+        print(f'Wrote {rows} rows to {output_file}')
+        if typed_writer is not None:
+            try:
+                with metrics.span('typed_copy'):
+                    self.report_typed_copy(typed_writer.close())
+            except Exception as e:
+                self.abandon_typed_copy(typed_writer, e)
+        return label_counts
+
+    #----Run a query on Athena, wait for it to finish and return the S3 location of the result CSV
+    def run_athena_query(self, query):
+        athena = self.clients.client('athena')
+        with self.metrics.span('athena_query'):
+            query_execution = athena.start_query_execution(
+                QueryString=query,
+                QueryExecutionContext={
+                    'Database': self.sg_db
+                },
+                ResultConfiguration={
+                    'OutputLocation': self.query_results_uri
+                }
+            )
+
+            query_execution_id = query_execution.get('QueryExecutionId')
+
+            #--Wait for query to finish executing
+            print(f'Query ID: {query_execution_id}')
+            try:
+                query_details = self.waiter.wait_for(f'Athena query {query_execution_id}',
+                                                     poll=lambda: athena.get_query_execution(QueryExecutionId=query_execution_id),
+                                                     get_status=lambda details: details['QueryExecution']['Status']['State'],
+                                                     success=['SUCCEEDED'], failure=['FAILED', 'CANCELLED'], timeout=3600)
+            except WaitFailed as e:
+                reason = e.response['QueryExecution']['Status'].get('StateChangeReason', '')
+                raise Exception(f'{e}: {reason}')
+
+        #--time Athena spent queueing the query vs. running it
+        statistics = query_details['QueryExecution'].get('Statistics', {})
+        self.metrics.add('athena_queue_ms', statistics.get('QueryQueueTimeInMillis', 0))
+        self.metrics.add('athena_engine_ms', statistics.get('EngineExecutionTimeInMillis', 0))
+        self.metrics.add('athena_scanned_bytes', statistics.get('DataScannedInBytes', 0))
+        return query_details['QueryExecution']['ResultConfiguration']['OutputLocation']
+
+    #----The Athena result cache, keyed by the query text and the state of the offline stores
+    def get_query_cache(self):
+        if self.query_cache is None:
+            args = self.args
+            self.query_cache = QueryResultCache(
+                args.query_cache_uri or f's3://{args.bucket_name}/{args.bucket_prefix}/afd-pipeline/state/query_cache.json',
+                results_uri=self.query_results_uri,
+                retention_days=args.query_result_retention_days,
+                max_entries=args.query_cache_max_entries,
+                s3_client=self.clients.client('s3'))
+        return self.query_cache
+
+    #----Run the training dataset query, or reuse the result of an identical query over unchanged offline stores
+    def run_cached_athena_query(self, query):
+        if self.args.no_query_cache:
+            return self.run_athena_query(query)
+        s3_client = self.clients.client('s3')
+        with self.metrics.span('query_cache_lookup'):
+            tables = {
+                self.sg_table: prefix_state(self.sg_store_uri, s3_client),
+                self.oc_table: prefix_state(self.oc_store_uri, s3_client)
+            }
+            fingerprint = query_fingerprint(query, tables)
+            location = self.get_query_cache().lookup(fingerprint)
+        self.metrics.add('query_cache_hits', int(location is not None))
+        if location is not None:
+            print(f'Query cache hit {fingerprint[:12]}, reusing {location}')
+            return location
+        print(f'Query cache miss {fingerprint[:12]}, offline stores: {tables}')
+        location = self.run_athena_query(query)
+        self.get_query_cache().store(fingerprint, os.path.basename(location).split('.')[0], location, tables)
+        return location
+
+    #----Training dataset file, incremental runs write a new partition per run
+    # (or, relabelling, the partition of an earlier batch)
+    def training_data_file(self, batch=None):
+        train_output_path = pathlib.Path(self.args.output_dir) / 'train'
+        if self.window is not None:
+            train_output_path = train_output_path / f"batch={batch or self.window['batch']}"
+            train_output_path.mkdir(parents=True, exist_ok=True)
+        return train_output_path / 'afd_training_data.csv'
+
+    #----Typed Parquet copy of the training dataset, kept apart from train/ which AFD reads as CSV
+    def typed_data_file(self, batch=None):
+        typed_output_path = pathlib.Path(self.args.output_dir) / 'typed'
+        if self.window is not None:
+            typed_output_path = typed_output_path / f"batch={batch or self.window['batch']}"
+        typed_output_path.mkdir(parents=True, exist_ok=True)
+        return typed_output_path / 'afd_training_data.parquet'
+
+    def report_typed_copy(self, report, batch=None):
+        print(f"Wrote {report['rows']} rows to {self.typed_data_file(batch)}: {report['file_bytes']} bytes on disk, "
+              f"{report['memory']} bytes in memory")
+        if report['widened']:
+            self.metrics.add('typed_copy_widened_columns', len(report['widened']))
+
+    #----The typed copy is a side output: when it fails, it is dropped and the CSV build goes on
+    def abandon_typed_copy(self, typed_writer, error):
+        print(f'Typed copy of the training dataset skipped: {type(error).__name__}: {error}')
+        typed_writer.abort()
+        self.metrics.add('typed_copy_failed', 1)
+        return None
+
+    def write_typed_copy(self, df, batch=None):
+        from afd_pipeline.columnar import TypedCopyWriter
+        typed_writer = TypedCopyWriter(self.typed_data_file(batch))
+        try:
+            with self.metrics.span('typed_copy'):
+                typed_writer.append(df)
+                self.report_typed_copy(typed_writer.close(), batch)
+        except Exception as e:
+            self.abandon_typed_copy(typed_writer, e)
+
+    #----Run Query on offline Feature Store datastore and generate training dataset
+    def gen_training_data(self, query):
+        query_result_s3_uri = self.run_cached_athena_query(query)
+
+        #--Write the final training dataset CSV file--
+        with self.metrics.span('training_data'):
+            return self.stream_training_data(query_result_s3_uri, self.training_data_file())
+
+    #----Run the training dataset join in-process over the offline store Parquet files
+    # vectorized equivalent of the SELECT DISTINCT ... LEFT JOIN built by gen_query
+    def gen_training_data_local(self, join_spec):
+        import pandas as pd
+        metrics, window = self.metrics, self.window
+        keys = join_spec['keys']
+        signups_columns = keys + join_spec['signups_columns']
+        outcomes_columns = keys + join_spec['outcomes_columns']
+        stime = time.time()
+        with metrics.span('read_offline_store'):
+            sg_window = (window['signups_from'], window['signups_to']) if window is not None else (None, None)
+            oc_upper = window['outcomes_to'] if window is not None else None
+            signups = read_offline_store(self.sg_store_uri, signups_columns, *sg_window)
+            outcomes = read_offline_store(self.oc_store_uri, outcomes_columns, upper=oc_upper)
+        print(f'Read {len(signups)} signups and {len(outcomes)} outcomes records in {time.time() - stime:.1f} seconds')
+
+        # SQL equality never matches NULL keys, whereas pandas would join NaN to NaN
+        with metrics.span('join'):
+            outcomes = outcomes.dropna(subset=keys)
+            df_train = signups.merge(outcomes, how='left', on=keys, sort=False).drop_duplicates()
+
+        #--Write the final training dataset CSV file--
+        output_file = self.training_data_file()
+        if len(df_train):
+            with metrics.span('write_csv'):
+                df_train.to_csv(output_file, index=False)
+            metrics.add_file('written', output_file, 'csv')
+        metrics.add('training_rows', len(df_train))
+        print(f'Wrote {len(df_train)} rows to {output_file}')
+        if self.args.typed_copy:
+            self.write_typed_copy(df_train)
+        #--labels are counted as the text written to the CSV, as the Athena engine reads them
+        labels = df_train['EVENT_LABEL'].dropna().astype(str)
+        return {label: int(cnt) for label, cnt in labels.value_counts(sort=False).items()}
+
+    #----Partitions written by earlier incremental runs: batch -> uri of their training CSV
+    def earlier_partitions(self):
+        args = self.args
+        root = (args.train_data_uri or f's3://{args.bucket_name}/{args.bucket_prefix}/afd-pipeline/train-data').rstrip('/')
+        if root.startswith('s3://'):
+            bucket, _, prefix = root[len('s3://'):].partition('/')
+            uris = []
+            for page in self.clients.client('s3').get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=f'{prefix}/'):
+                uris += [f"s3://{bucket}/{obj['Key']}" for obj in page.get('Contents', [])]
+        else:
+            uris = [os.path.join(d, name) for d, _, names in os.walk(root) for name in names]
+        partitions = {}
+        for uri in uris:
+            directory, name = uri.replace(os.sep, '/').split('/')[-2:]
+            if name == 'afd_training_data.csv' and directory.startswith('batch=') and directory != f"batch={self.window['batch']}":
+                partitions[directory[len('batch='):]] = uri
+        return dict(sorted(partitions.items()))
+
+    #----Every outcome known at the upper bound of the events that got an outcome since the last run, as CSV text
+    def read_late_outcomes(self, join_spec):
+        import pandas as pd
+        window = self.window
+        keys = join_spec['keys']
+        columns = keys + join_spec['outcomes_columns']
+        if self.args.engine == 'local':
+            late = read_offline_store(self.oc_store_uri, keys, window['outcomes_from'], window['outcomes_to'])
+            late = late.dropna().drop_duplicates()
+            outcomes = read_offline_store(self.oc_store_uri, columns, upper=window['outcomes_to'],
+                                          only_in=(keys[0], late[keys[0]].unique().tolist()))
+            return as_csv_text(outcomes.merge(late, on=keys).drop_duplicates())
+
+        oc_table = self.oc_table
+        upper = f'{IGNORE_COL} <= {sql_literal(window["outcomes_to"])}'
+        lower = f' AND {IGNORE_COL} > {sql_literal(window["outcomes_from"])}' if window['outcomes_from'] is not None else ''
+        query = f"""
+        SELECT DISTINCT {", ".join(f'o.{c}' for c in columns)}
+        FROM "{oc_table}" o JOIN (SELECT DISTINCT {", ".join(keys)} FROM "{oc_table}" WHERE {upper}{lower}) l ON
+        {" AND ".join(f'o.{k} = l.{k}' for k in keys)}
+        WHERE o.{upper}
+    """
+        with self.metrics.open(self.run_athena_query(query), 'rb') as f:
+            return pd.read_csv(f, dtype=str)
+
+    #----Apply late outcomes to the partitions holding their signups: the rows of those events are joined
+    # again with every outcome known now, so each event stays in the partition of its signup, once.
+    # The rewritten partitions are written under the same batch= names, replacing the earlier ones on upload.
+    # Returns the change of the label counts
+    def relabel_partitions(self, join_spec):
+        import pandas as pd
+        keys, outcomes_columns = join_spec['keys'], join_spec['outcomes_columns']
+        label_delta = {}
+        if self.window['signups_from'] is None or not keys:
+            return label_delta
+        with self.metrics.span('relabel'):
+            late = self.read_late_outcomes(join_spec)
+            if late.empty:
+                return label_delta
+            late_keys = late[keys].drop_duplicates()
+            for batch, uri in self.earlier_partitions().items():
+                with self.metrics.open(uri, 'rb') as f:
+                    partition = pd.read_csv(f, dtype=str)
+                hit = partition[keys].merge(late_keys, how='left', on=keys, indicator=True)['_merge'].eq('both').to_numpy()
+                if not hit.any():
+                    continue
+                old = partition[hit]
+                rejoined = old.drop(columns=outcomes_columns).drop_duplicates().merge(late, how='left', on=keys)
+                partition = pd.concat([partition[~hit], rejoined[partition.columns]], ignore_index=True).drop_duplicates()
+                output_file = self.training_data_file(batch)
+                partition.to_csv(output_file, index=False)
+                self.metrics.add_file('written', output_file, 'csv')
+                self.metrics.add('relabelled_rows', len(rejoined))
+                print(f'Relabelled {len(old)} rows of partition batch={batch} with late outcomes, wrote {output_file}')
+                if self.args.typed_copy:
+                    self.write_typed_copy(partition, batch)
+                for rows, sign in ((rejoined, 1), (old, -1)):
+                    for label, cnt in rows['EVENT_LABEL'].dropna().value_counts(sort=False).items():
+                        label_delta[label] = label_delta.get(label, 0) + sign * int(cnt)
+        return label_delta
+
+    #----Generate Training data schema
+    def gen_training_schema(self, schema, label_counts):
+        train_schema_path = pathlib.Path(self.args.output_dir) / 'schema'
+        trainingDataSchema = {
+            'modelVariables': schema['modelVariables'],
+            'labelSchema':{
+                'labelMapper': label_mapper(label_counts)
+            }
+        }
+
+        with self.metrics.open(train_schema_path / 'schema.json', 'w') as outfile:
+            json.dump(trainingDataSchema, outfile)
+
+        print(f'Training Dataset and Training Data Schema Generated: {trainingDataSchema}')
+
+    #----Watermark state of incremental builds: the latest EventTime already joined per feature group
+    # and the cumulative label counts of all partitions written so far
+    def load_state(self, uri):
+        state = load_json(uri, s3_client=self.clients.client('s3') if uri.startswith('s3://') else None)
+        if state is None:
+            print(f'No watermark state at {uri}, building from the beginning')
+            return {'watermarks': {}, 'label_counts': {}}
+        return state
+
+    def save_state(self, uri, new_state):
+        save_json(uri, new_state, s3_client=self.clients.client('s3') if uri.startswith('s3://') else None)
+        print(f'Watermark state saved to {uri}: {new_state["watermarks"]}')
+
+    #----Latest EventTime currently in each feature group, the upper bound of this run's window
+    def get_watermarks(self):
+        if self.args.engine == 'local':
+            import pyarrow.compute as pc
+            import pyarrow.dataset as ds
+            def max_event_time(store_uri):
+                table = ds.dataset(store_uri, format='parquet', partitioning='hive').to_table(columns=[IGNORE_COL])
+                return pc.max(table[IGNORE_COL]).as_py()
+            return max_event_time(self.sg_store_uri), max_event_time(self.oc_store_uri)
+
+        import pandas as pd
+        query = f'SELECT (SELECT max({IGNORE_COL}) FROM "{self.sg_table}") AS signups, (SELECT max({IGNORE_COL}) FROM "{self.oc_table}") AS outcomes'
+        marks = pd.read_csv(self.run_athena_query(query)).iloc[0].tolist()
+        return tuple(None if pd.isnull(mark) else mark for mark in marks)
+
+    #----Set the EventTime window of an incremental run from the persisted watermarks
+    def init_incremental(self):
+        args = self.args
+        state_uri = args.state_uri or f's3://{args.bucket_name}/{args.bucket_prefix}/afd-pipeline/state/create_dataset_state.json'
+        self.state = self.load_state(state_uri)
+        self.state['uri'] = state_uri
+        previous = self.state['watermarks']
+        signups_to, outcomes_to = self.get_watermarks()
+        self.window = {
+            'signups_from': previous.get(self.signups_key),
+            'signups_to': signups_to if signups_to is not None else previous.get(self.signups_key),
+            'outcomes_from': previous.get(self.outcomes_key),
+            'outcomes_to': outcomes_to if outcomes_to is not None else previous.get(self.outcomes_key),
+            'batch': time.strftime('%Y%m%dT%H%M%S', time.gmtime())
+        }
+        print(f'Incremental window: {self.window}')
+
+    #----True when neither new signups nor outcomes of earlier signups arrived since the last run
+    def window_is_empty(self):
+        window = self.window
+        new_signups = window['signups_to'] is not None and window['signups_to'] != window['signups_from']
+        late_outcomes = window['signups_from'] is not None and window['outcomes_to'] is not None and \
+            window['outcomes_to'] != window['outcomes_from']
+        return not (new_signups or late_outcomes)
+
+    def gen_train_data(self):
+        args = self.args
+        if args.incremental:
+            self.init_incremental()
+        select_query, schema, join_spec = self.gen_query()
+        if self.window is not None and self.window_is_empty():
+            #--no partition is written, the schema still covers the partitions written so far
+            print(f"Nothing new since the watermarks {self.state['watermarks']}, no partition written")
+            self.metrics.add('training_rows', 0)
+            if not self.state['label_counts']:
+                raise StepFailed('No events in the offline stores to build the training dataset from')
+            self.gen_training_schema(schema, dict(self.state['label_counts']))
+            return
+        if args.engine == 'local':
+            print(f'Local join: {join_spec}')
+            label_counts = self.gen_training_data_local(join_spec)
+        else:
+            print(f'Athena Query: {select_query}')
+            if args.invalidate_query_cache:
+                print(f'Invalidated {self.get_query_cache().invalidate()} cached query results')
+            label_counts = self.gen_training_data(select_query)
+            #--with the cache off, the cache and the result objects it tracks are left alone
+            if not args.no_query_cache:
+                with self.metrics.span('query_cache_evict'):
+                    print(f'Query result retention: {self.get_query_cache().evict()} evicted')
+
+        if self.window is not None:
+            #--labelMapper covers every partition written so far, relabelled ones included
+            for counts in (self.relabel_partitions(join_spec), self.state['label_counts']):
+                for label, cnt in counts.items():
+                    label_counts[label] = label_counts.get(label, 0) + cnt
+            label_counts = {label: cnt for label, cnt in label_counts.items() if cnt > 0}
+        if not label_counts:
+            raise StepFailed('No labelled events to build the training data schema from')
+        self.gen_training_schema(schema, label_counts)
+
+        if self.window is not None:
+            self.save_state(self.state['uri'], {
+                'watermarks': {self.signups_key: self.window['signups_to'], self.outcomes_key: self.window['outcomes_to']},
+                'label_counts': label_counts
+            })
+
+    def run(self):
+        args = self.args
+        signups_fg_name = args.signups_feature_group_name
+        outcomes_fg_name = args.outcomes_feature_group_name
+        if args.engine == 'local' and args.signups_offline_store_uri and args.outcomes_offline_store_uri:
+            #--Local copy of the offline store, feature definitions come from the Parquet schema
+            self.sg_store_uri = args.signups_offline_store_uri
+            self.oc_store_uri = args.outcomes_offline_store_uri
+            self.sg_features = offline_store_features(self.sg_store_uri)
+            self.oc_features = offline_store_features(self.oc_store_uri)
+            self.sg_table = signups_fg_name or 'signups'
+            self.oc_table = outcomes_fg_name or 'outcomes'
+            self.signups_key, self.outcomes_key = self.sg_table, self.oc_table
+            self.gen_train_data()
+            return
+
+        signups_fg_metadata, outecomes_fg_metadata = self.get_feature_store()
+        if signups_fg_metadata['OfflineStoreStatus']['Status'] != 'Active' or outecomes_fg_metadata['OfflineStoreStatus']['Status'] != 'Active':
+            raise StepFailed('Offline Data Store is Inactive')
+
+        print('Offline Data Store is active active')
+        self.sg_features = signups_fg_metadata['FeatureDefinitions']
+        self.oc_features = outecomes_fg_metadata['FeatureDefinitions']
+        self.sg_db = signups_fg_metadata['OfflineStoreConfig']['DataCatalogConfig']['Database']
+        self.sg_table = signups_fg_metadata['OfflineStoreConfig']['DataCatalogConfig']['TableName']
+        self.oc_db = outecomes_fg_metadata['OfflineStoreConfig']['DataCatalogConfig']['Database']
+        self.oc_table = outecomes_fg_metadata['OfflineStoreConfig']['DataCatalogConfig']['TableName']
+        self.sg_store_uri = args.signups_offline_store_uri or signups_fg_metadata['OfflineStoreConfig']['S3StorageConfig']['ResolvedOutputS3Uri']
+        self.oc_store_uri = args.outcomes_offline_store_uri or outecomes_fg_metadata['OfflineStoreConfig']['S3StorageConfig']['ResolvedOutputS3Uri']
+        self.signups_key, self.outcomes_key = signups_fg_name, outcomes_fg_name
+        self.gen_train_data()
+
+
+def main(argv=None):
+    metrics = StepMetrics('create_dataset')
+    args = parse_args(argv)
+    clients = Clients(args.region, metrics)
+    return run_step(metrics, args.metrics_dir, DatasetBuilder(args, clients, metrics).run)
@@ -0,0 +1,135 @@
+"""
+SetupDetector step: bring the outcomes and rules of the detector in line with the activated model's metric
+curve and create a detector version using them.
+"""
+import json
+import argparse
+import pathlib
+
+from afd_pipeline.clients import Clients
+from afd_pipeline.detector_sync import RuleSync, sync_outcomes
+from afd_pipeline.metrics import StepMetrics
+from afd_pipeline.steps import run_step
+from afd_pipeline.waiter import Waiter
+
+OUTCOME_LIST = [
+    {
+        "name": 'verify_customer',
+        "desc": 'this outcome initiates a verification workflow'
+    },
+    {
+        "name": 'review',
+        "desc": 'this outcome sidelines event for human or automated review'
+    },
+    {
+        "name": 'approve',
+        "desc": 'this outcome approves the event'
+    }
+]
+
+
+def parse_args(argv=None):
+    # Parse argument variables passed via the SetupDetector processing step
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--region', type=str)
+    parser.add_argument('--detector-name', type=str)
+    parser.add_argument('--fpr-bands', type=str, default='review:0.03,verify_customer:0.05',
+                        help='outcome:max_fpr pairs, scores above the threshold meeting max_fpr get the outcome')
+    parser.add_argument('--default-outcome', type=str, default='approve')
+    parser.add_argument('--input-dir', type=str, default='/opt/ml/processing/input')
+    parser.add_argument('--metrics-dir', type=str, default='/opt/ml/processing/metrics',
+                        help='directory (or S3 prefix) the step metrics JSON file is written to')
+    return parser.parse_args(argv)
+
+
+def outcome_list(bands, default_outcome):
+    """ The three outcomes above, and those named in --fpr-bands beyond them """
+    outcomes = [dict(o) for o in OUTCOME_LIST]
+    for outcome in [b.outcome for b in bands] + [default_outcome]:
+        if outcome not in [o['name'] for o in outcomes]:
+            outcomes.append({"name": outcome, "desc": f'this outcome is assigned by the {outcome} score band'})
+    return outcomes
+
+
+#--- Generate and create/update rules ---
+def gen_create_rules(rule_sync, metric_points, model_name, bands, default_outcome):
+    from afd_pipeline.thresholds import MetricCurve, build_rules
+    curve = MetricCurve(metric_points)
+    rule_set = build_rules(model_name, curve, bands, default_outcome)
+
+    desired = [{"ruleId"    : f"rule{i}_{model_name}",
+                "expression": rule['rule'],
+                "outcomes"  : [rule['outcome']]} for i, rule in enumerate(rule_set)]
+
+    #-- only rules that are new or whose expression/outcomes changed are written
+    return rule_sync.sync(desired)
+
+
+def setup_detector(args, clients, metrics):
+    from afd_pipeline.thresholds import parse_bands
+
+    #initialize the AFD client
+    client = clients.client('frauddetector')
+
+    #initialize the waiter for the model version
+    waiter = Waiter(initial_delay=5, max_delay=60)
+
+    #initialize the rule synchronizer of the detector
+    rule_sync = RuleSync(client, args.detector_name)
+
+    #outcome bands of the generated rules
+    bands = parse_bands(args.fpr_bands)
+
+    #Get the activation response of the model version
+    activation_response_path = pathlib.Path(args.input_dir)
+    with metrics.open(activation_response_path/'activation_response.json', 'r') as f:
+        activation_response = json.load(f)
+
+    model_id      = activation_response['modelId']
+    model_type    = activation_response['modelType']
+    model_version = activation_response['modelVersionNumber']
+    model_status  = activation_response['status']
+
+    metric_points = client.describe_model_versions(
+                        modelId= model_id,
+                        modelVersionNumber=model_version,
+                        modelType=model_type,
+                        maxResults=10
+                    )['modelVersionDetails'][0]['trainingResult']['trainingMetrics']['metricDataPoints']
+
+    # Generate outcomes
+    with metrics.span('outcomes'):
+        sync_outcomes(client, outcome_list(bands, args.default_outcome))
+
+    #-- the detector version can only reference an active model version
+    if model_status != 'ACTIVE':
+        with metrics.span('model_wait'):
+            waiter.wait_for(f'Model {model_id} version {model_version}',
+                            poll=lambda: client.get_model_version(modelId=model_id, modelType=model_type, modelVersionNumber=model_version),
+                            get_status=lambda r: r['status'],
+                            success=['ACTIVE'], failure=['ERROR', 'INACTIVE'], timeout=2 * 3600)
+
+    #generate, create/update rules
+    with metrics.span('rules'):
+        rule_list = gen_create_rules(rule_sync, metric_points, model_id, bands, args.default_outcome)
+
+    with metrics.span('detector_version'):
+        response = client.create_detector_version(detectorId = args.detector_name,
+                                                  rules = rule_list,
+                                                  modelVersions = [
+                                                      {
+                                                          "modelId":model_id,
+                                                          "modelType" : model_type,
+                                                          "modelVersionNumber" : model_version
+                                                      }
+                                                  ],
+                                                  ruleExecutionMode = 'FIRST_MATCHED'
+                                                 )
+    print(response)
+
+
+def main(argv=None):
+    metrics = StepMetrics('setup_detector')
+    args = parse_args(argv)
+    clients = Clients(args.region, metrics)
+    return run_step(metrics, args.metrics_dir, lambda: setup_detector(args, clients, metrics))
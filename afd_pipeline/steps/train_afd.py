@@ -0,0 +1,129 @@
+"""
+TrainAFD step: train a model version on the training dataset, or reuse the version trained from identical
+inputs, and write its train response and AUC for the pipeline condition.
+"""
+import json
+import time
+import argparse
+import pathlib
+
+from afd_pipeline.clients import Clients
+from afd_pipeline.memo import DIGEST_TAG, REUSABLE_STATUSES, data_digest, training_digest, find_model_version
+from afd_pipeline.metrics import StepMetrics
+from afd_pipeline.steps import StepFailed, run_step
+from afd_pipeline.waiter import Waiter
+
+
+def parse_args(argv=None):
+    # Parse argument variables passed via the TrainAFD processing step
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--region', type=str)
+    parser.add_argument('--data-access-role', type=str)
+    parser.add_argument('--model-name', type=str)
+    parser.add_argument('--s3-file-loc', type=str)
+    parser.add_argument('--no-memoize', action='store_true',
+                        help='always train a new model version, even when one was trained from identical inputs')
+    parser.add_argument('--digest-cache-uri', type=str, default=None,
+                        help='JSON document (S3 or local) caching the digests of training data files by ETag and size')
+    parser.add_argument('--schema-dir', type=str, default='/opt/ml/processing/schema')
+    parser.add_argument('--output-dir', type=str, default='/opt/ml/processing/output')
+    parser.add_argument('--auc-dir', type=str, default='/opt/ml/processing/auc')
+    parser.add_argument('--metrics-dir', type=str, default='/opt/ml/processing/metrics',
+                        help='directory (or S3 prefix) the step metrics JSON file is written to')
+    return parser.parse_args(argv)
+
+
+def initiate_training(args, clients, metrics):
+    #initialize the AFD and S3 clients
+    client = clients.client('frauddetector')
+    s3_client = clients.client('s3')
+
+    #training takes tens of minutes, so polling backs off to once a minute
+    waiter = Waiter(initial_delay=10, max_delay=60)
+
+    #Get training data schema file
+    print(f'Attempting to load training Schema file')
+    try:
+        train_schema_path = pathlib.Path(args.schema_dir)
+        with metrics.open(train_schema_path/'schema.json', 'r') as f:
+            trainingDataSchema = json.load(f)
+        print(f'Loaded schema file : {trainingDataSchema}')
+    except Exception as e:
+        raise StepFailed(f'Unable to load schema file: {e}')
+
+    #--Digest of the training inputs, the tag that identifies model versions trained from them
+    model_params = {'modelId': args.model_name, 'modelType': 'ONLINE_FRAUD_INSIGHTS', 'trainingDataSource': 'EXTERNAL_EVENTS'}
+    stime = time.time()
+    with metrics.span('digest'):
+        digest, cached = data_digest(args.s3_file_loc, s3_client, args.digest_cache_uri)
+    digest = training_digest(digest, trainingDataSchema, model_params)
+    metrics.add('data_digest_cached', int(cached))
+    print(f"Training digest {digest} in {time.time() - stime:.1f} seconds{', data digest from cache' if cached else ''}")
+
+    with metrics.span('find_model_version'):
+        existing = None if args.no_memoize else find_model_version(client, args.model_name, 'ONLINE_FRAUD_INSIGHTS', digest)
+    metrics.add('model_version_reused', int(existing is not None))
+    if existing is not None:
+        model_version = existing['modelVersionNumber']
+        print(f"Model {args.model_name} version {model_version} was trained from the same inputs "
+              f"(status {existing['status']}), reusing it")
+    else:
+        print(f'Attempting to train AFD Model: {args.model_name}')
+
+        #Initiate AFD Model Training
+        response = client.create_model_version(modelId     = args.model_name,
+                                               modelType   = 'ONLINE_FRAUD_INSIGHTS',
+                                               trainingDataSource = 'EXTERNAL_EVENTS',
+                                               trainingDataSchema = trainingDataSchema,
+                                               externalEventsDetail = {
+                                                   'dataLocation'     : args.s3_file_loc,
+                                                   'dataAccessRoleArn': args.data_access_role
+                                               },
+                                               tags = [{'key': DIGEST_TAG, 'value': digest}]
+                                              )
+
+        model_version = response['modelVersionNumber']
+
+    print("Wait for model training to complete...")
+    stime = time.time()
+    with metrics.span('training_wait'):
+        response = waiter.wait_for(f'Model {args.model_name} version {model_version}',
+                                   poll=lambda: client.get_model_version(modelId = args.model_name, modelType = "ONLINE_FRAUD_INSIGHTS", modelVersionNumber = model_version),
+                                   get_status=lambda r: r['status'],
+                                   pending=['TRAINING_IN_PROGRESS'], timeout=6 * 3600)
+    print(f"Model status : {response['status']}")
+
+    etime = time.time()
+    print("Model training complete. Elapsed time : %s" % (etime - stime) + " seconds \n"  )
+
+    # a reused version may already be active, or have been deactivated since
+    if response['status'] not in REUSABLE_STATUSES:
+        raise StepFailed(f'AFD model {args.model_name}..,Please check AFD logs.')
+
+    train_response_path = pathlib.Path(args.output_dir)
+    with metrics.open(train_response_path / 'train_response.json', 'w') as outfile:
+        json.dump(response, outfile)
+
+    # we will grab the model's AUC so that we can make a decision in the pipeline to make a decision to
+    # activate the model or not
+    auc = client.describe_model_versions(
+                modelId= args.model_name,
+                modelVersionNumber=model_version,
+                modelType='ONLINE_FRAUD_INSIGHTS',
+                maxResults=1
+            )['modelVersionDetails'][0]['trainingResult']['trainingMetrics']['auc']
+
+    auc_metric = { 'auc_metric': auc }
+
+    train_auc_path = pathlib.Path(args.auc_dir)
+
+    with metrics.open(train_auc_path / 'train_auc.json', 'w') as outfile:
+        json.dump(auc_metric, outfile)
+
+
+def main(argv=None):
+    metrics = StepMetrics('train_afd')
+    args = parse_args(argv)
+    clients = Clients(args.region, metrics)
+    print(f"Initializing AFD Model Training for model: {args.model_name}")
+    return run_step(metrics, args.metrics_dir, lambda: initiate_training(args, clients, metrics))
@@ -0,0 +1,134 @@
+"""
+Threshold selection on the metric curve of a trained AFD model.
+
+The curve (trainingMetrics.metricDataPoints: threshold, fpr, tpr, precision) is sorted once by
+threshold, after which picking the threshold for a false positive rate budget, or the
+threshold with the lowest expected cost, is a binary search or an argmin over arrays. Both
+accept arrays of budgets or costs, so many candidate configurations are scored in one call.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# An outcome assigned to scores above the threshold that keeps the false positive rate within max_fpr
+Band = namedtuple('Band', ['outcome', 'max_fpr'])
+
+DEFAULT_BANDS = [Band('review', 0.03), Band('verify_customer', 0.05)]
+DEFAULT_OUTCOME = 'approve'
+
+
+def parse_bands(spec):
+    """ Parse 'outcome:max_fpr,...' (e.g. 'review:0.03,verify_customer:0.05') into a list of Band """
+    bands = []
+    for item in spec.split(','):
+        outcome, max_fpr = item.split(':')
+        bands.append(Band(outcome.strip(), float(max_fpr)))
+    return bands
+
+
+class MetricCurve(object):
+    """ A model's metric data points sorted by ascending threshold.
+        The false positive rate is made non-increasing in the threshold, which the true curve
+        is and the reported one may not be after rounding, so binary search is well defined.
+        Args:
+            points (list or DataFrame): metricDataPoints with threshold, fpr, tpr and precision
+    """
+    def __init__(self, points):
+        df = pd.DataFrame(points).sort_values('threshold', kind='mergesort').reset_index(drop=True)
+        if df.empty:
+            raise ValueError('the metric curve has no data points')
+        self.threshold = df['threshold'].to_numpy(dtype='float64')
+        self.fpr = np.minimum.accumulate(df['fpr'].to_numpy(dtype='float64'))
+        self.tpr = df['tpr'].to_numpy(dtype='float64')
+        self.precision = df['precision'].to_numpy(dtype='float64') if 'precision' in df else np.full(len(df), np.nan)
+
+    def index_at_fpr(self, max_fpr):
+        """ Index of the lowest threshold whose fpr is within max_fpr, i.e. the highest recall within budget.
+            Args:
+                max_fpr (float or array): false positive rate budgets
+            Returns:
+                int array of curve indices, len(curve) where no threshold meets the budget
+        """
+        # fpr is non-increasing in the threshold, so -fpr is sorted ascending
+        return np.searchsorted(-self.fpr, -np.asarray(max_fpr, dtype='float64'), side='left')
+
+    def threshold_at_fpr(self, max_fpr):
+        idx = self.index_at_fpr(max_fpr)
+        if np.any(idx >= len(self.threshold)):
+            raise ValueError(f'no threshold keeps the false positive rate within {max_fpr}, '
+                             f'the lowest on the curve is {self.fpr[-1]}')
+        return self.threshold[idx]
+
+    def min_cost_index(self, cost_fp, cost_fn, fraud_rate):
+        """ Index of the threshold with the lowest expected cost per event, for each cost configuration.
+            Events scoring above the threshold are flagged, so a legitimate event above it costs cost_fp
+            and a fraudulent event at or below it costs cost_fn.
+            Args:
+                cost_fp (float or array): cost of flagging a legitimate event
+                cost_fn (float or array): cost of missing a fraudulent event
+                fraud_rate (float or array): share of fraudulent events
+            Returns:
+                int array of curve indices, one per configuration
+        """
+        cost_fp, cost_fn, fraud_rate = np.broadcast_arrays(*[np.atleast_1d(np.asarray(a, dtype='float64'))
+                                                            for a in (cost_fp, cost_fn, fraud_rate)])
+        cost = (cost_fp * (1 - fraud_rate))[:, None] * self.fpr[None, :] + \
+               (cost_fn * fraud_rate)[:, None] * (1 - self.tpr[None, :])
+        return cost.argmin(axis=1)
+
+    def metrics(self, idx):
+        """ Curve metrics at the given indices """
+        idx = np.asarray(idx)
+        return pd.DataFrame({'threshold': self.threshold[idx], 'fpr': self.fpr[idx],
+                             'tpr': self.tpr[idx], 'precision': self.precision[idx]})
+
+
+def score_band_configs(curve, configs):
+    """ Pick thresholds for many candidate band configurations at once
+        Args:
+            curve (MetricCurve): model metric curve
+            configs (list): band lists, or a 2-d array of max_fpr values (one row per configuration)
+        Returns:
+            DataFrame with one row per configuration and band: threshold, fpr, tpr and precision
+            at the band's threshold, and whether the budget could be met
+    """
+    budgets = np.array([[b.max_fpr if isinstance(b, Band) else b for b in c] for c in configs], dtype='float64')
+    idx = curve.index_at_fpr(budgets.ravel())
+    feasible = idx < len(curve.threshold)
+    result = curve.metrics(np.minimum(idx, len(curve.threshold) - 1))
+    result.loc[~feasible, ['threshold', 'fpr', 'tpr', 'precision']] = np.nan
+    result.insert(0, 'config', np.repeat(np.arange(budgets.shape[0]), budgets.shape[1]))
+    result.insert(1, 'band', np.tile(np.arange(budgets.shape[1]), budgets.shape[0]))
+    result.insert(2, 'max_fpr', budgets.ravel())
+    result['feasible'] = feasible
+    return result
+
+
+def build_rules(model_name, curve, bands=DEFAULT_BANDS, default_outcome=DEFAULT_OUTCOME):
+    """ Rule set for a FIRST_MATCHED detector: one '>' rule per band, in order of increasing max_fpr,
+        and a catch-all '<=' rule assigning default_outcome below the last band.
+        Bands that end up with the same threshold as the band before them would never match
+        and are left out.
+        Args:
+            model_name (str): model id, the rules test ${model_name}_insightscore
+            curve (MetricCurve): model metric curve
+            bands (list): Band per outcome
+            default_outcome (str): outcome of scores below every band
+        Returns:
+            list of {'rule', 'outcome'} records, in detector order
+    """
+    if not bands:
+        raise ValueError('at least one band is required')
+    bands = sorted(bands, key=lambda b: b.max_fpr)
+    thresholds = curve.threshold_at_fpr([b.max_fpr for b in bands])
+    variable = f'${model_name}_insightscore'
+    rules = []
+    previous = None
+    for band, threshold in zip(bands, thresholds):
+        if previous is not None and threshold >= previous:
+            continue
+        rules.append({'rule': f'{variable} > {float(threshold)}', 'outcome': band.outcome})
+        previous = threshold
+    rules.append({'rule': f'{variable} <= {float(previous)}', 'outcome': default_outcome})
+    return rules
@@ -0,0 +1,138 @@
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Timing of one completed (or abandoned) wait
+WaitRecord = namedtuple('WaitRecord', ['name', 'status', 'polls', 'elapsed', 'outcome'])
+
+
+class WaitFailed(Exception):
+    """ The resource reached a failure state """
+    def __init__(self, name, status, response):
+        super().__init__(f'{name} reached failure state {status}')
+        self.name = name
+        self.status = status
+        self.response = response
+
+
+class WaitTimeout(Exception):
+    """ The resource did not reach a terminal state in time """
+    def __init__(self, name, status, timeout):
+        super().__init__(f'{name} still {status} after {timeout} seconds')
+        self.name = name
+        self.status = status
+        self.timeout = timeout
+
+
+class WaitCancelled(Exception):
+    """ The wait was stopped before the resource reached a terminal state """
+    def __init__(self, name, status):
+        super().__init__(f'{name} no longer waited for, still {status}')
+        self.name = name
+        self.status = status
+
+
+class Waiter(object):
+    """ Polls long-running AWS operations with an adaptive backoff.
+        The first poll is immediate, then the delay starts at initial_delay and grows by
+        backoff after every poll up to max_delay, so short operations are noticed within
+        seconds while long ones (AFD training) are polled about once a minute.
+        Args:
+            initial_delay (float): seconds to sleep after the first poll
+            max_delay (float): upper bound of the delay between polls
+            backoff (float): factor the delay grows by after each poll
+            timeout (float): default seconds before a wait gives up, None waits forever
+            sleep (callable): sleep function, replaceable for tests and benchmarks
+            clock (callable): monotonic clock, replaceable for tests and benchmarks
+    """
+    def __init__(self, initial_delay=2, max_delay=60, backoff=1.5, timeout=None, sleep=time.sleep, clock=time.monotonic):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.timeout = timeout
+        self.sleep = sleep
+        self.clock = clock
+        self.records = []
+
+    def wait_for(self, name, poll, get_status, success=(), failure=(), pending=None, timeout=None, cancel=None):
+        """ Poll until the resource reaches a terminal state.
+            A status in success ends the wait. When pending is given, any status outside of it
+            also ends the wait, for operations whose set of terminal states is open ended.
+            Args:
+                name (str): label used in progress lines and timing records
+                poll (callable): returns the current description of the resource
+                get_status (callable): extracts the status string from a description
+                success (iterable): terminal states to return on
+                failure (iterable): terminal states to raise WaitFailed on
+                pending (iterable): in-progress states, see above
+                timeout (float): seconds before raising WaitTimeout, defaults to the waiter's timeout
+                cancel (threading.Event): raise WaitCancelled instead of polling again once it is set
+            Returns:
+                the last description returned by poll
+        """
+        timeout = self.timeout if timeout is None else timeout
+        stime = self.clock()
+        delay = self.initial_delay
+        polls = 0
+        status = None
+        outcome = 'timeout'
+        try:
+            while True:
+                response = poll()
+                polls += 1
+                status = get_status(response)
+                elapsed = self.clock() - stime
+                if status in failure:
+                    outcome = 'failed'
+                    raise WaitFailed(name, status, response)
+                if status in success or (pending is not None and status not in pending):
+                    outcome = 'done'
+                    print(f'{name}: {status} after {elapsed:.1f} seconds ({polls} polls)')
+                    return response
+                if timeout is not None and elapsed >= timeout:
+                    raise WaitTimeout(name, status, timeout)
+                print(f'{name}: {status}, waited {elapsed / 60:.2f} minutes')
+                if timeout is not None:
+                    delay = min(delay, max(timeout - elapsed, 0))
+                if cancel is not None and self.sleep is time.sleep:
+                    # wake up as soon as the wait is cancelled rather than after the delay
+                    cancel.wait(delay)
+                else:
+                    self.sleep(delay)
+                delay = min(delay * self.backoff, self.max_delay)
+                if cancel is not None and cancel.is_set():
+                    outcome = 'cancelled'
+                    raise WaitCancelled(name, status)
+        finally:
+            self.records.append(WaitRecord(name, status, polls, self.clock() - stime, outcome))
+
+    def wait_all(self, waits):
+        """ Wait on several resources concurrently.
+            The first wait to fail is re-raised right away, and the other waits stop before their next poll.
+            Args:
+                waits (list): keyword arguments of wait_for, one dict per resource
+            Returns:
+                the last descriptions, in the order of waits
+        """
+        if not waits:
+            return []
+        cancel = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=len(waits))
+        futures = {pool.submit(self.wait_for, cancel=cancel, **w): i for i, w in enumerate(waits)}
+        responses = [None] * len(waits)
+        try:
+            for future in as_completed(futures):
+                responses[futures[future]] = future.result()
+        except BaseException:
+            cancel.set()
+            # cancel_futures of Executor.shutdown needs Python 3.9, the processing image runs 3.7
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            pool.shutdown(wait=False)
+        return responses
+
+    def summary(self):
+        return [record._asdict() for record in self.records]
@@ -0,0 +1,522 @@
+"""
+In-process stand-ins for AWS clients, for running the pipeline code without an AWS account. They are not
+part of afd_pipeline, so they stay out of the processing container image.
+
+StubFraudDetectorClient and StubFeatureStoreRuntimeClient replace a single client in code that takes one,
+e.g. the --stub mode of scripts/score_events.py and scripts/ingest_features.py.
+FakeAWS answers the calls of real boto3 clients instead, so whole processing scripts run unchanged
+against a simulated account, e.g. in benchmarks/pipeline_benchmark.py.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import shutil
+import datetime
+import threading
+import zlib
+
+
+class StubClientError(Exception):
+    """ Same shape as botocore.exceptions.ClientError: the error code is in response['Error']['Code'] """
+    def __init__(self, code, message, operation_name):
+        super().__init__(f'An error occurred ({code}) when calling the {operation_name} operation: {message}')
+        self.response = {'Error': {'Code': code, 'Message': message}}
+        self.operation_name = operation_name
+
+
+class _StubService(object):
+    """ Latency, per-second throttling and error injection shared by the stub clients
+        Args:
+            latency (float): seconds every call takes
+            tps (float): calls per second accepted before raising ThrottlingException, None for unlimited
+            error_rate (float): fraction of calls failing with InternalServerException
+            seed (int): seed of the error injection
+    """
+    def __init__(self, latency=0.005, tps=None, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.tps = tps
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_calls = 0
+        self.calls = 0
+
+    def _admit(self, operation_name):
+        with self.lock:
+            self.calls += 1
+            if self.error_rate and self.random.random() < self.error_rate:
+                raise StubClientError('InternalServerException', 'injected failure', operation_name)
+            if self.tps is not None:
+                now = time.monotonic()
+                if now - self.window_start >= 1.0:
+                    self.window_start = now
+                    self.window_calls = 0
+                self.window_calls += 1
+                if self.window_calls > self.tps:
+                    raise StubClientError('ThrottlingException', 'Rate exceeded', operation_name)
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class StubFraudDetectorClient(_StubService):
+    """ Answers get_event_prediction with a deterministic score derived from the event variables
+        Args:
+            model_name (str): model id used in the score key
+            kwargs: latency, tps, error_rate and seed, see _StubService
+    """
+    def __init__(self, model_name='stub_model', **kwargs):
+        super().__init__(**kwargs)
+        self.model_name = model_name
+
+    def get_event_prediction(self, detectorId, detectorVersionId, eventId, eventTypeName, eventTimestamp,
+                             entities, eventVariables, **kwargs):
+        self._admit('GetEventPrediction')
+        key = '|'.join(f'{k}={eventVariables[k]}' for k in sorted(eventVariables))
+        score = float(zlib.crc32(key.encode('utf-8')) % 1000)
+        outcome = 'review' if score > 900 else 'verify_customer' if score > 700 else 'approve'
+        return {
+            'modelScores': [{
+                'modelVersion': {'modelId': self.model_name, 'modelType': 'ONLINE_FRAUD_INSIGHTS', 'modelVersionNumber': '1.0'},
+                'scores': {f'{self.model_name}_insightscore': score}
+            }],
+            'ruleResults': [{'ruleId': f'rule_{outcome}', 'outcomes': [outcome]}]
+        }
+
+
+class StubFeatureStoreRuntimeClient(_StubService):
+    """ Keeps put_record calls in memory, keyed by feature group and record identifier.
+        Args:
+            record_identifier (str): feature name of the record identifier
+            kwargs: latency, tps, error_rate and seed, see _StubService
+    """
+    def __init__(self, record_identifier='ip_address', **kwargs):
+        super().__init__(**kwargs)
+        self.record_identifier = record_identifier
+        self.records = {}
+
+    def put_record(self, FeatureGroupName, Record, **kwargs):
+        self._admit('PutRecord')
+        values = {f['FeatureName']: f['ValueAsString'] for f in Record}
+        with self.lock:
+            self.records[(FeatureGroupName, values.get(self.record_identifier))] = values
+        return {}
+
+
+class StubClientFactory(object):
+    """ Picklable factory of stub clients, so worker processes can build their own
+        Args:
+            kind (str): 'frauddetector' or 'sagemaker-featurestore-runtime'
+            kwargs: constructor arguments of the stub client
+    """
+    CLIENTS = {
+        'frauddetector'                 : StubFraudDetectorClient,
+        'sagemaker-featurestore-runtime': StubFeatureStoreRuntimeClient
+    }
+
+    def __init__(self, kind, **kwargs):
+        self.kind = kind
+        self.kwargs = kwargs
+
+    def __call__(self):
+        return self.CLIENTS[self.kind](**self.kwargs)
+
+
+class VirtualClock(object):
+    """ Simulated time of the long-running AWS operations: sleep advances the clock instead of blocking,
+        so an hour of model training passes in the few milliseconds its polls take.
+        Every thread sees its own sleeps on top of the time it started at, and the clock is the furthest
+        any thread has got, so concurrent waits overlap instead of adding up.
+        Args:
+            start (float): simulated seconds to start at
+            scale (float): fraction of every sleep that is actually slept
+    """
+    def __init__(self, start=0.0, scale=0.0):
+        self.now = start
+        self.scale = scale
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def monotonic(self):
+        now = getattr(self.local, 'now', None)
+        return self.now if now is None else now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.local.now = self.monotonic() + seconds
+            self.now = max(self.now, self.local.now)
+        if self.scale:
+            time.sleep(seconds * self.scale)
+
+
+def _snake(name):
+    return ''.join('_' + c.lower() if c.isupper() else c for c in name).lstrip('_')
+
+
+def _timestamp(seconds):
+    return datetime.datetime.fromtimestamp(seconds, tz=datetime.timezone.utc)
+
+
+class FakeAWS(object):
+    """ Stateful stand-in for the AWS APIs of the processing scripts: S3 objects, Athena queries, feature
+        group descriptions and the Amazon Fraud Detector model version, outcome, rule and detector version
+        operations. Attached to a boto3 session, it answers the calls of the session's clients in place of
+        the service, the way botocore's Stubber does, so parameter validation, modeled error classes and
+        event hooks (e.g. afd_pipeline.metrics) work as they do against AWS.
+
+        S3 objects are the files under <root>/s3/<bucket>/<key>, which local_s3_filesystem also serves to
+        fsspec. The other resources and the clock are kept in <root>/aws_state.json, so steps running in
+        separate processes see what earlier steps created.
+        Args:
+            root (str): directory of the simulated account
+            latency (float or dict): seconds every call takes, or service name -> seconds
+            durations (dict): simulated seconds of the long-running operations, overriding DURATIONS
+            clock (VirtualClock): clock of the state transitions
+    """
+    DURATIONS = {
+        'training'     : 3600,  # CreateModelVersion until TRAINING_COMPLETE
+        'activation'   : 600,   # UpdateModelVersionStatus ACTIVE until ACTIVE
+        'query_queue'  : 1,     # StartQueryExecution until RUNNING
+        'query'        : 30,    # RUNNING until SUCCEEDED
+        'offline_store': 0      # add_feature_group until the offline store is Active
+    }
+    ACCOUNT = '123456789012'
+    REGION = 'us-east-1'
+
+    def __init__(self, root, latency=0.005, durations=None, clock=None):
+        self.root = root
+        self.latency = latency
+        self.durations = dict(self.DURATIONS, **(durations or {}))
+        self.clock = clock or VirtualClock()
+        self.lock = threading.RLock()
+        self.state = {'feature_groups': {}, 'queries': {}, 'query_result': None,
+                      'models': {}, 'tags': {}, 'outcomes': {}, 'detectors': {}}
+        os.makedirs(os.path.join(root, 's3'), exist_ok=True)
+        self.save()
+
+    @classmethod
+    def load(cls, root, scale=0.0):
+        """ Resume the simulated account of an earlier process, at the time it stopped """
+        with open(os.path.join(root, 'aws_state.json')) as f:
+            saved = json.load(f)
+        fake = cls.__new__(cls)
+        fake.root = root
+        fake.latency = saved['latency']
+        fake.durations = saved['durations']
+        fake.clock = VirtualClock(saved['clock'], scale)
+        fake.lock = threading.RLock()
+        fake.state = saved['state']
+        return fake
+
+    def save(self):
+        with self.lock:
+            document = {'latency': self.latency, 'durations': self.durations, 'clock': self.clock.now, 'state': self.state}
+            path = os.path.join(self.root, 'aws_state.json')
+            with open(f'{path}.tmp', 'w') as f:
+                json.dump(document, f)
+            os.replace(f'{path}.tmp', path)
+
+    #------Setup of the simulated account
+    def add_feature_group(self, name, feature_names, s3_uri, record_identifier=None, database='sagemaker_featurestore'):
+        """ Register a feature group whose offline store files are under s3_uri """
+        self.state['feature_groups'][name] = {
+            'features'         : list(feature_names),
+            'record_identifier': record_identifier or feature_names[0],
+            's3_uri'           : s3_uri,
+            'database'         : database,
+            'table'            : name.replace('-', '_'),
+            'active_at'        : self.clock.monotonic() + self.durations['offline_store']
+        }
+        self.save()
+
+    def add_detector(self, detector_id):
+        self.state['detectors'].setdefault(detector_id, {'rules': {}, 'versions': 0})
+        self.save()
+
+    def set_query_result(self, path):
+        """ Local CSV file every Athena query returns """
+        self.state['query_result'] = os.path.abspath(path)
+        self.save()
+
+    def s3_path(self, uri):
+        """ Local file of an s3:// uri """
+        return os.path.join(self.root, 's3', *uri[len('s3://'):].split('/'))
+
+    #------botocore hooks
+    def attach(self, session):
+        """ Answer the calls of every client created from a boto3 Session afterwards, or of a single client """
+        events = session.meta.events if hasattr(session, 'meta') else session.events
+        # registered last, so hooks such as the step metrics see the call before it is answered
+        events.register_last('before-parameter-build', self._capture_params, unique_id='afd-fake-aws-params')
+        events.register_last('before-call', self._answer, unique_id='afd-fake-aws-call')
+        return session
+
+    def _capture_params(self, params, context, **kwargs):
+        context['afd_fake_aws_params'] = dict(params)
+
+    def _answer(self, model, context, **kwargs):
+        from botocore.awsrequest import AWSResponse
+        status, parsed = self.handle(model.service_model.service_name, model.name,
+                                     context.get('afd_fake_aws_params', {}))
+        return AWSResponse(None, status, {}, None), parsed
+
+    def handle(self, service, operation_name, params):
+        """ Answer one call
+            Args:
+                service (str): service name, e.g. 's3' or 'frauddetector'
+                operation_name (str): e.g. 'GetObject'
+                params (dict): parameters of the call
+            Returns:
+                (HTTP status, parsed response), an error response has the code in ['Error']['Code']
+        """
+        latency = self.latency.get(service, 0) if isinstance(self.latency, dict) else self.latency
+        if latency:
+            time.sleep(latency)
+        handler = getattr(self, f"_{service.replace('-', '_')}_{_snake(operation_name)}", None)
+        try:
+            if handler is None:
+                raise StubClientError('NotImplemented', f'FakeAWS does not implement {service} {operation_name}', operation_name)
+            with self.lock:
+                parsed = handler(**params) or {}
+                self.save()
+            status = 200
+        except StubClientError as e:
+            status = 404 if e.response['Error']['Code'] in ('NoSuchKey', '404', 'ResourceNotFoundException') else 400
+            parsed = dict(e.response)
+        parsed['ResponseMetadata'] = {'HTTPStatusCode': status, 'HTTPHeaders': {}, 'RetryAttempts': 0}
+        return status, parsed
+
+    #------S3
+    def _object(self, bucket, key):
+        path = self.s3_path(f's3://{bucket}/{key}')
+        if not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        return {'Key': key, 'Size': stat.st_size, 'LastModified': _timestamp(stat.st_mtime),
+                'ETag': f'"{stat.st_size:x}{stat.st_mtime_ns:x}"', 'StorageClass': 'STANDARD'}
+
+    def _s3_list_objects_v2(self, Bucket, Prefix='', **kwargs):
+        bucket_path = os.path.join(self.root, 's3', Bucket)
+        keys = sorted(os.path.relpath(os.path.join(d, name), bucket_path).replace(os.sep, '/')
+                      for d, _, names in os.walk(bucket_path) for name in names)
+        contents = [self._object(Bucket, k) for k in keys if k.startswith(Prefix)]
+        return {'Contents': contents, 'KeyCount': len(contents), 'IsTruncated': False, 'Name': Bucket, 'Prefix': Prefix}
+
+    def _s3_head_object(self, Bucket, Key, **kwargs):
+        obj = self._object(Bucket, Key)
+        if obj is None:
+            raise StubClientError('404', 'Not Found', 'HeadObject')
+        return {'ContentLength': obj['Size'], 'LastModified': obj['LastModified'], 'ETag': obj['ETag']}
+
+    def _s3_get_object(self, Bucket, Key, **kwargs):
+        from botocore.response import StreamingBody
+        obj = self._object(Bucket, Key)
+        if obj is None:
+            raise StubClientError('NoSuchKey', 'The specified key does not exist.', 'GetObject')
+        body = StreamingBody(open(self.s3_path(f's3://{Bucket}/{Key}'), 'rb'), obj['Size'])
+        return {'Body': body, 'ContentLength': obj['Size'], 'LastModified': obj['LastModified'], 'ETag': obj['ETag']}
+
+    def _s3_put_object(self, Bucket, Key, Body=b'', **kwargs):
+        path = self.s3_path(f's3://{Bucket}/{Key}')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            if isinstance(Body, str):
+                f.write(Body.encode('utf-8'))
+            elif isinstance(Body, (bytes, bytearray)):
+                f.write(Body)
+            else:
+                shutil.copyfileobj(Body, f)
+        return {'ETag': self._object(Bucket, Key)['ETag']}
+
+    def _s3_delete_objects(self, Bucket, Delete, **kwargs):
+        for obj in Delete['Objects']:
+            path = self.s3_path(f"s3://{Bucket}/{obj['Key']}")
+            if os.path.isfile(path):
+                os.remove(path)
+        return {'Deleted': [] if Delete.get('Quiet') else [{'Key': obj['Key']} for obj in Delete['Objects']]}
+
+    #------STS and SageMaker Feature Store
+    def _sts_get_caller_identity(self, **kwargs):
+        return {'UserId': 'AIDAFAKEAWS', 'Account': self.ACCOUNT, 'Arn': f'arn:aws:iam::{self.ACCOUNT}:user/fake-aws'}
+
+    def _sagemaker_describe_feature_group(self, FeatureGroupName, **kwargs):
+        group = self.state['feature_groups'].get(FeatureGroupName)
+        if group is None:
+            raise StubClientError('ResourceNotFound', f'Resource Not Found: Amazon SageMaker can\'t find a FeatureGroup '
+                                                      f'with name {FeatureGroupName}', 'DescribeFeatureGroup')
+        active = self.clock.monotonic() >= group['active_at']
+        return {
+            'FeatureGroupName'           : FeatureGroupName,
+            'FeatureGroupArn'            : f'arn:aws:sagemaker:{self.REGION}:{self.ACCOUNT}:feature-group/{FeatureGroupName}',
+            'RecordIdentifierFeatureName': group['record_identifier'],
+            'EventTimeFeatureName'       : 'EventTime',
+            'FeatureDefinitions'         : [{'FeatureName': n, 'FeatureType': 'String'} for n in group['features']],
+            'FeatureGroupStatus'         : 'Created',
+            'OfflineStoreConfig'         : {
+                'S3StorageConfig'  : {'S3Uri': group['s3_uri'], 'ResolvedOutputS3Uri': group['s3_uri']},
+                'DataCatalogConfig': {'TableName': group['table'], 'Catalog': 'AwsDataCatalog', 'Database': group['database']}
+            },
+            'OfflineStoreStatus'         : {'Status': 'Active' if active else 'Creating'}
+        }
+
+    #------Athena, every query returns the CSV of set_query_result after the simulated queue and run time
+    def _athena_start_query_execution(self, QueryString, ResultConfiguration, QueryExecutionContext=None, **kwargs):
+        if self.state['query_result'] is None:
+            raise StubClientError('InvalidRequestException', 'FakeAWS has no query result, see set_query_result',
+                                  'StartQueryExecution')
+        query_execution_id = str(uuid.uuid4())
+        output = f"{ResultConfiguration['OutputLocation'].rstrip('/')}/{query_execution_id}.csv"
+        path = self.s3_path(output)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(self.state['query_result'], path)
+        open(f'{path}.metadata', 'wb').close()
+        self.state['queries'][query_execution_id] = {'query': QueryString, 'output': output, 'submitted': self.clock.monotonic()}
+        return {'QueryExecutionId': query_execution_id}
+
+    def _athena_get_query_execution(self, QueryExecutionId, **kwargs):
+        query = self.state['queries'].get(QueryExecutionId)
+        if query is None:
+            raise StubClientError('InvalidRequestException', f'QueryExecution {QueryExecutionId} was not found',
+                                  'GetQueryExecution')
+        elapsed = self.clock.monotonic() - query['submitted']
+        queue, run = self.durations['query_queue'], self.durations['query']
+        state = 'QUEUED' if elapsed < queue else 'RUNNING' if elapsed < queue + run else 'SUCCEEDED'
+        execution = {
+            'QueryExecutionId'   : QueryExecutionId,
+            'Query'              : query['query'],
+            'ResultConfiguration': {'OutputLocation': query['output']},
+            'Status'             : {'State': state}
+        }
+        if state == 'SUCCEEDED':
+            execution['Statistics'] = {'QueryQueueTimeInMillis': int(queue * 1000), 'EngineExecutionTimeInMillis': int(run * 1000),
+                                       'DataScannedInBytes': os.path.getsize(self.s3_path(query['output']))}
+        return {'QueryExecution': execution}
+
+    #------Amazon Fraud Detector
+    def _model_version(self, modelId, modelVersionNumber, operation_name):
+        version = self.state['models'].get(modelId, {}).get(modelVersionNumber)
+        if version is None:
+            raise StubClientError('ResourceNotFoundException', f'model version {modelId} {modelVersionNumber} not found',
+                                  operation_name)
+        return version
+
+    def _status(self, version):
+        # transitions are [time, status] pairs, the latest one that is due is the current status
+        now = self.clock.monotonic()
+        return [status for at, status in version['transitions'] if at <= now][-1]
+
+    def _training_metrics(self, version):
+        # a deterministic metric curve with fpr and tpr falling from 1 to 0 over the score range
+        points = [{'threshold': float(t), 'fpr': round((1 - t / 1000) ** 4, 6), 'tpr': round(1 - (t / 1000) ** 2, 6),
+                   'precision': round(0.05 + 0.9 * t / 1000, 6)} for t in range(0, 1001, 5)]
+        return {'auc': version['auc'], 'metricDataPoints': points}
+
+    def _frauddetector_create_model_version(self, modelId, modelType, trainingDataSource, trainingDataSchema,
+                                            externalEventsDetail=None, tags=None, **kwargs):
+        versions = self.state['models'].setdefault(modelId, {})
+        number = f'{len(versions) + 1}.0'
+        now = self.clock.monotonic()
+        arn = f'arn:aws:frauddetector:{self.REGION}:{self.ACCOUNT}:model-version/{modelType}/{modelId}/{number}'
+        versions[number] = {
+            'modelId': modelId, 'modelType': modelType, 'modelVersionNumber': number, 'arn': arn,
+            'trainingDataSource': trainingDataSource, 'trainingDataSchema': trainingDataSchema,
+            'externalEventsDetail': externalEventsDetail or {}, 'auc': 0.92,
+            'transitions': [[now, 'TRAINING_IN_PROGRESS'], [now + self.durations['training'], 'TRAINING_COMPLETE']]
+        }
+        self.state['tags'][arn] = list(tags or [])
+        return {'modelId': modelId, 'modelType': modelType, 'modelVersionNumber': number, 'status': 'TRAINING_IN_PROGRESS'}
+
+    def _frauddetector_get_model_version(self, modelId, modelType, modelVersionNumber, **kwargs):
+        version = self._model_version(modelId, modelVersionNumber, 'GetModelVersion')
+        detail = {k: version[k] for k in ('modelId', 'modelType', 'modelVersionNumber', 'trainingDataSource',
+                                          'trainingDataSchema', 'externalEventsDetail', 'arn')}
+        detail['status'] = self._status(version)
+        return detail
+
+    def _frauddetector_describe_model_versions(self, modelId=None, modelVersionNumber=None, modelType=None, **kwargs):
+        if modelId not in self.state['models']:
+            raise StubClientError('ResourceNotFoundException', f'model {modelId} not found', 'DescribeModelVersions')
+        details = []
+        for number, version in self.state['models'][modelId].items():
+            if modelVersionNumber is not None and number != modelVersionNumber:
+                continue
+            status = self._status(version)
+            detail = {'modelId': modelId, 'modelType': version['modelType'], 'modelVersionNumber': number,
+                      'status': status, 'trainingDataSource': version['trainingDataSource'], 'arn': version['arn']}
+            if status != 'TRAINING_IN_PROGRESS':
+                detail['trainingResult'] = {'trainingMetrics': self._training_metrics(version)}
+            details.append(detail)
+        return {'modelVersionDetails': details}
+
+    def _frauddetector_update_model_version_status(self, modelId, modelType, modelVersionNumber, status, **kwargs):
+        version = self._model_version(modelId, modelVersionNumber, 'UpdateModelVersionStatus')
+        current, now = self._status(version), self.clock.monotonic()
+        if status == 'ACTIVE' and current in ('TRAINING_COMPLETE', 'INACTIVE'):
+            version['transitions'] += [[now, 'ACTIVATE_IN_PROGRESS'], [now + self.durations['activation'], 'ACTIVE']]
+        elif status == 'INACTIVE' and current == 'ACTIVE':
+            version['transitions'].append([now, 'INACTIVE'])
+        else:
+            raise StubClientError('ValidationException', f'cannot change the status of a {current} model version to {status}',
+                                  'UpdateModelVersionStatus')
+        return {}
+
+    def _frauddetector_list_tags_for_resource(self, resourceARN, **kwargs):
+        return {'tags': self.state['tags'].get(resourceARN, [])}
+
+    def _frauddetector_get_outcomes(self, **kwargs):
+        return {'outcomes': list(self.state['outcomes'].values())}
+
+    def _frauddetector_put_outcome(self, name, description='', **kwargs):
+        self.state['outcomes'][name] = {'name': name, 'description': description}
+        return {}
+
+    def _detector(self, detectorId, operation_name):
+        detector = self.state['detectors'].get(detectorId)
+        if detector is None:
+            raise StubClientError('ResourceNotFoundException', f'detector {detectorId} not found', operation_name)
+        return detector
+
+    def _frauddetector_get_rules(self, detectorId, ruleId=None, **kwargs):
+        rules = self._detector(detectorId, 'GetRules')['rules']
+        return {'ruleDetails': [v for rule_id, versions in rules.items() if ruleId in (None, rule_id) for v in versions]}
+
+    def _frauddetector_create_rule(self, ruleId, detectorId, expression, language, outcomes, **kwargs):
+        rules = self._detector(detectorId, 'CreateRule')['rules']
+        if ruleId in rules:
+            raise StubClientError('ValidationException', f'rule {ruleId} already exists', 'CreateRule')
+        rules[ruleId] = [{'ruleId': ruleId, 'detectorId': detectorId, 'ruleVersion': '1',
+                          'expression': expression, 'language': language, 'outcomes': outcomes}]
+        return {'rule': {'detectorId': detectorId, 'ruleId': ruleId, 'ruleVersion': '1'}}
+
+    def _frauddetector_update_rule_version(self, rule, expression, language, outcomes, **kwargs):
+        versions = self._detector(rule['detectorId'], 'UpdateRuleVersion')['rules'].get(rule['ruleId'])
+        if versions is None:
+            raise StubClientError('ResourceNotFoundException', f"rule {rule['ruleId']} not found", 'UpdateRuleVersion')
+        number = str(max(int(v['ruleVersion']) for v in versions) + 1)
+        versions.append({'ruleId': rule['ruleId'], 'detectorId': rule['detectorId'], 'ruleVersion': number,
+                         'expression': expression, 'language': language, 'outcomes': outcomes})
+        return {'rule': {'detectorId': rule['detectorId'], 'ruleId': rule['ruleId'], 'ruleVersion': number}}
+
+    def _frauddetector_create_detector_version(self, detectorId, rules, modelVersions=None, **kwargs):
+        detector = self._detector(detectorId, 'CreateDetectorVersion')
+        detector['versions'] += 1
+        return {'detectorId': detectorId, 'detectorVersionId': str(detector['versions']), 'status': 'DRAFT'}
+
+
+def local_s3_filesystem(root):
+    """ fsspec filesystem class serving s3://<bucket>/<key> from the FakeAWS objects under <root>/s3,
+        to be registered with fsspec.register_implementation('s3', cls, clobber=True)
+    """
+    from fsspec.implementations.dirfs import DirFileSystem
+    from fsspec.implementations.local import LocalFileSystem
+
+    class LocalS3FileSystem(DirFileSystem):
+        protocol = ('s3', 's3a')
+
+        def __init__(self, *args, **storage_options):
+            # the s3fs storage options (credentials, anon, ...) do not apply
+            super().__init__(path=os.path.join(os.path.abspath(root), 's3'), fs=LocalFileSystem(auto_mkdir=True))
+
+    return LocalS3FileSystem
@@ -0,0 +1,284 @@
+"""
+Benchmark the processing scripts of the pipeline end to end, offline, against a simulated AWS account
+(benchmarks/fake_aws.py) on synthetic feature groups of increasing size.
+
+Every step runs its unchanged script in a fresh process, with temporary directories in place of the
+/opt/ml/processing paths and the step outputs handed to the next step the way the pipeline does.
+Service calls take --latency seconds, and the long-running operations (Athena queries, model training
+and activation) pass on a simulated clock, so a run takes seconds but polls as often as on AWS.
+Wall time, API calls and peak memory per step come from the step metrics files (afd_pipeline.metrics).
+
+    python benchmarks/pipeline_benchmark.py                               # 10k, 100k and 1M rows
+    python benchmarks/pipeline_benchmark.py --rows 100000 --passes 2      # second pass hits the caches
+    python benchmarks/pipeline_benchmark.py --engine local --output bench.json
+
+The results file records the commit, so runs of different commits can be compared.
+Needs the packages of the processing container (boto3, pandas, pyarrow and fsspec): the steps' own boto3
+clients are answered in place of AWS, parameter validation included.
+"""
+import os
+import sys
+import json
+import time
+import runpy
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO_ROOT)
+from benchmarks.fake_aws import FakeAWS, local_s3_filesystem
+from afd_pipeline.metrics import load_step_metrics, aggregate
+
+STEPS = ['create_dataset', 'train_afd', 'activate_afd', 'setup_detector']
+BUCKET = 'afd-bench'
+PREFIX = 'bench'
+REGION = 'us-east-1'
+MODEL_NAME = 'bench_model'
+DETECTOR_NAME = 'bench_detector'
+FILE_ROWS = 100000
+
+
+def make_feature_groups(rows, seed=0):
+    """ Synthetic signups and outcomes feature groups shaped like the sample's, joined on ip and email address """
+    # imported here, so the step processes that load this module start up as they would on their own
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    index = pd.Series(np.arange(rows))
+    ips = '10.' + (index // 65536 % 256).astype(str) + '.' + (index // 256 % 256).astype(str) + '.' + (index % 256).astype(str)
+    emails = 'user' + index.astype(str) + '@example' + (index % 50).astype(str) + '.com'
+    event_time = (1609459200 + index).astype('float64').to_numpy()
+    postal = rng.integers(10000, 99999, rows).astype('float64')
+    postal[rng.random(rows) < 0.25] = np.nan
+    signups = pd.DataFrame({
+        'ip_address'      : ips,
+        'email_address'   : emails,
+        'user_agent'      : 'Mozilla/5.0 agent-' + pd.Series(rng.integers(0, 5000, rows)).astype(str),
+        'customer_state'  : 'S' + pd.Series(rng.integers(10, 60, rows)).astype(str),
+        'customer_postal' : postal,
+        'phone_number'    : rng.integers(2000000000, 9999999999, rows),
+        'EVENT_TIMESTAMP' : np.char.add(np.datetime_as_string(event_time.astype('datetime64[s]'), unit='s'), 'Z').astype(object),
+        'EventTime'       : event_time
+    })
+    outcomes = pd.DataFrame({
+        'ip_address'  : ips,
+        'email_address': emails,
+        'EVENT_LABEL' : np.where(rng.random(rows) < 0.05, 'fraud', 'legit'),
+        'EventTime'   : event_time + 60
+    })
+    return signups, outcomes
+
+
+def write_offline_store(df, path):
+    """ Parquet files of FILE_ROWS records, with the offline store's own columns """
+    os.makedirs(path, exist_ok=True)
+    for i, start in enumerate(range(0, len(df), FILE_ROWS)):
+        part = df.iloc[start:start + FILE_ROWS].assign(write_time=df['EventTime'].iloc[start:start + FILE_ROWS],
+                                                       api_invocation_time=df['EventTime'].iloc[start:start + FILE_ROWS],
+                                                       is_deleted=False)
+        part.to_parquet(os.path.join(path, f'part-{i:05d}.parquet'), index=False)
+
+
+def athena_result(signups, outcomes):
+    """ The result of the create_dataset query: common columns first, then the other columns of each table, sorted """
+    keys = sorted(set(signups.columns) & set(outcomes.columns) - {'EventTime'})
+    sg_cols = sorted(set(signups.columns) - set(keys) - {'EventTime'})
+    oc_cols = sorted(set(outcomes.columns) - set(keys) - {'EventTime'})
+    return signups[keys + sg_cols].merge(outcomes[keys + oc_cols], how='left', on=keys).drop_duplicates()
+
+
+def setup_account(root, rows, args):
+    """ Simulated account with the two feature groups, their offline stores, the Athena result and the detector """
+    fake = FakeAWS(root, latency=args.latency,
+                   durations={'training': args.training_seconds, 'activation': args.activation_seconds,
+                              'query': args.query_seconds})
+    signups, outcomes = make_feature_groups(rows)
+    for name, df in (('signups', signups), ('outcomes', outcomes)):
+        s3_uri = f's3://{BUCKET}/{PREFIX}/offline-store/{name}'
+        write_offline_store(df, fake.s3_path(s3_uri))
+        fake.add_feature_group(name, list(df.columns), s3_uri, record_identifier='ip_address')
+    result_file = os.path.join(root, 'athena_result.csv')
+    athena_result(signups, outcomes).to_csv(result_file, index=False)
+    fake.set_query_result(result_file)
+    fake.add_detector(DETECTOR_NAME)
+    return fake
+
+
+def step_arguments(step, work, root, args):
+    """ Command line of a step, its processing directories under work """
+    common = ['--region', REGION, '--metrics-dir', os.path.join(work, 'metrics')]
+    if step == 'create_dataset':
+        arguments = ['--signups-feature-group-name', 'signups', '--outcomes-feature-group-name', 'outcomes',
+                     '--bucket-name', BUCKET, '--bucket-prefix', PREFIX, '--engine', args.engine,
+                     '--output-dir', os.path.join(work, 'create_dataset')]
+        if args.engine == 'local':
+            store = os.path.join(root, 's3', BUCKET, PREFIX, 'offline-store')
+            arguments += ['--signups-offline-store-uri', os.path.join(store, 'signups'),
+                          '--outcomes-offline-store-uri', os.path.join(store, 'outcomes')]
+        return arguments + (['--typed-copy'] if args.typed_copy else []) + common
+    if step == 'train_afd':
+        return ['--data-access-role', f'arn:aws:iam::{FakeAWS.ACCOUNT}:role/afd-bench', '--model-name', MODEL_NAME,
+                '--s3-file-loc', f's3://{BUCKET}/{PREFIX}/data/train/afd_training_data.csv',
+                '--schema-dir', os.path.join(work, 'create_dataset', 'schema'),
+                '--output-dir', os.path.join(work, 'train_afd', 'output'),
+                '--auc-dir', os.path.join(work, 'train_afd', 'auc')] + common
+    if step == 'activate_afd':
+        return ['--input-dir', os.path.join(work, 'train_afd', 'output'),
+                '--output-dir', os.path.join(work, 'activate_afd', 'output')] + common
+    return ['--detector-name', DETECTOR_NAME, '--input-dir', os.path.join(work, 'activate_afd', 'output')] + common
+
+
+def prepare_step(step, work, fake):
+    """ What SageMaker does around a processing step: create the output directories, and upload the
+        training dataset to S3 after create_dataset
+    """
+    for directory in ('create_dataset/train', 'create_dataset/schema', 'train_afd/output', 'train_afd/auc',
+                      'activate_afd/output'):
+        os.makedirs(os.path.join(work, directory), exist_ok=True)
+    if step == 'train_afd':
+        destination = fake.s3_path(f's3://{BUCKET}/{PREFIX}/data/train/afd_training_data.csv')
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(os.path.join(work, 'create_dataset', 'train', 'afd_training_data.csv'), destination)
+
+
+def run_step(step, work, root, args):
+    """ Run a step script in a fresh process
+        Returns:
+            (seconds from process start to exit, exit code)
+    """
+    env = dict(os.environ, AWS_ACCESS_KEY_ID='fake', AWS_SECRET_ACCESS_KEY='fake', AWS_DEFAULT_REGION=REGION,
+               AWS_EC2_METADATA_DISABLED='true')
+    command = [sys.executable, os.path.abspath(__file__), '--run-step', root, str(args.time_scale),
+               os.path.join(REPO_ROOT, 'scripts', f'{step}.py')] + step_arguments(step, work, root, args)
+    stime = time.perf_counter()
+    with open(os.path.join(work, f'{step}.log'), 'w') as log:
+        code = subprocess.call(command, stdout=log, stderr=subprocess.STDOUT, env=env)
+    return time.perf_counter() - stime, code
+
+
+def step_main(root, time_scale, script, arguments):
+    """ Child process: attach the simulated account to every boto3 session and to fsspec's s3://, put the
+        waiters on its clock and run the script
+    """
+    import boto3
+    import fsspec
+    import afd_pipeline.waiter
+
+    fake = FakeAWS.load(root, scale=float(time_scale))
+    session_init = boto3.session.Session.__init__
+
+    def attached_init(self, *args, **kwargs):
+        session_init(self, *args, **kwargs)
+        fake.attach(self)
+    boto3.session.Session.__init__ = attached_init
+    fsspec.register_implementation('s3', local_s3_filesystem(root), clobber=True)
+
+    class Waiter(afd_pipeline.waiter.Waiter):
+        def __init__(self, *args, **kwargs):
+            kwargs.setdefault('sleep', fake.clock.sleep)
+            kwargs.setdefault('clock', fake.clock.monotonic)
+            super().__init__(*args, **kwargs)
+    afd_pipeline.waiter.Waiter = Waiter
+
+    sys.argv = [script] + arguments
+    try:
+        runpy.run_path(script, run_name='__main__')
+    finally:
+        fake.save()
+
+
+def run_pipeline(rows, root, work, args):
+    """ Returns:
+            per step records of one pass, in step order
+    """
+    fake = FakeAWS.load(root)
+    records = []
+    for step in args.steps:
+        prepare_step(step, work, fake)
+        wall, code = run_step(step, work, root, args)
+        metrics_dir = os.path.join(work, 'metrics')
+        documents = {d['step']: d for d in load_step_metrics(metrics_dir)} if os.path.isdir(metrics_dir) else {}
+        document = documents.get(step)
+        if code != 0 or document is None or document['status'] != 'succeeded':
+            with open(os.path.join(work, f'{step}.log')) as log:
+                print(log.read()[-3000:])
+            raise RuntimeError(f'{step} failed on {rows:,} rows, exit code {code}, log in {work}')
+        summary = aggregate([document])['steps'][0]
+        records.append({
+            'step'         : step,
+            'wall_s'       : round(wall, 3),
+            'elapsed_s'    : summary['elapsed_s'],
+            'startup_s'    : summary['startup_s'],
+            'api_calls'    : summary['api_calls'],
+            'api_s'        : summary['api_s'],
+            'peak_rss_mb'  : summary['peak_rss_mb'],
+            'bytes_read'   : summary['bytes_read'],
+            'bytes_written': summary['bytes_written'],
+            'calls'        : {name: call['count'] for name, call in document.get('api_calls', {}).items()},
+            'counters'     : summary['counters']
+        })
+    return records
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--steps', type=str, nargs='+', default=STEPS, choices=STEPS,
+                        help='steps to run, each needs the outputs of the steps before it')
+    parser.add_argument('--engine', type=str, default='athena', choices=['athena', 'local'])
+    parser.add_argument('--typed-copy', action='store_true')
+    parser.add_argument('--passes', type=int, default=1, help='runs of the pipeline on the same account, later passes hit the caches')
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds every AWS call takes')
+    parser.add_argument('--query-seconds', type=float, default=30, help='simulated Athena run time')
+    parser.add_argument('--training-seconds', type=float, default=3600, help='simulated model training time')
+    parser.add_argument('--activation-seconds', type=float, default=600, help='simulated model activation time')
+    parser.add_argument('--time-scale', type=float, default=0.0, help='fraction of the simulated waits actually slept')
+    parser.add_argument('--output', type=str, default=None, help='JSON file the results are written to')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary directories')
+    args = parser.parse_args()
+
+    results = {'commit': git_commit(), 'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+               'config': {k: v for k, v in vars(args).items() if k not in ('output', 'keep')}, 'runs': []}
+    print(f"{'rows':>10} {'pass':>4}  {'step':<16}{'wall_s':>9}{'elapsed_s':>11}{'startup_s':>11}"
+          f"{'api_calls':>11}{'api_s':>8}{'peak_rss_mb':>13}")
+    for rows in args.rows:
+        base = tempfile.mkdtemp(prefix=f'afd-bench-{rows}-')
+        try:
+            root = os.path.join(base, 'aws')
+            stime = time.perf_counter()
+            setup_account(root, rows, args)
+            print(f'{rows:>10,}       synthetic data in {time.perf_counter() - stime:.1f}s')
+            for n in range(1, args.passes + 1):
+                work = os.path.join(base, f'pass{n}')
+                steps = run_pipeline(rows, root, work, args)
+                for s in steps:
+                    print(f"{rows:>10,} {n:>4}  {s['step']:<16}{s['wall_s']:>9.3f}{s['elapsed_s']:>11.3f}{s['startup_s'] or 0:>11.3f}"
+                          f"{s['api_calls']:>11}{s['api_s']:>8.3f}{s['peak_rss_mb'] or 0:>13.1f}")
+                results['runs'].append({'rows': rows, 'pass': n, 'steps': steps,
+                                        'wall_s': round(sum(s['wall_s'] for s in steps), 3)})
+        finally:
+            if args.keep:
+                print(f'Kept {base}')
+            else:
+                shutil.rmtree(base, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--run-step':
+        step_main(sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5:])
+    else:
+        main()
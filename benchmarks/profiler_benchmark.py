@@ -0,0 +1,119 @@
+"""
+Benchmark data_profiler.profile_dataframe against the original summary_stats implementation
+on synthetic signup frames.
+
+    python benchmarks/profiler_benchmark.py                       # 1M, 10M and 50M rows
+    python benchmarks/profiler_benchmark.py --rows 1000000 5000000
+    python benchmarks/profiler_benchmark.py --n-jobs -1           # parallel per-column profiling
+
+The 50M row frame needs roughly 16GB of memory for the legacy run, which copies the frame.
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_profiler import profile_dataframe
+
+
+def legacy_summary_stats(df):
+    """ summary_stats as it was before the profiling core was split out, minus the notebook display calls """
+    df = df.copy()
+    rowcnt = len(df)
+    df['EVENT_LABEL'] = df['EVENT_LABEL'].astype('str', errors='ignore')
+    df_s1  = df.agg(['count', 'nunique']).transpose().reset_index().rename(columns={"index":"feature_name"})
+    df_s1["null"] = (rowcnt - df_s1["count"]).astype('int64')
+    df_s1["not_null"] = rowcnt - df_s1["null"]
+    df_s1["null_pct"] = df_s1["null"] / rowcnt
+    df_s1["nunique_pct"] = df_s1['nunique']/ rowcnt
+    dt = pd.DataFrame(df.dtypes).reset_index().rename(columns={"index":"feature_name", 0:"dtype"})
+    df_stats = pd.merge(dt, df_s1, on='feature_name', how='inner').round(4)
+    df_stats['nunique'] = df_stats['nunique'].astype('int64')
+    df_stats['count'] = df_stats['count'].astype('int64')
+
+    df_stats['feature_type'] = "UNKOWN"
+    df_stats.loc[df_stats["dtype"] == object, 'feature_type'] = "CATEGORY"
+    df_stats.loc[(df_stats["dtype"] == "int64") | (df_stats["dtype"] == "float64"), 'feature_type'] = "NUMERIC"
+    df_stats.loc[df_stats["feature_name"].str.contains("ipaddress|ip_address|ipaddr"), 'feature_type'] = "IP_ADDRESS"
+    df_stats.loc[df_stats["feature_name"].str.contains("email|email_address|emailaddr"), 'feature_type'] = "EMAIL_ADDRESS"
+    df_stats.loc[df_stats["feature_name"] == "EVENT_LABEL", 'feature_type'] = "TARGET"
+    df_stats.loc[df_stats["feature_name"] == "EVENT_TIMESTAMP", 'feature_type'] = "EVENT_TIMESTAMP"
+
+    df_stats['feature_warning'] = "NO WARNING"
+    df_stats.loc[(df_stats["nunique"] != 2) & (df_stats["feature_name"] == "EVENT_LABEL"),'feature_warning' ] = "LABEL WARNING, NON-BINARY EVENT LABEL"
+    df_stats.loc[(df_stats["nunique_pct"] > 0.9) & (df_stats['feature_type'] == "CATEGORY") ,'feature_warning' ] = "EXCLUDE, GT 90% UNIQUE"
+    df_stats.loc[(df_stats["null_pct"] > 0.2) & (df_stats["null_pct"] <= 0.5), 'feature_warning' ] = "NULL WARNING, GT 20% MISSING"
+    df_stats.loc[df_stats["null_pct"] > 0.5,'feature_warning' ] = "EXCLUDE, GT 50% MISSING"
+    df_stats.loc[((df_stats['dtype'] == "int64" ) | (df_stats['dtype'] == "float64" ) ) & (df_stats['nunique'] < 0.2), 'feature_warning' ] = "LIKELY CATEGORICAL, NUMERIC w. LOW CARDINALITY"
+
+    event_variables = df_stats.loc[(~df_stats['feature_name'].isin(['EVENT_LABEL', 'EVENT_TIMESTAMP']))]['feature_name'].to_list()
+    event_labels    = df["EVENT_LABEL"].unique().tolist()
+
+    trainingDataSchema = {
+        'modelVariables' : df_stats.loc[(df_stats['feature_type'].isin(['IP_ADDRESS', 'EMAIL_ADDRESS', 'CATEGORY', 'NUMERIC' ]))]['feature_name'].to_list(),
+        'labelSchema'    : {
+            'labelMapper' : {
+                'FRAUD' : [df["EVENT_LABEL"].value_counts().idxmin()],
+                'LEGIT' : [df["EVENT_LABEL"].value_counts().idxmax()]
+            }
+        }
+    }
+    return df_stats, trainingDataSchema, event_variables, event_labels
+
+
+def make_signups(rows, seed=0):
+    """ Synthetic signup frame shaped like the AFD training data. String columns draw from
+        shared pools so the frame costs one pointer per cell rather than one string object.
+    """
+    rng = np.random.default_rng(seed)
+    ips = np.array([f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}' for i in range(min(rows, 2000000))], dtype=object)
+    emails = np.array([f'user{i}@example{i % 50}.com' for i in range(min(rows, 2000000))], dtype=object)
+    agents = np.array([f'Mozilla/5.0 agent-{i}' for i in range(5000)], dtype=object)
+    states = np.array([f'S{i:02d}' for i in range(50)], dtype=object)
+
+    postal = rng.integers(10000, 99999, rows).astype('float64')
+    postal[rng.random(rows) < 0.25] = np.nan
+    return pd.DataFrame({
+        'ip_address'      : ips[rng.integers(0, len(ips), rows)],
+        'email_address'   : emails[rng.integers(0, len(emails), rows)],
+        'user_agent'      : agents[rng.integers(0, len(agents), rows)],
+        'customer_state'  : states[rng.integers(0, len(states), rows)],
+        'customer_postal' : postal,
+        'phone_number'    : rng.integers(2000000000, 9999999999, rows),
+        'EVENT_TIMESTAMP' : np.array(['2021-01-01T00:00:00Z'], dtype=object)[np.zeros(rows, dtype=np.intp)],
+        'EVENT_LABEL'     : np.array(['legit', 'fraud'], dtype=object)[(rng.random(rows) < 0.05).astype(np.intp)]
+    })
+
+
+def timed(fn, *args):
+    stime = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - stime
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000, 10000000, 50000000])
+    parser.add_argument('--n-jobs', type=int, default=None, help='worker processes for profile_dataframe, -1 for all cores')
+    parser.add_argument('--skip-legacy', action='store_true', help='only time the new implementation')
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} {'legacy (s)':>12} {'profile (s)':>12} {'speedup':>8}")
+    for rows in args.rows:
+        df = make_signups(rows)
+        result, new_time = timed(profile_dataframe, df, args.n_jobs)
+        if args.skip_legacy:
+            print(f"{rows:>12,} {'-':>12} {new_time:>12.2f} {'-':>8}")
+            continue
+        legacy, legacy_time = timed(legacy_summary_stats, df)
+        pd.testing.assert_frame_equal(legacy[0], result.df_stats)
+        assert tuple(legacy[1:]) == tuple(result[1:4]), 'profile_dataframe output differs from the legacy implementation'
+        print(f"{rows:>12,} {legacy_time:>12.2f} {new_time:>12.2f} {legacy_time / new_time:>7.1f}x")
+        del df, result, legacy
+
+
+if __name__ == '__main__':
+    main()
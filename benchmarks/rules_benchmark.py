@@ -0,0 +1,67 @@
+"""
+Benchmark afd_pipeline.rules.evaluate_rules replaying a generated rule set over synthetic scores,
+against a row-by-row Python evaluation of the same FIRST_MATCHED rules.
+
+    python benchmarks/rules_benchmark.py                          # 1M and 10M rows
+    python benchmarks/rules_benchmark.py --rows 50000000 --mode ALL_MATCHED --skip-legacy
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from afd_pipeline.rules import evaluate_rules
+
+MODEL_NAME = 'afd_demo_model'
+
+# the rule set setup_detector generated for the sample model
+RULE_SET = [
+    {'rule': f'${MODEL_NAME}_insightscore > 970.0', 'outcome': 'review'},
+    {'rule': f'${MODEL_NAME}_insightscore > 920.0', 'outcome': 'review'},
+    {'rule': f'${MODEL_NAME}_insightscore > 880.0', 'outcome': 'review'},
+    {'rule': f'${MODEL_NAME}_insightscore > 835.0', 'outcome': 'verify_customer'},
+    {'rule': f'${MODEL_NAME}_insightscore > 795.0', 'outcome': 'verify_customer'},
+    {'rule': f'${MODEL_NAME}_insightscore <= 795.0', 'outcome': 'approve'}
+]
+
+
+def legacy_first_matched(scores):
+    """ Row-by-row FIRST_MATCHED evaluation of RULE_SET """
+    thresholds = [970.0, 920.0, 880.0, 835.0, 795.0]
+    outcomes = ['review', 'review', 'review', 'verify_customer', 'verify_customer']
+    result = []
+    for s in scores:
+        for t, o in zip(thresholds, outcomes):
+            if s > t:
+                result.append(o)
+                break
+        else:
+            result.append('approve' if s <= 795.0 else '')
+    return result
+
+
+def timed(fn, *args, **kwargs):
+    stime = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - stime
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000, 10000000])
+    parser.add_argument('--mode', type=str, default='FIRST_MATCHED', choices=['FIRST_MATCHED', 'ALL_MATCHED'])
+    parser.add_argument('--skip-legacy', action='store_true')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for rows in args.rows:
+        df = pd.DataFrame({f'{MODEL_NAME}_insightscore': rng.integers(0, 1000, rows).astype('float64')})
+        result, elapsed = timed(evaluate_rules, df, RULE_SET, args.mode)
+        print(f'{rows:>11,} rows  {args.mode}  vectorized: {elapsed:8.3f}s')
+        if not args.skip_legacy and args.mode == 'FIRST_MATCHED':
+            legacy, legacy_elapsed = timed(legacy_first_matched, df[f'{MODEL_NAME}_insightscore'].to_numpy())
+            assert result['outcomes'].tolist() == legacy
+            print(f'{rows:>11,} rows  {args.mode}  row-by-row: {legacy_elapsed:8.3f}s  ({legacy_elapsed / elapsed:.1f}x)')
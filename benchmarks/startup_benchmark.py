@@ -0,0 +1,90 @@
+"""
+Benchmark the cold start of the pipeline processing steps: the time of a fresh interpreter running
+scripts/<step>.py --help, and what importing the step module costs and loads.
+
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --steps train_afd activate_afd --runs 10
+
+A step that imports nothing heavy at module level parses its arguments in about the time of a bare
+interpreter start; the heavy column lists the modules that defeat that.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+STEPS = ['create_dataset', 'train_afd', 'activate_afd', 'setup_detector']
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'sagemaker', 'boto3', 's3fs']
+
+#----Run in the probe interpreter: import the step module and report what it cost
+PROBE = """
+import sys, json, time
+sys.path.insert(0, {root!r})
+stime = time.perf_counter()
+import afd_pipeline.steps.{step}
+seconds = time.perf_counter() - stime
+print(json.dumps({{'seconds': seconds, 'modules': len(sys.modules),
+                  'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def time_help(step, runs, env):
+    """ Median wall time of fresh processes running the step script with --help """
+    script = os.path.join(ROOT, 'scripts', f'{step}.py')
+    times = []
+    for _ in range(runs):
+        stime = time.perf_counter()
+        subprocess.run([sys.executable, script, '--help'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       env=env, check=True)
+        times.append(time.perf_counter() - stime)
+    return statistics.median(times)
+
+
+def probe_import(step, env):
+    """ Import time, module count and heavy modules loaded by importing the step module """
+    code = PROBE.format(root=os.path.abspath(ROOT), step=step, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, env=env, check=True)
+    return json.loads(out.stdout.decode('utf-8').strip().splitlines()[-1])
+
+
+def interpreter_start(runs, env):
+    """ Median wall time of a fresh interpreter doing nothing """
+    times = []
+    for _ in range(runs):
+        stime = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], env=env, check=True)
+        times.append(time.perf_counter() - stime)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', nargs='+', default=STEPS, choices=STEPS)
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per step, the median is reported')
+    parser.add_argument('--output', type=str, default=None, help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    baseline = interpreter_start(args.runs, env)
+    print(f'bare interpreter start {baseline:.3f}s')
+    print(f"{'step':<18} {'help_s':>8} {'import_s':>9} {'modules':>8}  heavy")
+    results = []
+    for step in args.steps:
+        help_seconds = time_help(step, args.runs, env)
+        probe = probe_import(step, env)
+        results.append(dict(step=step, help_seconds=help_seconds, import_seconds=probe['seconds'],
+                            modules=probe['modules'], heavy=probe['heavy']))
+        print(f"{step:<18} {help_seconds:>8.3f} {probe['seconds']:>9.3f} {probe['modules']:>8}  "
+              f"{', '.join(probe['heavy']) or '-'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'interpreter_seconds': baseline, 'steps': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,85 +1,487 @@
-from IPython.display import display
-from IPython.display import JSON
-from IPython.core.display import HTML
+import os
+import json
+import zlib
+import base64
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 
+# the feature type rules and the chunked reader are shared with the processing steps
+from afd_pipeline.profiling import classify_features, read_chunks
+
+MODEL_FEATURE_TYPES = ['IP_ADDRESS', 'EMAIL_ADDRESS', 'CATEGORY', 'NUMERIC']
+
+# Display-free result of profiling a dataset. Unpacks like the summary_stats return value
+# with the per-label event counts appended.
+ProfileResult = namedtuple('ProfileResult', ['df_stats', 'trainingDataSchema', 'event_variables', 'event_labels', 'label_counts'])
+
+
 # --- no changes; just run this code block ---
-def summary_stats(df):
-    """ Generate summary statistics for a panda's data frame 
+def summary_stats(df, n_jobs=None):
+    """ Generate summary statistics for a panda's data frame
         Args:
             df (DataFrame): panda's dataframe to create summary statistics for.
+            n_jobs (int): number of worker processes used to profile columns, see profile_dataframe
+        Returns:
+            DataFrame of summary statistics, training data schema, event variables and event lables
+    """
+    result = profile_dataframe(df, n_jobs=n_jobs)
+    _display_summary(result)
+    return result.df_stats, result.trainingDataSchema, result.event_variables, result.event_labels
+
+
+def profile_dataframe(df, n_jobs=None):
+    """ Profile a panda's data frame without rendering anything.
+        Every column is hashed once with pd.factorize, which yields its non-null count and
+        number of unique values, and for EVENT_LABEL also the label counts and first-seen order.
+        Args:
+            df (DataFrame): panda's dataframe to create summary statistics for.
+            n_jobs (int): number of worker processes; None or 1 profiles the columns serially,
+                          -1 uses all cores. Columns are profiled independently, so the result
+                          is identical to the serial one.
+        Returns:
+            ProfileResult
+    """
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    columns = list(df.columns)
+    if n_jobs is None or n_jobs <= 1 or len(columns) <= 1:
+        profiles = [_profile_column(col, df[col]) for col in columns]
+    else:
+        profiles = _profile_columns_parallel(df, columns, n_jobs)
+
+    label_counts = pd.Series([], dtype='int64')
+    if 'EVENT_LABEL' in columns:
+        label_counts = profiles[columns.index('EVENT_LABEL')][3]
+    return _build_result(columns,
+                         [p[0] for p in profiles],
+                         [p[1] for p in profiles],
+                         [p[2] for p in profiles],
+                         len(df), label_counts)
+
+
+def _profile_column(col, s):
+    """ dtype, non-null count, nunique and (for EVENT_LABEL) label counts of a single column """
+    if col == 'EVENT_LABEL':
+        s = s.astype('str', errors='ignore')
+    codes, uniques = pd.factorize(s)
+    valid = codes[codes >= 0]
+    label_counts = None
+    if col == 'EVENT_LABEL':
+        label_counts = pd.Series(np.bincount(valid, minlength=len(uniques)), index=uniques, dtype='int64')
+    return s.dtype, len(valid), len(uniques), label_counts
+
+
+# Frame being profiled by the parallel path. Forked workers inherit it, so only column names
+# and the per-column aggregates cross the process boundary.
+_SHARED_FRAME = None
+
+
+def _profile_shared_column(col):
+    return _profile_column(col, _SHARED_FRAME[col])
+
+
+def _profile_columns_parallel(df, columns, n_jobs):
+    """ Profile each column as a separate task on a process pool of n_jobs workers """
+    global _SHARED_FRAME
+    if 'fork' in multiprocessing.get_all_start_methods():
+        _SHARED_FRAME = df
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context('fork')) as pool:
+                return list(pool.map(_profile_shared_column, columns))
+        finally:
+            _SHARED_FRAME = None
+    # without fork (Windows, macOS spawn) every column is pickled to its worker
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        return list(pool.map(_profile_column, columns, [df[col] for col in columns]))
+
+
+def _build_result(names, dtypes, counts, nuniques, rowcnt, label_counts):
+    """ Assemble the summary statistics frame, training data schema and label lists from per-column aggregates
+        Args:
+            names (list): feature names in column order
+            dtypes (list): dtype of each feature
+            counts (list): number of non-null values of each feature
+            nuniques (list): number of distinct non-null values of each feature
+            rowcnt (int): number of rows in the dataset
+            label_counts (Series): count of events per EVENT_LABEL value, in first-seen order
         Returns:
-            DataFrame of summary statistics, training data schema, event variables and event lables 
+            ProfileResult
     """
-    df = df.copy()
-    rowcnt = len(df)
-    df['EVENT_LABEL'] = df['EVENT_LABEL'].astype('str', errors='ignore')
-    df_s1  = df.agg(['count', 'nunique']).transpose().reset_index().rename(columns={"index":"feature_name"})
-    df_s1["null"] = (rowcnt - df_s1["count"]).astype('int64')
-    df_s1["not_null"] = rowcnt - df_s1["null"]
-    df_s1["null_pct"] = df_s1["null"] / rowcnt
-    df_s1["nunique_pct"] = df_s1['nunique']/ rowcnt
-    dt = pd.DataFrame(df.dtypes).reset_index().rename(columns={"index":"feature_name", 0:"dtype"})
-    df_stats = pd.merge(dt, df_s1, on='feature_name', how='inner').round(4)
-    df_stats['nunique'] = df_stats['nunique'].astype('int64')
-    df_stats['count'] = df_stats['count'].astype('int64')
-    
-    # -- variable type mapper --  
-    df_stats['feature_type'] = "UNKOWN"
-    df_stats.loc[df_stats["dtype"] == object, 'feature_type'] = "CATEGORY"
-    df_stats.loc[(df_stats["dtype"] == "int64") | (df_stats["dtype"] == "float64"), 'feature_type'] = "NUMERIC"
-    df_stats.loc[df_stats["feature_name"].str.contains("ipaddress|ip_address|ipaddr"), 'feature_type'] = "IP_ADDRESS"
-    df_stats.loc[df_stats["feature_name"].str.contains("email|email_address|emailaddr"), 'feature_type'] = "EMAIL_ADDRESS"
-    df_stats.loc[df_stats["feature_name"] == "EVENT_LABEL", 'feature_type'] = "TARGET"
-    df_stats.loc[df_stats["feature_name"] == "EVENT_TIMESTAMP", 'feature_type'] = "EVENT_TIMESTAMP"
-    
-    # -- variable warnings -- 
-    df_stats['feature_warning'] = "NO WARNING"
-    df_stats.loc[(df_stats["nunique"] != 2) & (df_stats["feature_name"] == "EVENT_LABEL"),'feature_warning' ] = "LABEL WARNING, NON-BINARY EVENT LABEL"
-    df_stats.loc[(df_stats["nunique_pct"] > 0.9) & (df_stats['feature_type'] == "CATEGORY") ,'feature_warning' ] = "EXCLUDE, GT 90% UNIQUE"
-    df_stats.loc[(df_stats["null_pct"] > 0.2) & (df_stats["null_pct"] <= 0.5), 'feature_warning' ] = "NULL WARNING, GT 20% MISSING"
-    df_stats.loc[df_stats["null_pct"] > 0.5,'feature_warning' ] = "EXCLUDE, GT 50% MISSING"
-    df_stats.loc[((df_stats['dtype'] == "int64" ) | (df_stats['dtype'] == "float64" ) ) & (df_stats['nunique'] < 0.2), 'feature_warning' ] = "LIKELY CATEGORICAL, NUMERIC w. LOW CARDINALITY"
-   
-    # -- target check -- 
-    exclude_fields  = df_stats.loc[(df_stats['feature_warning'] != 'NO WARNING')]['feature_name'].to_list()
-    event_variables = df_stats.loc[(~df_stats['feature_name'].isin(['EVENT_LABEL', 'EVENT_TIMESTAMP']))]['feature_name'].to_list()
-    event_labels    = df["EVENT_LABEL"].unique().tolist()
-    
+    count = np.asarray(counts, dtype='int64')
+    nunique = np.asarray(nuniques, dtype='int64')
+    null = rowcnt - count
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df_stats = pd.DataFrame({
+            'feature_name': names,
+            'dtype'       : dtypes,
+            'count'       : count,
+            'nunique'     : nunique,
+            'null'        : null,
+            'not_null'    : rowcnt - null,
+            'null_pct'    : np.round(null / rowcnt, 4),
+            'nunique_pct' : np.round(nunique / rowcnt, 4)
+        })
+    df_stats = classify_features(df_stats)
+
+    is_model_var = df_stats['feature_type'].isin(MODEL_FEATURE_TYPES).to_numpy()
+    is_meta = df_stats['feature_name'].isin(['EVENT_LABEL', 'EVENT_TIMESTAMP']).to_numpy()
+    event_variables = [n for n, meta in zip(names, is_meta) if not meta]
+
     trainingDataSchema = {
-        'modelVariables' : df_stats.loc[(df_stats['feature_type'].isin(['IP_ADDRESS', 'EMAIL_ADDRESS', 'CATEGORY', 'NUMERIC' ]))]['feature_name'].to_list(),
+        'modelVariables' : [n for n, model_var in zip(names, is_model_var) if model_var],
         'labelSchema'    : {
-            'labelMapper' : {
-                'FRAUD' : [df["EVENT_LABEL"].value_counts().idxmin()],
-                'LEGIT' : [df["EVENT_LABEL"].value_counts().idxmax()]
-            }
+            'labelMapper' : _label_mapper(label_counts)
         }
     }
-    
-    
-    model_variables = df_stats.loc[(df_stats['feature_type'].isin(['IP_ADDRESS', 'EMAIL_ADDRESS', 'CATEGORY', 'NUMERIC' ]))]['feature_name'].to_list()
-   
-    
-    # -- label schema -- 
-    label_map = {
-        'FRAUD' : [df["EVENT_LABEL"].value_counts().idxmin()],
-        'LEGIT' : [df["EVENT_LABEL"].value_counts().idxmax()]
+    return ProfileResult(df_stats, trainingDataSchema, event_variables, label_counts.index.tolist(), label_counts)
+
+
+def _label_mapper(label_counts):
+    """ Map the least frequent label to FRAUD and the most frequent label to LEGIT
+        Args:
+            label_counts (Series): count of events indexed by EVENT_LABEL value
+        Returns:
+            labelMapper dictionary for the training data schema
+    """
+    label_counts = label_counts.sort_values(ascending=False, kind='mergesort')
+    return {
+        'FRAUD' : [label_counts.idxmin()],
+        'LEGIT' : [label_counts.idxmax()]
     }
-    
-    
+
+
+def _display_summary(result):
+    """ Render a ProfileResult in the notebook """
+    from IPython.display import display
+    from IPython.display import JSON
+    from IPython.core.display import HTML
+
     display(HTML("<h4>Summary Stats </h4>"))
-    display(df_stats)
-    
+    display(result.df_stats)
+
     display(HTML("<h4>Event Variables </h4>"))
     display(HTML("<p>These are the available features in the data set for the AFD model training</p>"))
-    display(JSON(event_variables))
-    
+    display(JSON(result.event_variables))
+
     display(HTML("<h4>Event Labels </h4>"))
     display(HTML("<p>We have two types of events - Fraud events and legitimate events </p>"))
-    display(JSON(event_labels))
-    
+    display(JSON(result.event_labels))
+
     display(HTML("<h4>Training Data Schema </h4>"))
     display(HTML("<p>Training data schema is required for creating and training the model. Refer to <a href='https://docs.aws.amazon.com/frauddetector/latest/api/API_CreateModelVersion.html#FraudDetector-CreateModelVersion-request-trainingDataSchema'>documentation</a> </p>"))
-    display(JSON(trainingDataSchema))
+    display(JSON(result.trainingDataSchema))
+
+
+#------Out-of-core profiling----------------------------------------------------
+class HyperLogLog(object):
+    """ Mergeable cardinality sketch over 64 bit value hashes
+        Args:
+            p (int): number of index bits, 11 to 18, the sketch keeps 2**p one byte registers.
+                     The relative error of the estimate is about 1.04 / sqrt(2**p)
+            registers (ndarray): optional register state to start from
+    """
+    def __init__(self, p=14, registers=None):
+        # below 11 the 64 - p hash bits past the index no longer fit a float64 mantissa, see add_hashes
+        if not 11 <= p <= 18:
+            raise ValueError(f'HyperLogLog precision must be between 11 and 18, got {p}')
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8) if registers is None else registers
+
+    def add_hashes(self, hashes):
+        if len(hashes) == 0:
+            return
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        idx = (hashes >> np.uint64(64 - self.p)).astype(np.intp)
+        # the remaining 64 - p bits fit in the 53 bit float64 mantissa (p >= 11), so frexp gives an exact bit length
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - np.frexp(rest.astype(np.float64))[1] + 1
+        np.maximum.at(self.registers, idx, rank.astype(np.uint8))
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError(f'Cannot merge HyperLogLog sketches with p={self.p} and p={other.p}')
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        # small range correction: linear counting over the empty registers, still an estimate
+        if estimate <= 2.5 * self.m and zeros > 0:
+            estimate = self.m * np.log(self.m / zeros)
+        return int(round(estimate))
 
-    return df_stats, trainingDataSchema, event_variables, event_labels
\ No newline at end of file
+
+def _column_values(s):
+    """ Non-null values of a column in a form that compares equal across chunks """
+    s = s.dropna()
+    if pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype):
+        return s.to_numpy(dtype='float64')
+    return s.to_numpy(dtype=object)
+
+
+def _merge_dtype(current, new):
+    """ Resolve the dtype of a column read in chunks the way a single read would """
+    if current is None or current == new:
+        return new
+    if isinstance(current, pd.CategoricalDtype) and isinstance(new, pd.CategoricalDtype):
+        # chunks of a typed Parquet file carry their own categories
+        return pd.CategoricalDtype()
+    if isinstance(current, np.dtype) and isinstance(new, np.dtype) and current.kind in 'iuf' and new.kind in 'iuf':
+        return np.promote_types(current, new)
+    return np.dtype(object)
+
+
+class ProfileAccumulator(object):
+    """ Incrementally builds the summary statistics of a dataset one chunk at a time
+        Args:
+            cardinality (str): 'exact' keeps the distinct values of every column,
+                               'hll' keeps a fixed size HyperLogLog sketch per column
+            hll_p (int): HyperLogLog precision used when cardinality is 'hll'
+    """
+    def __init__(self, cardinality='exact', hll_p=14):
+        if cardinality not in ('exact', 'hll'):
+            raise ValueError(f"cardinality must be 'exact' or 'hll', got {cardinality}")
+        self.cardinality = cardinality
+        self.hll_p = hll_p
+        self.rows = 0
+        self.columns = []
+        self.dtypes = {}
+        self.counts = {}
+        self.distinct = {}
+        self.label_counts = {}
+
+    def _new_distinct(self):
+        return set() if self.cardinality == 'exact' else HyperLogLog(self.hll_p)
+
+    def update(self, chunk):
+        chunk = chunk.copy(deep=False)
+        chunk['EVENT_LABEL'] = chunk['EVENT_LABEL'].astype('str', errors='ignore')
+        self.rows += len(chunk)
+        for col in chunk.columns:
+            s = chunk[col]
+            if col not in self.dtypes:
+                self.columns.append(col)
+                self.dtypes[col] = None
+                self.counts[col] = 0
+                self.distinct[col] = self._new_distinct()
+            self.dtypes[col] = _merge_dtype(self.dtypes[col], s.dtype)
+            values = _column_values(s)
+            self.counts[col] += len(values)
+            if self.cardinality == 'exact':
+                self.distinct[col].update(pd.unique(values))
+            else:
+                self.distinct[col].add_hashes(pd.util.hash_array(values))
+        for label, cnt in chunk['EVENT_LABEL'].value_counts(sort=False).items():
+            self.label_counts[label] = self.label_counts.get(label, 0) + int(cnt)
+        return self
+
+    def merge(self, other):
+        if other.cardinality != self.cardinality:
+            raise ValueError('Cannot merge profiles built with different cardinality modes')
+        self.rows += other.rows
+        for col in other.columns:
+            if col not in self.dtypes:
+                self.columns.append(col)
+                self.dtypes[col] = None
+                self.counts[col] = 0
+                self.distinct[col] = self._new_distinct()
+            self.dtypes[col] = _merge_dtype(self.dtypes[col], other.dtypes[col])
+            self.counts[col] += other.counts[col]
+            if self.cardinality == 'exact':
+                self.distinct[col].update(other.distinct[col])
+            else:
+                self.distinct[col].merge(other.distinct[col])
+        for label, cnt in other.label_counts.items():
+            self.label_counts[label] = self.label_counts.get(label, 0) + cnt
+        return self
+
+    def to_dict(self):
+        """ JSON serializable state of a HyperLogLog profile, see from_dict """
+        if self.cardinality != 'hll':
+            raise ValueError("Only profiles built with cardinality='hll' can be persisted")
+        return {
+            'hll_p'       : self.hll_p,
+            'rows'        : self.rows,
+            'columns'     : [
+                {
+                    'name'     : col,
+                    'dtype'    : str(self.dtypes[col]),
+                    'count'    : self.counts[col],
+                    'registers': base64.b64encode(zlib.compress(self.distinct[col].registers.tobytes())).decode('ascii')
+                } for col in self.columns
+            ],
+            'label_counts': [[label, cnt] for label, cnt in self.label_counts.items()]
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        acc = cls(cardinality='hll', hll_p=state['hll_p'])
+        acc.rows = state['rows']
+        for col in state['columns']:
+            name = col['name']
+            registers = np.frombuffer(zlib.decompress(base64.b64decode(col['registers'])), dtype=np.uint8).copy()
+            acc.columns.append(name)
+            acc.dtypes[name] = pd.api.types.pandas_dtype(col['dtype'])
+            acc.counts[name] = col['count']
+            acc.distinct[name] = HyperLogLog(acc.hll_p, registers)
+        acc.label_counts = {label: cnt for label, cnt in state['label_counts']}
+        return acc
+
+    def summarize(self):
+        """ Build the summary statistics from the accumulated state
+            Returns:
+                ProfileResult
+        """
+        cols = self.columns
+        if self.cardinality == 'exact':
+            nuniques = [len(self.distinct[c]) for c in cols]
+        else:
+            nuniques = [self.distinct[c].count() for c in cols]
+        return _build_result(cols, [self.dtypes[c] for c in cols], [self.counts[c] for c in cols],
+                             nuniques, self.rows, pd.Series(self.label_counts, dtype='int64'))
+
+
+def profile_file(path, chunksize=500000, cardinality='exact', file_format=None, **read_kwargs):
+    """ Profile a CSV or Parquet dataset without loading it into memory or rendering anything.
+        The file is read once, chunksize rows at a time, so peak memory is bounded by the chunk size
+        (plus the distinct values per column when cardinality is 'exact').
+        Args:
+            path (str): local path or s3:// uri of the dataset
+            chunksize (int): number of rows read per chunk
+            cardinality (str): 'exact' for exact nunique or 'hll' for a HyperLogLog estimate
+                               that uses a fixed 16KB per column regardless of the data size
+            file_format (str): 'csv' or 'parquet', inferred from the file extension when omitted
+            read_kwargs: additional keyword arguments passed to pd.read_csv
+        Returns:
+            ProfileResult
+    """
+    acc = ProfileAccumulator(cardinality=cardinality)
+    for chunk in read_chunks(path, chunksize=chunksize, file_format=file_format, **read_kwargs):
+        acc.update(chunk)
+    return acc.summarize()
+
+
+def summary_stats_stream(path, chunksize=500000, cardinality='exact', file_format=None, **read_kwargs):
+    """ Generate summary statistics for a CSV or Parquet dataset without loading it into memory.
+        Takes the same arguments as profile_file.
+        Returns:
+            DataFrame of summary statistics, training data schema, event variables and event lables
+    """
+    result = profile_file(path, chunksize=chunksize, cardinality=cardinality, file_format=file_format, **read_kwargs)
+    _display_summary(result)
+    return result.df_stats, result.trainingDataSchema, result.event_variables, result.event_labels
+
+
+#------Incremental profiling----------------------------------------------------
+def _list_partitions(path):
+    """ Data files under a local directory or S3 prefix, with a fingerprint that changes when a file is rewritten """
+    if '://' in str(path):
+        import fsspec
+        fs, root = fsspec.core.url_to_fs(path)
+        protocol = path.split('://')[0]
+        infos = fs.find(root, detail=True).values() if fs.isdir(root) else [fs.info(root)]
+        return {
+            f"{protocol}://{info['name']}": f"{info.get('ETag', info.get('LastModified', ''))}-{info['size']}"
+            for info in infos if info['size'] > 0 and not info['name'].rsplit('/', 1)[-1].startswith(('.', '_'))
+        }
+    if os.path.isfile(path):
+        paths = [path]
+    else:
+        paths = sorted(os.path.join(d, f) for d, _, files in os.walk(path) for f in files if not f.startswith(('.', '_')))
+    partitions = {}
+    for p in paths:
+        st = os.stat(p)
+        partitions[p] = f'{st.st_mtime_ns}-{st.st_size}'
+    return partitions
+
+
+def _location(path):
+    """ Comparable form of a local path or uri """
+    return str(path) if '://' in str(path) else os.path.abspath(path)
+
+
+def _load_profile_cache(cache_path):
+    if '://' in str(cache_path):
+        import fsspec
+        fs, root = fsspec.core.url_to_fs(cache_path)
+        if not fs.exists(root):
+            return {}
+        with fs.open(root, 'r') as f:
+            return json.load(f).get('partitions', {})
+    if not os.path.exists(cache_path):
+        return {}
+    with open(cache_path) as f:
+        return json.load(f).get('partitions', {})
+
+
+def _save_profile_cache(cache_path, partitions):
+    cache = {'version': 1, 'partitions': partitions}
+    if '://' in str(cache_path):
+        import fsspec
+        with fsspec.open(cache_path, 'w') as f:
+            json.dump(cache, f)
+        return
+    tmp_path = f'{cache_path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, cache_path)
+
+
+def profile_incremental(path, cache_path, chunksize=500000, file_format=None, hll_p=14, **read_kwargs):
+    """ Profile a partitioned dataset, scanning only the partitions that are new or changed since the last run.
+        A HyperLogLog profile of every partition is persisted in cache_path keyed by the partition's
+        fingerprint (size and modification time locally, ETag and size on S3). Cached profiles of
+        unchanged partitions are merged with freshly scanned ones, partitions that disappeared are
+        dropped, and feature types and warnings are re-derived from the merged state.
+        Args:
+            path (str): data file, local directory or s3:// prefix holding the partitions
+            cache_path (str): local path or s3:// uri of the JSON profile cache, it may be inside path
+            chunksize (int): number of rows read per chunk when scanning a partition
+            file_format (str): 'csv' or 'parquet', inferred from each file's extension when omitted
+            hll_p (int): HyperLogLog precision; changing it invalidates the cached partitions
+            read_kwargs: additional keyword arguments passed to pd.read_csv
+        Returns:
+            ProfileResult
+    """
+    # the cache file (and its temporary copy) may sit inside the data directory, it is not a partition
+    excluded = {_location(cache_path), _location(f'{cache_path}.tmp')}
+    partitions = {p: f for p, f in _list_partitions(path).items() if _location(p) not in excluded}
+    if not partitions:
+        raise ValueError(f'No data files found under {path}')
+    cached = _load_profile_cache(cache_path)
+
+    merged = ProfileAccumulator(cardinality='hll', hll_p=hll_p)
+    updated = {}
+    scanned = 0
+    for part in sorted(partitions):
+        entry = cached.get(part)
+        if entry and entry['fingerprint'] == partitions[part] and entry['profile']['hll_p'] == hll_p:
+            acc = ProfileAccumulator.from_dict(entry['profile'])
+        else:
+            acc = ProfileAccumulator(cardinality='hll', hll_p=hll_p)
+            for chunk in read_chunks(part, chunksize=chunksize, file_format=file_format, **read_kwargs):
+                acc.update(chunk)
+            scanned += 1
+        updated[part] = {'fingerprint': partitions[part], 'profile': acc.to_dict()}
+        merged.merge(acc)
+
+    _save_profile_cache(cache_path, updated)
+    print(f'Profiled {scanned} new or changed partition(s), reused {len(partitions) - scanned} from {cache_path}')
+    return merged.summarize()
+
+
+def summary_stats_incremental(path, cache_path, chunksize=500000, file_format=None, hll_p=14, **read_kwargs):
+    """ Generate summary statistics for a partitioned dataset, re-profiling only new or changed partitions.
+        Takes the same arguments as profile_incremental.
+        Returns:
+            DataFrame of summary statistics, training data schema, event variables and event lables
+    """
+    result = profile_incremental(path, cache_path, chunksize=chunksize, file_format=file_format, hll_p=hll_p, **read_kwargs)
+    _display_summary(result)
+    return result.df_stats, result.trainingDataSchema, result.event_variables, result.event_labels
@@ -0,0 +1,35 @@
+import os
+import sys
+import argparse
+import pathlib
+
+# afd_pipeline is installed in the container image; locally it is imported from the repository root
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from afd_pipeline.metrics import load_step_metrics, aggregate
+from afd_pipeline.state import save_json
+
+# Parse argument variables passed via the command line
+parser = argparse.ArgumentParser(description='Merge the step metrics files of a pipeline run into one breakdown')
+parser.add_argument('--input', type=str, required=True,
+                    help='directory or S3 prefix holding the <step>.json metrics files of one run')
+parser.add_argument('--output', type=str, default=None, help='JSON file (S3 or local) the run breakdown is written to')
+args = parser.parse_args()
+
+try:
+    documents = load_step_metrics(args.input)
+    if not documents:
+        raise FileNotFoundError(f'No step metrics under {args.input}')
+    run = aggregate(documents)
+
+    print(f"{'step':<20}{'status':<12}{'elapsed_s':>12}{'share':>8}{'startup_s':>11}{'api_calls':>11}{'api_s':>10}{'peak_rss_mb':>13}")
+    for step in run['steps']:
+        print(f"{step['step']:<20}{step['status']:<12}{step['elapsed_s']:>12}{step['share']:>8.1%}{step['startup_s'] or 0:>11}"
+              f"{step['api_calls']:>11}{step['api_s']:>10}{step['peak_rss_mb'] or 0:>13}")
+    print(f"Total {run['elapsed_s']}s, {run['bytes_read']} bytes read, {run['bytes_written']} bytes written, "
+          f"peak RSS {run['peak_rss_mb']} MB")
+    if args.output:
+        save_json(args.output, run)
+
+except Exception as e:
+    print(e)
+    os._exit(1)
@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+import argparse
+import pathlib
+
+# afd_pipeline is installed in the container image; locally it is imported from the repository root
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from afd_pipeline.ingestion import FeatureIngestor, RuntimeClientFactory
+
+# Parse argument variables passed via the processing step or the command line
+parser = argparse.ArgumentParser(description='Ingest CSV or Parquet files into a feature group with PutRecord')
+parser.add_argument('--region', type=str)
+parser.add_argument('--feature-group-name', type=str, required=True)
+parser.add_argument('--input', type=str, required=True, help='file, directory or S3 prefix of CSV/Parquet files')
+parser.add_argument('--checkpoint-uri', type=str, default=None, help='JSON checkpoint (S3 or local) to resume from')
+parser.add_argument('--processes', type=int, default=os.cpu_count())
+parser.add_argument('--threads', type=int, default=16, help='maximum concurrent PutRecord calls per process')
+parser.add_argument('--batch-size', type=int, default=1000)
+parser.add_argument('--max-retries', type=int, default=8)
+parser.add_argument('--event-time-feature-name', type=str, default='EventTime')
+parser.add_argument('--index-col', type=int, default=None, help='CSV column holding the row index, e.g. 0 for Data Wrangler output')
+parser.add_argument('--metrics-output', type=str, default=None, help='JSON file the ingestion report is written to')
+parser.add_argument('--stub', action='store_true', help='ingest into a local stub client instead of AWS')
+args = parser.parse_args()
+
+try:
+    if args.stub:
+        from benchmarks.fake_aws import StubClientFactory
+        client_factory = StubClientFactory('sagemaker-featurestore-runtime')
+    else:
+        client_factory = RuntimeClientFactory(args.region, max_pool_connections=args.threads)
+
+    ingestor = FeatureIngestor(args.feature_group_name, client_factory,
+                               processes=args.processes,
+                               threads=args.threads,
+                               checkpoint_uri=args.checkpoint_uri,
+                               batch_size=args.batch_size,
+                               event_time_feature_name=args.event_time_feature_name,
+                               max_retries=args.max_retries)
+    read_kwargs = {'index_col': args.index_col} if args.index_col is not None else {}
+    report = ingestor.ingest_path(args.input, **read_kwargs)
+
+    print(json.dumps(report, indent=2))
+    if args.metrics_output:
+        with open(args.metrics_output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if report['failed_batches']:
+        print(f"{len(report['failed_batches'])} batches failed, rerun with the same checkpoint to retry them")
+        os._exit(1)
+
+except Exception as e:
+    print(e)
+    os._exit(1)
@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import argparse
+import pathlib
+
+# afd_pipeline is installed in the container image; locally it is imported from the repository root
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from afd_pipeline.drift import build_baseline, DriftMonitor, WINDOW_BATCHES
+from afd_pipeline.memo import data_digest
+from afd_pipeline.profiling import read_chunks
+from afd_pipeline.state import load_json, save_json
+
+# Parse argument variables passed via the processing step or the command line
+parser = argparse.ArgumentParser(description='Build the drift baseline of the training data, or report the drift of live events against it')
+parser.add_argument('--baseline', type=str, required=True, help='JSON baseline document, S3 or local')
+parser.add_argument('--training-data', type=str, default=None, help='CSV or Parquet training data to build the baseline from')
+parser.add_argument('--input', type=str, default=None, help='CSV or Parquet file of live events to check for drift')
+parser.add_argument('--state-uri', type=str, default=None,
+                    help='JSON document (S3 or local) the monitor counters of the latest batches are kept in across runs')
+parser.add_argument('--batch-id', type=str, default=None,
+                    help='id of the input batch in the state, a digest of the input by default, so a rerun replaces its counters')
+parser.add_argument('--window', type=int, default=WINDOW_BATCHES, help='latest batches the drift is reported over')
+parser.add_argument('--output', type=str, default='/opt/ml/processing/drift/drift_report.json')
+parser.add_argument('--psi-threshold', type=float, default=0.2)
+parser.add_argument('--ks-threshold', type=float, default=0.1)
+parser.add_argument('--null-threshold', type=float, default=0.1)
+parser.add_argument('--min-rows', type=int, default=1000)
+parser.add_argument('--bins', type=int, default=20)
+parser.add_argument('--top-categories', type=int, default=50)
+parser.add_argument('--chunk-size', type=int, default=500000)
+args = parser.parse_args()
+
+try:
+    if args.training_data:
+        #----build the baseline from the training data, in one pass
+        baseline = build_baseline(read_chunks(args.training_data, chunksize=args.chunk_size),
+                                  bins=args.bins, top_categories=args.top_categories)
+        save_json(args.baseline, baseline)
+        print(f"Baseline of {len(baseline['features'])} features over {baseline['rows']} rows written to {args.baseline}")
+
+    if args.input:
+        #----count the live events into the baseline bins and report the drift
+        baseline = load_json(args.baseline)
+        if baseline is None:
+            raise FileNotFoundError(f'No drift baseline at {args.baseline}, build it with --training-data')
+        state = load_json(args.state_uri) if args.state_uri else None
+        batch_id = args.batch_id
+        if batch_id is None and args.state_uri:
+            #----the same input counted again replaces its counters rather than adding to them
+            batch_id = data_digest(args.input)[0]
+        monitor = DriftMonitor(baseline, state, batch=batch_id or 'latest', window=args.window)
+        for chunk in read_chunks(args.input, chunksize=args.chunk_size):
+            monitor.update(chunk)
+        if args.state_uri:
+            save_json(args.state_uri, monitor.to_dict())
+
+        report = monitor.report(psi_threshold=args.psi_threshold, ks_threshold=args.ks_threshold,
+                                null_threshold=args.null_threshold, min_rows=args.min_rows)
+        print(json.dumps({k: v for k, v in report.items() if k not in ('features', 'batch')}, indent=2))
+        print(f"Batch {report['batch']['id']}:")
+        print(json.dumps({k: v for k, v in report['batch'].items() if k not in ('features', 'id')}, indent=2))
+        #----the pipeline gates on max_psi or drift_detected of this file, like it does on train_auc.json
+        output = pathlib.Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w') as outfile:
+            json.dump(report, outfile, indent=2)
+
+except Exception as e:
+    print(e)
+    os._exit(1)
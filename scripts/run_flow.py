@@ -0,0 +1,64 @@
+import os
+import sys
+import json
+import argparse
+import pathlib
+
+# afd_pipeline is installed in the container image; locally it is imported from the repository root
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from afd_pipeline.flow import FlowExecutor
+
+# Parse argument variables passed via the processing step or the command line
+parser = argparse.ArgumentParser(description='Run a Data Wrangler .flow file locally, chunk by chunk')
+parser.add_argument('--region', type=str)
+parser.add_argument('--flow', type=str, required=True, help='.flow file, local or s3://')
+parser.add_argument('--source', type=str, action='append', default=[],
+                    help='name=uri, reads the source dataset called name from uri instead of its s3Uri in the flow')
+parser.add_argument('--output-node', type=str, default=None, help='node id (or output name) to produce, the last node by default')
+parser.add_argument('--output', type=str, default=None, help='CSV or Parquet file the output is written to')
+parser.add_argument('--output-format', type=str, default='csv', choices=['csv', 'parquet'])
+parser.add_argument('--feature-group-name', type=str, default=None, help='ingest the output into this feature group')
+parser.add_argument('--checkpoint-uri', type=str, default=None, help='ingestion checkpoint (S3 or local) to resume from')
+parser.add_argument('--processes', type=int, default=os.cpu_count())
+parser.add_argument('--threads', type=int, default=16)
+parser.add_argument('--chunk-size', type=int, default=100000)
+parser.add_argument('--no-optimize', action='store_true', help='run every node as its own pass, without the plan optimizer')
+args = parser.parse_args()
+
+try:
+    sources = dict(s.split('=', 1) for s in args.source)
+    executor = FlowExecutor(args.flow, sources=sources, chunksize=args.chunk_size, output_node=args.output_node,
+                            optimize=not args.no_optimize)
+    print('Flow nodes: ' + ' -> '.join(op.describe() for op in executor.operators))
+    if executor.optimize:
+        print('Flow plan:\n' + executor.compile().explain())
+
+    if args.output is None and args.feature_group_name is None:
+        raise ValueError('nothing to do, pass --output and/or --feature-group-name')
+
+    if args.feature_group_name is None:
+        executor.run(args.output, args.output_format)
+    else:
+        from afd_pipeline.ingestion import FeatureIngestor, RuntimeClientFactory
+
+        def batches():
+            # the file output, when requested, is written from the same pass as the ingestion
+            chunks = executor.tee(args.output, args.output_format) if args.output else executor.iter_chunks()
+            for i, chunk in enumerate(chunks):
+                yield f'{os.path.basename(args.flow)}#{i}', chunk
+
+        ingestor = FeatureIngestor(args.feature_group_name, RuntimeClientFactory(args.region, max_pool_connections=args.threads),
+                                   processes=args.processes, threads=args.threads,
+                                   checkpoint_uri=args.checkpoint_uri, batch_size=args.chunk_size,
+                                   event_time_feature_name=None)
+        report = ingestor.ingest(batches())
+        print(json.dumps(report, indent=2))
+        if report['failed_batches']:
+            os._exit(1)
+
+    if executor.optimize:
+        print(executor.plan.timings().to_string(index=False))
+
+except Exception as e:
+    print(e)
+    os._exit(1)
@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import argparse
+import pathlib
+from collections import deque
+import pandas as pd
+
+# afd_pipeline is installed in the container image; locally it is imported from the repository root
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from afd_pipeline.scoring import EventScorer, make_client, frame_to_events, OUTPUT_COLUMNS
+from afd_pipeline.prediction_cache import PredictionCache
+from afd_pipeline.profiling import read_chunks
+
+# Parse argument variables passed via the processing step or the command line
+parser = argparse.ArgumentParser(description='Score a CSV or Parquet file of events with GetEventPrediction')
+parser.add_argument('--region', type=str)
+parser.add_argument('--input', type=str, required=True, help='CSV or Parquet file, local or s3://')
+parser.add_argument('--output', type=str, required=True, help='CSV file the input rows are written to, with their scores')
+parser.add_argument('--detector-name', type=str, required=True)
+parser.add_argument('--detector-version', type=str, default='1')
+parser.add_argument('--event-type', type=str, required=True)
+parser.add_argument('--entity-type', type=str, required=True)
+parser.add_argument('--model-name', type=str, default=None)
+parser.add_argument('--event-variables', type=str, default=None,
+                    help='comma separated columns sent as eventVariables, defaults to every non-reserved column')
+parser.add_argument('--event-id-column', type=str, default=None)
+parser.add_argument('--entity-id-column', type=str, default=None)
+parser.add_argument('--timestamp-column', type=str, default=None)
+parser.add_argument('--tps', type=float, default=None, help='GetEventPrediction TPS quota of the account')
+parser.add_argument('--workers', type=int, default=16)
+parser.add_argument('--max-retries', type=int, default=5)
+parser.add_argument('--chunk-size', type=int, default=10000)
+parser.add_argument('--cache-ttl', type=float, default=0,
+                    help='seconds a prediction is reused for identical events, 0 scores every event')
+parser.add_argument('--cache-max-mb', type=float, default=64, help='memory bound of the prediction cache')
+parser.add_argument('--cache-include-entity', action='store_true',
+                    help='only reuse predictions of the same entity, for models using the entity history')
+parser.add_argument('--metrics-output', type=str, default=None, help='JSON file the throughput and latency report is written to')
+parser.add_argument('--stub', action='store_true', help='score against the local stub client instead of AWS')
+args = parser.parse_args()
+
+#columns of the training data that are not event variables
+RESERVED_COLUMNS = ['EVENT_LABEL', 'EVENT_TIMESTAMP', 'LABEL_TIMESTAMP', 'EVENT_ID', 'ENTITY_ID', 'ENTITY_TYPE']
+
+
+def score_file(scorer):
+    """ Stream the input through the scorer and append every chunk, with its scores, to the output file.
+        Chunks are queued as they are read so results, which come back in input order, can be
+        matched to their rows while the next chunk is already being scored.
+    """
+    chunks = deque()
+
+    def events():
+        for chunk in read_chunks(args.input, chunksize=args.chunk_size, dtype=str):
+            if len(chunk) == 0:
+                continue
+            chunks.append(chunk)
+            event_variables = args.event_variables.split(',') if args.event_variables else \
+                [c for c in chunk.columns if c not in RESERVED_COLUMNS]
+            yield from frame_to_events(chunk, event_variables, args.event_id_column,
+                                       args.entity_id_column, args.timestamp_column)
+
+    header = True
+    results = []
+    for result in scorer.score_events(events()):
+        results.append(result)
+        if len(results) == len(chunks[0]):
+            chunk = chunks.popleft().reset_index(drop=True)
+            out = pd.concat([chunk, pd.DataFrame(results, columns=OUTPUT_COLUMNS)], axis=1)
+            out.to_csv(args.output, mode='w' if header else 'a', header=header, index=False)
+            header = False
+            results = []
+
+
+try:
+    if args.stub:
+        from benchmarks.fake_aws import StubFraudDetectorClient
+        client = StubFraudDetectorClient(model_name=args.model_name or 'stub_model', tps=args.tps)
+    else:
+        client = make_client(args.region, max_pool_connections=args.workers)
+
+    cache = None
+    if args.cache_ttl > 0:
+        cache = PredictionCache(ttl=args.cache_ttl, max_bytes=int(args.cache_max_mb * 1024 * 1024),
+                                include_entity=args.cache_include_entity)
+
+    scorer = EventScorer(client, args.detector_name, args.detector_version, args.event_type, args.entity_type,
+                         model_name=args.model_name, tps=args.tps, workers=args.workers, max_retries=args.max_retries,
+                         cache=cache)
+    score_file(scorer)
+
+    report = scorer.stats.report()
+    if cache is not None:
+        report['cache'] = cache.stats()
+    print(json.dumps(report, indent=2))
+    if args.metrics_output:
+        with open(args.metrics_output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+except Exception as e:
+    print(e)
+    os._exit(1)
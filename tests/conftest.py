@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the tests import afd_pipeline from the checkout, the way the processing image has it on PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
@@ -0,0 +1,130 @@
+import os
+
+import pandas as pd
+import pytest
+
+from afd_pipeline.batch_prediction import BatchPredictionManager
+from afd_pipeline.waiter import Waiter, WaitFailed
+
+
+class ClientError(Exception):
+    """ Same shape as botocore.exceptions.ClientError: the error code is in response['Error']['Code'] """
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+
+class FakeFraudDetector(object):
+    """ Batch prediction jobs that finish on their first poll, writing the shard input back reversed and scored
+        Args:
+            fail (set): job ids that fail instead
+            quota (int): jobs running at once before CreateBatchPredictionJob raises LimitExceededException
+    """
+    def __init__(self, fail=(), quota=None):
+        self.fail = set(fail)
+        self.quota = quota
+        self.jobs = {}
+        self.created = []
+
+    def create_batch_prediction_job(self, jobId, inputPath, outputPath, **kwargs):
+        if jobId in self.jobs:
+            raise ClientError('ConflictException', f'job {jobId} already exists')
+        if self.quota is not None and sum(j['status'] == 'IN_PROGRESS' for j in self.jobs.values()) >= self.quota:
+            raise ClientError('LimitExceededException', 'too many jobs')
+        self.jobs[jobId] = {'status': 'IN_PROGRESS', 'input': inputPath, 'output': outputPath}
+        self.created.append(jobId)
+        return {}
+
+    def get_batch_prediction_jobs(self, jobId):
+        job = self.jobs[jobId]
+        if job['status'] == 'IN_PROGRESS':
+            if jobId in self.fail:
+                job.update(status='FAILED', failureReason='injected failure')
+            else:
+                events = pd.read_csv(job['input'], dtype=str)
+                os.makedirs(job['output'], exist_ok=True)
+                events.iloc[::-1].assign(score='1').to_csv(os.path.join(job['output'], 'predictions.csv'), index=False)
+                job['status'] = 'COMPLETE'
+        return {'batchPredictions': [dict(jobId=jobId, **job)]}
+
+
+@pytest.fixture
+def events(tmp_path):
+    path = str(tmp_path / 'events.csv')
+    pd.DataFrame({'EVENT_ID': [f'e{i:02d}' for i in range(12)], 'ip_address': [f'10.0.0.{i}' for i in range(12)]}) \
+        .to_csv(path, index=False)
+    return path
+
+
+def manager(client, work, max_attempts=2, max_concurrent_jobs=2):
+    return BatchPredictionManager(client, 'detector', '1', 'signup', 'arn:aws:iam::123456789012:role/afd',
+                                  str(work), 'job', max_concurrent_jobs=max_concurrent_jobs, max_rows=5,
+                                  max_attempts=max_attempts, waiter=Waiter(initial_delay=0, max_delay=0))
+
+
+def test_split(events, tmp_path):
+    shards = manager(FakeFraudDetector(), tmp_path / 'work').split(events)
+    assert len(shards) == 3
+    assert [s['rows'] for s in shards] == [5, 5, 2]
+    assert all(os.path.isfile(s['input']) and s['status'] == 'PENDING' for s in shards)
+    assert os.path.isfile(tmp_path / 'work' / 'manifest.json')
+
+
+def test_split_by_bytes(events, tmp_path):
+    m = manager(FakeFraudDetector(), tmp_path / 'work')
+    m.max_bytes = 100
+    shards = m.split(events)
+    assert sum(s['rows'] for s in shards) == 12
+    assert all(os.path.getsize(s['input']) <= 100 for s in shards)
+
+
+def test_run_and_merge_in_input_order(events, tmp_path):
+    client = FakeFraudDetector()
+    m = manager(client, tmp_path / 'work')
+    m.split(events)
+    shards = m.run()
+    assert all(s['status'] == 'COMPLETE' for s in shards)
+    assert client.created == ['job_00000_0', 'job_00001_0', 'job_00002_0']
+
+    output = str(tmp_path / 'predictions.csv')
+    assert m.merge(output) == 12
+    merged = pd.read_csv(output, dtype=str)
+    assert merged['EVENT_ID'].tolist() == pd.read_csv(events, dtype=str)['EVENT_ID'].tolist()
+
+
+def test_failed_shard_is_retried_under_a_new_job_id(events, tmp_path):
+    client = FakeFraudDetector(fail={'job_00001_0'})
+    m = manager(client, tmp_path / 'work')
+    m.split(events)
+    shards = m.run()
+    assert all(s['status'] == 'COMPLETE' for s in shards)
+    assert shards[1]['job_id'] == 'job_00001_1'
+    assert shards[1]['output'].rstrip('/').endswith('shard-00001/job_00001_1')
+
+
+def test_resume_after_failure(events, tmp_path):
+    client = FakeFraudDetector(fail={'job_00001_0', 'job_00001_1'})
+    m = manager(client, tmp_path / 'work')
+    m.split(events)
+    with pytest.raises(WaitFailed):
+        m.run()
+
+    # a new run picks up the manifest: completed shards are kept, the failed one gets a new retry budget
+    # and job ids that do not collide with those of the first run
+    client.fail.clear()
+    resumed = manager(client, tmp_path / 'work')
+    shards = resumed.split(events)
+    assert [s['status'] for s in shards] == ['COMPLETE', 'PENDING', 'COMPLETE']
+    assert shards[1]['attempts'] == 2 and shards[1]['retries_left'] == 2
+    resumed.run()
+    assert client.created[-1:] == ['job_00001_2']
+    assert resumed.merge(str(tmp_path / 'predictions.csv')) == 12
+
+
+def test_quota_errors_lower_the_concurrency(events, tmp_path):
+    client = FakeFraudDetector(quota=1)
+    m = manager(client, tmp_path / 'work', max_concurrent_jobs=3)
+    m.split(events)
+    shards = m.run()
+    assert all(s['status'] == 'COMPLETE' for s in shards)
+    assert all(s['attempts'] == 1 for s in shards)
@@ -0,0 +1,79 @@
+import os
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from afd_pipeline.columnar import TypedCopyWriter, compact_column, read_typed, write_typed
+
+
+def write_chunks(path, chunks):
+    writer = TypedCopyWriter(path)
+    for chunk in chunks:
+        writer.append(pd.DataFrame(chunk, dtype=str))
+    return writer.close()
+
+
+def test_numbers_are_parsed_and_downcast(tmp_path):
+    path = str(tmp_path / 'typed.parquet')
+    write_typed(pd.DataFrame({'amount': ['1.5', '2.25'], 'count': ['1', '300'], 'state': ['NY', 'NY']}), path)
+    df = read_typed(path)
+    assert str(df['amount'].dtype) == 'float32'
+    assert str(df['count'].dtype) == 'int16'
+    assert isinstance(df['state'].dtype, pd.CategoricalDtype)
+
+
+def test_leading_zeros_stay_strings(tmp_path):
+    assert compact_column(pd.Series(['02134', '10001', '00501'])).tolist() == ['02134', '10001', '00501']
+    assert compact_column(pd.Series(['+1', '2'])).tolist() == ['+1', '2']
+    # a zero on its own and decimals below one are numbers
+    assert compact_column(pd.Series(['0', '0.5', '10'])).tolist() == [0.0, 0.5, 10.0]
+
+    path = str(tmp_path / 'typed.parquet')
+    write_chunks(path, [{'customer_postal': ['10001', '94105']}, {'customer_postal': ['02134', '94105']}])
+    assert read_typed(path)['customer_postal'].astype(str).tolist() == ['10001', '94105', '02134', '94105']
+
+
+def test_type_drift_widens_to_strings(tmp_path):
+    path = str(tmp_path / 'typed.parquet')
+    report = write_chunks(path, [
+        {'zip': ['10001', '94105'], 'amount': ['1', '2'], 'score': ['900', '100']},
+        {'zip': ['A1B', '94105'], 'amount': ['2.5', None], 'score': ['50', '60']},
+    ])
+    assert sorted(report['widened']) == ['amount', 'zip']
+    assert report['rows'] == 4
+    assert pq.ParquetFile(path).num_row_groups == 2
+    assert not os.path.exists(f'{path}.widen')
+    df = read_typed(path)
+    assert df['zip'].astype(str).tolist() == ['10001', '94105', 'A1B', '94105']
+    assert df['amount'].tolist()[:3] == ['1', '2', '2.5'] and pd.isna(df['amount'][3])
+    assert df['score'].tolist() == [900, 100, 50, 60]
+
+
+def test_abort_removes_the_file(tmp_path):
+    path = str(tmp_path / 'typed.parquet')
+    writer = TypedCopyWriter(path)
+    writer.append(pd.DataFrame({'a': ['1']}))
+    writer.abort()
+    assert not os.path.exists(path)
+
+
+def test_typed_copy_failure_does_not_fail_the_step(tmp_path, monkeypatch):
+    from afd_pipeline.clients import Clients
+    from afd_pipeline.metrics import StepMetrics
+    from afd_pipeline.steps.create_dataset import DatasetBuilder, parse_args
+
+    def broken(self, chunk):
+        raise OSError('disk full')
+    monkeypatch.setattr(TypedCopyWriter, 'append', broken)
+
+    source = str(tmp_path / 'result.csv')
+    pd.DataFrame({'EVENT_ID': ['1', '2'], 'EVENT_LABEL': ['fraud', 'legit']}).to_csv(source, index=False)
+    metrics = StepMetrics('create_dataset')
+    builder = DatasetBuilder(parse_args(['--typed-copy', '--output-dir', str(tmp_path / 'output')]),
+                             Clients(None, metrics), metrics)
+    output = str(tmp_path / 'train.csv')
+    assert builder.stream_training_data(source, output) == {'fraud': 1, 'legit': 1}
+    assert len(pd.read_csv(output)) == 2
+    assert metrics.counters['typed_copy_failed'] == 1
+    assert not os.path.exists(builder.typed_data_file())
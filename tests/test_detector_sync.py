@@ -0,0 +1,59 @@
+import pytest
+
+from afd_pipeline.detector_sync import RuleSync, paginate, sync_outcomes
+from afd_pipeline.metrics import StepMetrics
+from benchmarks.fake_aws import FakeAWS
+
+boto3 = pytest.importorskip('boto3')
+
+RULES = [
+    {'ruleId': 'review', 'expression': '$model_insightscore > 900', 'outcomes': ['review']},
+    {'ruleId': 'approve', 'expression': '$model_insightscore <= 900', 'outcomes': ['approve']},
+]
+
+
+@pytest.fixture
+def account(tmp_path):
+    fake = FakeAWS(str(tmp_path), latency=0)
+    fake.add_detector('detector')
+    metrics = StepMetrics('setup_detector')
+    session = metrics.instrument(fake.attach(boto3.session.Session(region_name=FakeAWS.REGION)))
+    return session.client('frauddetector'), metrics
+
+
+def calls(metrics):
+    return {name: len(call['latencies']) for name, call in metrics.calls.items()}
+
+
+def test_paginate():
+    pages = {None: {'items': [1, 2], 'nextToken': 'a'}, 'a': {'items': [3], 'nextToken': 'b'}, 'b': {'items': []}}
+    assert paginate(lambda nextToken=None, **kwargs: pages[nextToken], 'items', maxResults=2) == [1, 2, 3]
+
+
+def test_outcomes_are_only_written_when_changed(account):
+    client, metrics = account
+    outcomes = [{'name': 'review', 'desc': 'manual review'}, {'name': 'approve', 'desc': 'approve'}]
+    assert sync_outcomes(client, outcomes) == ['review', 'approve']
+    assert sync_outcomes(client, outcomes) == []
+    outcomes[1]['desc'] = 'approve the signup'
+    assert sync_outcomes(client, outcomes) == ['approve']
+    assert calls(metrics) == {'frauddetector.GetOutcomes': 3, 'frauddetector.PutOutcome': 3}
+
+
+def test_rule_sync(account):
+    client, metrics = account
+    sync = RuleSync(client, 'detector')
+    assert [c.action for c in sync.plan(RULES)] == ['create', 'create']
+    assert sync.sync(RULES) == [{'ruleId': 'review', 'ruleVersion': '1', 'detectorId': 'detector'},
+                                {'ruleId': 'approve', 'ruleVersion': '1', 'detectorId': 'detector'}]
+
+    # nothing changed: one list call and no writes
+    before = calls(metrics)
+    assert [r['ruleVersion'] for r in sync.sync(RULES)] == ['1', '1']
+    assert calls(metrics) == dict(before, **{'frauddetector.GetRules': before['frauddetector.GetRules'] + 1})
+
+    changed = [dict(RULES[0], expression='$model_insightscore > 950'), RULES[1]]
+    assert [c.action for c in sync.plan(changed)] == ['update', 'unchanged']
+    assert [r['ruleVersion'] for r in sync.sync(changed)] == ['2', '1']
+    # the latest version is the one compared against
+    assert [c.action for c in sync.plan(changed)] == ['unchanged', 'unchanged']
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from afd_pipeline.drift import DriftMonitor, build_baseline, psi, sketch_values
+from afd_pipeline.profiling import feature_types
+
+
+def events(n, seed=0, shift=0.0, domains=('gmail.com', 'yahoo.com')):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'EVENT_LABEL'  : rng.integers(0, 2, n),
+        'amount'       : rng.normal(100 + shift, 10, n),
+        'email_address': [f'user{i}@{d}' for i, d in enumerate(rng.choice(domains, n))],
+        'ip_address'   : [f'10.{i % 4}.0.1' for i in range(n)],
+        'channel'      : rng.choice(['web', 'app'], n)
+    })
+
+
+def chunks(df, size=1000):
+    return [df.iloc[i:i + size] for i in range(0, len(df), size)]
+
+
+def test_types_are_inferred_like_the_profiler():
+    df = events(10)
+    baseline = build_baseline(chunks(df))
+    assert {c: f['type'] for c, f in baseline['features'].items()} == \
+        {c: t for c, t in zip(df.columns, feature_types(df.columns, df.dtypes)) if c != 'EVENT_LABEL'}
+    assert baseline['features']['email_address']['type'] == 'EMAIL_ADDRESS'
+
+
+def test_sketch_values():
+    assert sketch_values(pd.Series(['a@X.com', None]), 'EMAIL_ADDRESS').tolist() == ['x.com']
+    assert sketch_values(pd.Series(['10.1.2.3', '2001:db8::1']), 'IP_ADDRESS').tolist() == ['10.1', '2001:db8']
+    assert sketch_values(pd.Series(['1.5', 'x', None]), 'NUMERIC').tolist() == [1.5]
+
+
+def test_same_distribution_does_not_drift():
+    baseline = build_baseline(chunks(events(20000)))
+    report = DriftMonitor(baseline).update(events(5000, seed=1)).report()
+    assert report['status'] == 'OK'
+    assert report['max_psi'] < 0.05
+
+
+def test_shifted_features_drift():
+    baseline = build_baseline(chunks(events(20000)))
+    live = events(5000, seed=1, shift=20, domains=('proton.me',))
+    live.loc[:999, 'channel'] = None
+    report = DriftMonitor(baseline).update(live).report()
+    assert report['status'] == 'DRIFT'
+    assert sorted(report['drifted_features']) == ['amount', 'channel', 'email_address']
+    assert report['features']['channel']['null_rate_actual'] == pytest.approx(0.2)
+
+
+def test_monitor_state_is_kept_per_batch():
+    baseline = build_baseline(chunks(events(5000)))
+    first = DriftMonitor(baseline, batch='b1').update(events(600, seed=1))
+    assert first.report()['status'] == 'INSUFFICIENT_DATA'
+    second = DriftMonitor(baseline, first.to_dict(), batch='b2').update(events(600, seed=2))
+    report = second.report()
+    assert (report['rows'], report['batches'], report['batch']['rows'], report['batch']['id']) == (1200, 2, 600, 'b2')
+    assert (report['status'], report['batch']['status']) == ('OK', 'INSUFFICIENT_DATA')
+    merged = DriftMonitor(baseline).update(events(600, seed=1)).merge(DriftMonitor(baseline).update(events(600, seed=2)))
+    assert report['features'] == merged.report()['features']
+
+    # counting a batch again replaces its counters
+    again = DriftMonitor(baseline, second.to_dict(), batch='b2').update(events(600, seed=2))
+    assert again.report()['rows'] == 1200
+    # only the latest batches are kept
+    third = DriftMonitor(baseline, again.to_dict(), batch='b3', window=2).update(events(600, seed=3))
+    assert list(third.to_dict()['batches']) == ['b2', 'b3']
+    # counters of another baseline are not carried over
+    other = build_baseline(chunks(events(5000, seed=3)))
+    assert DriftMonitor(other, first.to_dict()).report()['rows'] == 0
+
+
+def test_latest_batch_is_reported_on_its_own():
+    baseline = build_baseline(chunks(events(20000)))
+    state = DriftMonitor(baseline, batch='b1').update(events(20000, seed=1)).to_dict()
+    report = DriftMonitor(baseline, state, batch='b2').update(events(2000, seed=2, shift=20)).report()
+    assert report['batch']['status'] == 'DRIFT'
+    assert 'amount' in report['batch']['drifted_features']
+    assert report['features']['amount']['psi'] < report['batch']['features']['amount']['psi']
+
+
+def test_psi():
+    assert psi([0.5, 0.5], [0.5, 0.5]) == 0.0
+    assert psi([0.5, 0.5], [0.9, 0.1]) == pytest.approx(0.4 * np.log(1.8) - 0.4 * np.log(0.2))
@@ -0,0 +1,120 @@
+import pandas as pd
+import pytest
+
+from afd_pipeline.flow import FlowExecutor
+
+
+def source(path):
+    return {'node_id': 'source', 'type': 'SOURCE', 'operator': 'sagemaker.s3_source_0.1', 'inputs': [],
+            'parameters': {'dataset_definition': {'name': 'data', 's3ExecutionContext': {
+                's3Uri': path, 's3ContentType': 'csv', 's3HasHeader': True}}}}
+
+
+def flow(path, *transforms):
+    nodes = [source(path)]
+    for i, (operator, parameters) in enumerate(transforms):
+        nodes.append({'node_id': f'node{i}', 'type': 'TRANSFORM', 'operator': f'sagemaker.spark.{operator}_0.1',
+                      'parameters': parameters, 'inputs': [{'name': 'df', 'node_id': nodes[-1]['node_id']}]})
+    return {'nodes': nodes}
+
+
+def cast():
+    return 'infer_and_cast_type', {}
+
+
+def fill(column, value, output=None):
+    return 'handle_missing', {'operator': 'Fill missing', 'fill_missing_parameters': {
+        'input_column': column, 'fill_value': value, **({'output_column': output} if output else {})}}
+
+
+def drop(*columns):
+    return 'manage_columns', {'operator': 'Drop column', 'drop_column_parameters': {'column_to_drop': list(columns)}}
+
+
+def rename(column, new_name):
+    return 'manage_columns', {'operator': 'Rename column',
+                              'rename_column_parameters': {'input_column': column, 'new_name': new_name}}
+
+
+def duplicate(column, new_name):
+    return 'manage_columns', {'operator': 'Duplicate column',
+                              'duplicate_column_parameters': {'input_column': column, 'new_name': new_name}}
+
+
+def move(column):
+    return 'manage_columns', {'operator': 'Move column',
+                              'move_column_parameters': {'move_type': 'Move to start', 'column_to_move': column}}
+
+
+def custom(code):
+    return 'custom_pandas', {'code': code}
+
+
+@pytest.fixture
+def data(tmp_path):
+    path = str(tmp_path / 'data.csv')
+    pd.DataFrame({'a': ['1', '3', None], 'b': [None, '2', '4'], 'c': ['x', None, 'z']}).to_csv(path, index=False)
+    return path
+
+
+def run(flow_dict, chunksize=2):
+    """ Output of the optimized plan, checked against node by node execution, and the plan """
+    optimized = FlowExecutor(flow_dict, chunksize=chunksize)
+    result = pd.concat(list(optimized.iter_chunks()), ignore_index=True)
+    expected = pd.concat(list(FlowExecutor(flow_dict, chunksize=chunksize, optimize=False).iter_chunks()),
+                         ignore_index=True)
+    pd.testing.assert_frame_equal(result, expected)
+    return result, optimized.compile()
+
+
+def test_dropped_column_is_not_read(data):
+    result, plan = run(flow(data, fill('a', '0'), move('a'), drop('a')))
+    assert plan.pruned == ['a']
+    assert plan.usecols == ['b', 'c']
+    assert plan.stages == []
+    assert list(result.columns) == ['b', 'c']
+
+
+def test_name_reused_after_a_drop(data):
+    # a is dropped, then b takes its name: the fill acts on b and stays
+    result, plan = run(flow(data, drop('a'), rename('b', 'a'), fill('a', 'X')))
+    assert plan.pruned == ['a']
+    assert [s.name for s in plan.stages] == ['Rename column', 'Fill missing a']
+    assert result['a'].tolist() == ['X', '2', '4']
+
+
+def test_renamed_column_is_pruned(data):
+    result, plan = run(flow(data, rename('a', 'x'), fill('x', '0'), duplicate('c', 'd'), drop('x', 'c')))
+    assert plan.pruned == ['a']
+    # c is read by the duplicate, so the drop is left with c only
+    assert [s.name for s in plan.stages] == ['Duplicate column', 'Drop column']
+    assert plan.stages[1].fn.__self__.params['drop_column_parameters'] == {'column_to_drop': ['c']}
+    assert list(result.columns) == ['b', 'd']
+
+
+@pytest.mark.parametrize('reader', [duplicate('a', 'd'), fill('a', '0', output='d'), custom("df['d'] = df['a']")])
+def test_column_read_before_its_drop_is_kept(data, reader):
+    result, plan = run(flow(data, reader, drop('a')))
+    assert plan.pruned == []
+    assert plan.usecols is None
+    assert result['d'].fillna('0').tolist() == ['1', '3', '0']
+
+
+def test_fills_are_fused(data):
+    result, plan = run(flow(data, cast(), fill('a', '0'), fill('b', '0'), fill('a', '5'), fill('c', 'y')))
+    assert plan.fused_casts
+    assert plan.types == {'a': 'long', 'b': 'long', 'c': 'string'}
+    assert [(s.name, len(s.nodes)) for s in plan.stages] == [('fill_missing a,b,a,c', 4)]
+    assert result.to_dict('list') == {'a': [1, 3, 0], 'b': [0, 2, 4], 'c': ['x', 'y', 'z']}
+
+
+def test_fill_to_another_column_is_not_fused(data):
+    result, plan = run(flow(data, fill('a', '0', output='a2'), fill('b', '0')))
+    assert len(plan.stages) == 2
+    assert result['a2'].tolist() == ['1', '3', '0']
+
+
+def test_fill_value_of_another_type(data):
+    # a fill value that is not a number turns a long column into strings, fused or not
+    result, _ = run(flow(data, cast(), fill('a', 'none'), fill('b', '0')))
+    assert result['a'].tolist()[2] == 'none'
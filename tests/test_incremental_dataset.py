@@ -0,0 +1,154 @@
+import os
+import glob
+import json
+import itertools
+
+import pandas as pd
+import pytest
+
+from afd_pipeline.clients import Clients
+from afd_pipeline.metrics import StepMetrics
+from afd_pipeline.steps import create_dataset
+from afd_pipeline.steps.create_dataset import DatasetBuilder, parse_args
+
+
+def builder(window=None):
+    args = parse_args(['--engine', 'local', '--incremental'])
+    metrics = StepMetrics('create_dataset')
+    b = DatasetBuilder(args, Clients(None, metrics), metrics)
+    b.sg_table, b.oc_table = 'signups', 'outcomes'
+    b.sg_features = [{'FeatureName': f} for f in ('EVENT_ID', 'ip_address', 'EventTime')]
+    b.oc_features = [{'FeatureName': f} for f in ('EVENT_ID', 'EVENT_LABEL', 'EVENT_TIMESTAMP', 'EventTime')]
+    b.window = window
+    return b
+
+
+def where_clause(window):
+    query = builder(window).gen_query()[0]
+    return ' '.join(query.split('WHERE', 1)[1].split()) if 'WHERE' in query else None
+
+
+def test_full_build_has_no_window():
+    assert where_clause(None) is None
+
+
+def test_first_incremental_run_takes_every_signup_up_to_the_watermark():
+    window = {'signups_from': None, 'signups_to': 3.0, 'outcomes_from': None, 'outcomes_to': 6.0, 'batch': 'b'}
+    assert where_clause(window) == '"signups".EventTime <= 3.0'
+    assert '"outcomes".EventTime <= 6.0' in builder(window).gen_query()[0]
+
+
+def test_later_runs_take_only_new_signups():
+    window = {'signups_from': 3.0, 'signups_to': 4.0, 'outcomes_from': 6.0, 'outcomes_to': 8.0, 'batch': 'b'}
+    assert where_clause(window) == '"signups".EventTime <= 4.0 AND "signups".EventTime > 3.0'
+
+
+@pytest.mark.parametrize('window, empty', [
+    ({'signups_from': None, 'signups_to': None, 'outcomes_from': None, 'outcomes_to': None}, True),
+    ({'signups_from': None, 'signups_to': 3.0, 'outcomes_from': None, 'outcomes_to': None}, False),
+    ({'signups_from': 3.0, 'signups_to': 3.0, 'outcomes_from': 6.0, 'outcomes_to': 6.0}, True),
+    ({'signups_from': 3.0, 'signups_to': 4.0, 'outcomes_from': 6.0, 'outcomes_to': 6.0}, False),
+    ({'signups_from': 3.0, 'signups_to': 3.0, 'outcomes_from': 6.0, 'outcomes_to': 7.0}, False),
+])
+def test_window_is_empty(window, empty):
+    assert builder(window).window_is_empty() is empty
+
+
+def test_athena_late_outcomes_query(tmp_path):
+    window = {'signups_from': 3.0, 'signups_to': 4.0, 'outcomes_from': 6.0, 'outcomes_to': 8.0, 'batch': 'b'}
+    b = builder(window)
+    b.args.engine = 'athena'
+    result = str(tmp_path / 'late.csv')
+    pd.DataFrame({'EVENT_ID': ['3'], 'EVENT_LABEL': ['1'], 'EVENT_TIMESTAMP': ['t3']}).to_csv(result, index=False)
+    queries = []
+    b.run_athena_query = lambda query: queries.append(' '.join(query.split())) or result
+    late = b.read_late_outcomes(b.gen_query()[2])
+    assert late.to_dict('list') == {'EVENT_ID': ['3'], 'EVENT_LABEL': ['1'], 'EVENT_TIMESTAMP': ['t3']}
+    assert queries == ['SELECT DISTINCT o.EVENT_ID, o.EVENT_LABEL, o.EVENT_TIMESTAMP FROM "outcomes" o JOIN '
+                       '(SELECT DISTINCT EVENT_ID FROM "outcomes" WHERE EventTime <= 8.0 AND EventTime > 6.0) l ON '
+                       'o.EVENT_ID = l.EVENT_ID WHERE o.EventTime <= 8.0']
+
+
+#----End to end runs of the local engine over offline stores that grow between runs
+def write_partition(store, name, records):
+    os.makedirs(store, exist_ok=True)
+    pd.DataFrame(records).to_parquet(os.path.join(store, f'{name}.parquet'), index=False)
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    batches = itertools.count(1)
+    strftime = create_dataset.time.strftime
+
+    # one partition name per run, instead of one per second
+    def batch_name(fmt, *args):
+        return f'run{next(batches)}' if fmt == '%Y%m%dT%H%M%S' else strftime(fmt, *args)
+    monkeypatch.setattr(create_dataset.time, 'strftime', batch_name)
+    signups, outcomes = str(tmp_path / 'signups'), str(tmp_path / 'outcomes')
+    write_partition(signups, 'p1', {'EVENT_ID': ['1', '2', '3'], 'ip_address': ['a', 'b', 'c'],
+                                    'EventTime': [1.0, 2.0, 3.0]})
+    write_partition(outcomes, 'p1', {'EVENT_ID': ['1', '2'], 'EVENT_LABEL': ['fraud', 'legit'],
+                                     'EVENT_TIMESTAMP': ['t1', 't2'], 'EventTime': [5.0, 6.0]})
+    return signups, outcomes
+
+
+def run(tmp_path, stores):
+    # the output of every run goes to the same place, as the pipeline uploads them all under one prefix
+    output = tmp_path / 'output'
+    os.makedirs(output / 'schema', exist_ok=True)
+    code = create_dataset.main(['--engine', 'local', '--incremental',
+                                '--signups-offline-store-uri', stores[0], '--outcomes-offline-store-uri', stores[1],
+                                '--state-uri', str(tmp_path / 'state.json'), '--metrics-dir', str(tmp_path / 'metrics'),
+                                '--output-dir', str(output), '--train-data-uri', str(output / 'train')])
+    assert code == 0
+    partitions = {os.path.basename(os.path.dirname(f)): pd.read_csv(f, dtype=str)
+                  for f in glob.glob(str(output / 'train' / '*' / '*.csv'))}
+    with open(output / 'schema' / 'schema.json') as f:
+        return partitions, json.load(f)
+
+
+def test_incremental_runs(tmp_path, stores):
+    partitions, schema = run(tmp_path, stores)
+    assert list(partitions) == ['batch=run1']
+    assert partitions['batch=run1']['EVENT_ID'].tolist() == ['1', '2', '3']
+    assert partitions['batch=run1']['EVENT_LABEL'].isna().tolist() == [False, False, True]
+    assert schema['modelVariables'] == ['EVENT_ID', 'ip_address']
+
+    # a new signup, and the outcome of signup 3 that was already written without one
+    write_partition(stores[0], 'p2', {'EVENT_ID': ['4'], 'ip_address': ['d'], 'EventTime': [4.0]})
+    write_partition(stores[1], 'p2', {'EVENT_ID': ['3', '4'], 'EVENT_LABEL': ['legit', 'legit'],
+                                      'EVENT_TIMESTAMP': ['t3', 't4'], 'EventTime': [7.0, 8.0]})
+    partitions, schema = run(tmp_path, stores)
+    assert sorted(partitions) == ['batch=run1', 'batch=run2']
+    # every event appears once, signup 3 relabelled in the partition of its signup
+    rows = pd.concat(partitions.values(), ignore_index=True)
+    assert sorted(rows['EVENT_ID']) == ['1', '2', '3', '4']
+    assert partitions['batch=run2']['EVENT_ID'].tolist() == ['4']
+    assert dict(zip(rows['EVENT_ID'], rows['EVENT_LABEL'])) == {'1': 'fraud', '2': 'legit', '3': 'legit', '4': 'legit'}
+    assert partitions['batch=run1'].loc[partitions['batch=run1']['EVENT_ID'] == '3', 'EVENT_TIMESTAMP'].tolist() == ['t3']
+    # the label mapper counts the labels of every partition written so far
+    assert schema['labelSchema']['labelMapper'] == {'FRAUD': ['fraud'], 'LEGIT': ['legit']}
+
+    state = json.loads((tmp_path / 'state.json').read_text())
+    assert state == {'watermarks': {'signups': 4.0, 'outcomes': 8.0}, 'label_counts': {'fraud': 1, 'legit': 3}}
+
+    # nothing new: no partition is written, the schema still covers the earlier ones and the state is unchanged
+    before = {batch: (tmp_path / 'output' / 'train' / batch / 'afd_training_data.csv').stat().st_mtime_ns
+              for batch in partitions}
+    partitions, schema = run(tmp_path, stores)
+    assert sorted(partitions) == ['batch=run1', 'batch=run2']
+    assert {batch: (tmp_path / 'output' / 'train' / batch / 'afd_training_data.csv').stat().st_mtime_ns
+            for batch in partitions} == before
+    assert schema['labelSchema']['labelMapper'] == {'FRAUD': ['fraud'], 'LEGIT': ['legit']}
+    assert json.loads((tmp_path / 'state.json').read_text()) == state
+
+
+def test_late_outcome_only(tmp_path, stores):
+    run(tmp_path, stores)
+    # the outcome of signup 3, and no new signup
+    write_partition(stores[1], 'p2', {'EVENT_ID': ['3'], 'EVENT_LABEL': ['fraud'],
+                                      'EVENT_TIMESTAMP': ['t3'], 'EventTime': [7.0]})
+    partitions, schema = run(tmp_path, stores)
+    assert list(partitions) == ['batch=run1']
+    assert partitions['batch=run1']['EVENT_ID'].value_counts().to_dict() == {'1': 1, '2': 1, '3': 1}
+    assert json.loads((tmp_path / 'state.json').read_text())['label_counts'] == {'fraud': 2, 'legit': 1}
@@ -0,0 +1,65 @@
+import os
+import json
+
+import pytest
+
+from afd_pipeline import memo
+
+
+@pytest.fixture
+def data(tmp_path):
+    directory = tmp_path / 'train'
+    directory.mkdir()
+    for name in ('a.csv', 'b.csv', 'c.csv'):
+        (directory / name).write_text(f'{name}\n1,2\n')
+    return directory
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    locations = []
+    object_digest = memo.object_digest
+
+    def counting(location, *args, **kwargs):
+        locations.append(os.path.basename(location))
+        return object_digest(location, *args, **kwargs)
+    monkeypatch.setattr(memo, 'object_digest', counting)
+    return locations
+
+
+def test_only_new_files_are_read(data, tmp_path, reads):
+    cache_uri = str(tmp_path / 'digests.json')
+    digest, cached = memo.data_digest(str(data), cache_uri=cache_uri)
+    assert (cached, reads) == (False, ['a.csv', 'b.csv', 'c.csv'])
+    assert memo.data_digest(str(data), cache_uri=cache_uri) == (digest, True)
+    assert memo.data_digest(str(data)) == (digest, False)
+
+    (data / 'd.csv').write_text('d\n')
+    del reads[:]
+    appended, cached = memo.data_digest(str(data), cache_uri=cache_uri)
+    assert (appended != digest, cached, reads) == (True, False, ['d.csv'])
+
+    # a removed file leaves the digest and the cache document
+    os.remove(data / 'd.csv')
+    assert memo.data_digest(str(data), cache_uri=cache_uri) == (digest, True)
+    with open(cache_uri) as f:
+        assert sorted(os.path.basename(loc) for loc in json.load(f)['objects']) == ['a.csv', 'b.csv', 'c.csv']
+
+
+def test_digest_follows_the_content(data, tmp_path):
+    digest, _ = memo.data_digest(str(data))
+    (data / 'a.csv').write_text('a.csv\n1,3\n')
+    assert memo.data_digest(str(data))[0] != digest
+
+    # the same bytes split differently between files are different data
+    (data / 'a.csv').write_text('a.csv\n1,2\nb.csv\n')
+    (data / 'b.csv').write_text('1,2\n')
+    assert memo.data_digest(str(data))[0] != digest
+
+
+def test_cache_is_bounded(data, tmp_path, monkeypatch):
+    monkeypatch.setattr(memo, 'MAX_CACHED_OBJECTS', 2)
+    cache_uri = str(tmp_path / 'digests.json')
+    memo.data_digest(str(data), cache_uri=cache_uri)
+    with open(cache_uri) as f:
+        assert len(json.load(f)['objects']) == 2
@@ -0,0 +1,99 @@
+import os
+import time
+
+import pytest
+
+from afd_pipeline.query_cache import QueryResultCache, prefix_state, query_fingerprint
+from benchmarks.fake_aws import FakeAWS
+
+boto3 = pytest.importorskip('boto3')
+
+DAY = 86400
+RESULTS = 's3://bucket/afd-pipeline/query_results/'
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def fake(tmp_path):
+    return FakeAWS(str(tmp_path / 'aws'), latency=0)
+
+
+@pytest.fixture
+def s3(fake):
+    return fake.attach(boto3.session.Session(region_name=FakeAWS.REGION)).client('s3')
+
+
+def put_result(s3, name):
+    s3.put_object(Bucket='bucket', Key=f'afd-pipeline/query_results/{name}.csv', Body=b'a,b\n1,2\n')
+    s3.put_object(Bucket='bucket', Key=f'afd-pipeline/query_results/{name}.csv.metadata', Body=b'')
+    return f'{RESULTS}{name}.csv'
+
+
+def cache(s3, clock, **kwargs):
+    return QueryResultCache('s3://bucket/afd-pipeline/state/query_cache.json', RESULTS, s3_client=s3, clock=clock,
+                            **kwargs)
+
+
+def test_fingerprint_follows_the_data(s3):
+    s3.put_object(Bucket='bucket', Key='store/signups/part-0.parquet', Body=b'0123')
+    state = prefix_state('s3://bucket/store/signups', s3)
+    assert (state['objects'], state['bytes']) == (1, 4)
+    query = 'SELECT *\n  FROM signups'
+    assert query_fingerprint(query, {'signups': state}) == query_fingerprint('SELECT * FROM signups', {'signups': state})
+
+    s3.put_object(Bucket='bucket', Key='store/signups/part-1.parquet', Body=b'45')
+    assert query_fingerprint(query, {'signups': prefix_state('s3://bucket/store/signups', s3)}) != \
+        query_fingerprint(query, {'signups': state})
+
+
+def test_lookup_and_store(s3):
+    clock = Clock()
+    location = put_result(s3, 'q1')
+    c = cache(s3, clock)
+    assert c.lookup('f1') is None
+    c.store('f1', 'q1', location)
+    # a new cache object reads the persisted index
+    assert cache(s3, clock).lookup('f1') == location
+
+    # expired entries and entries whose result is gone are misses
+    clock.now += 8 * DAY
+    assert cache(s3, clock).lookup('f1') is None
+    clock.now -= 8 * DAY
+    c.store('f2', 'q2', f'{RESULTS}missing.csv')
+    assert c.lookup('f2') is None
+
+
+def test_evict(fake, s3):
+    clock = Clock()
+    c = cache(s3, clock, max_entries=1)
+    c.store('old', 'q1', put_result(s3, 'q1'))
+    clock.now += 1
+    c.store('new', 'q2', put_result(s3, 'q2'))
+    put_result(s3, 'never_cached')
+
+    # beyond max_entries, the least recently used entry goes with its result and metadata objects
+    assert c.evict() == {'entries': 1, 'objects': 2}
+    assert c.lookup('new') is not None
+    assert not os.path.exists(fake.s3_path(f'{RESULTS}q1.csv'))
+    assert os.path.exists(fake.s3_path(f'{RESULTS}never_cached.csv'))
+
+    # past the retention period, the entry and every unreferenced result object are deleted
+    clock.now += 8 * DAY
+    assert c.evict() == {'entries': 1, 'objects': 4}
+    assert not os.listdir(fake.s3_path(RESULTS))
+
+
+def test_invalidate(fake, s3):
+    c = cache(s3, Clock())
+    c.store('f1', 'q1', put_result(s3, 'q1'))
+    c.store('f2', 'q2', put_result(s3, 'q2'))
+    assert c.invalidate('f1') == 1
+    assert c.invalidate() == 1
+    assert not os.listdir(fake.s3_path(RESULTS))
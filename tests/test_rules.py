@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from afd_pipeline.rules import Rule, CompiledRule, RuleSyntaxError, as_rules, evaluate_rules, outcome_summary
+
+
+@pytest.fixture
+def scores():
+    return pd.DataFrame({
+        'model_insightscore': [100.0, 750.0, 950.0, np.nan],
+        'country'           : ['US', 'FR', 'US', None]
+    })
+
+
+def mask(expression, frame):
+    return CompiledRule(Rule('r', expression, []))(frame).tolist()
+
+
+def test_comparisons(scores):
+    assert mask('$model_insightscore > 900', scores) == [False, False, True, False]
+    assert mask('$model_insightscore <= 750', scores) == [True, True, False, False]
+    assert mask('$country == "US"', scores) == [True, False, True, False]
+    assert mask("$country != 'US'", scores) == [False, True, False, False]
+    assert mask('$country > "B"', scores) == [True, True, True, False]
+
+
+def test_precedence_and_parentheses(scores):
+    # and binds tighter than or
+    assert mask('$model_insightscore > 900 or $model_insightscore > 700 and $country == "FR"', scores) == \
+        [False, True, True, False]
+    assert mask('($model_insightscore > 900 or $model_insightscore > 700) and $country == "US"', scores) == \
+        [False, False, True, False]
+    assert mask('not ($model_insightscore > 500) AND $country == "US"', scores) == [True, False, False, False]
+
+
+def test_missing_values_never_match(scores):
+    assert not mask('$model_insightscore > -1', scores)[3]
+    assert not mask('$model_insightscore < 1e9', scores)[3]
+    assert not mask('$model_insightscore != 100', scores)[3]
+    # negating the comparison does match the row
+    assert mask('not ($country == "US")', scores) == [False, True, False, True]
+
+
+@pytest.mark.parametrize('expression', [
+    '$score >',
+    '$score > 1 and',
+    '($score > 1',
+    '$score > 1)',
+    '$score in (1, 2)',
+    '$score > 1 xor $score < 2',
+    '$score ~ 1',
+])
+def test_syntax_errors(expression):
+    with pytest.raises(RuleSyntaxError):
+        CompiledRule(Rule('r', expression, []))
+
+
+def test_missing_column(scores):
+    with pytest.raises(KeyError):
+        mask('$other_score > 1', scores)
+
+
+def test_as_rules():
+    rules = as_rules([{'rule': '$s > 900', 'outcome': 'review'}, Rule('keep', '$s > 0', ['approve'])])
+    assert rules == [Rule('rule0', '$s > 900', ['review']), Rule('keep', '$s > 0', ['approve'])]
+
+
+RULE_SET = [
+    {'rule': '$model_insightscore > 900', 'outcome': 'review'},
+    {'rule': '$model_insightscore > 700', 'outcome': 'verify'},
+    {'rule': '$model_insightscore <= 700', 'outcome': 'approve'},
+]
+
+
+def test_first_matched(scores):
+    result = evaluate_rules(scores, RULE_SET, 'FIRST_MATCHED')
+    assert result['rule_ids'].tolist() == ['rule2', 'rule1', 'rule0', '']
+    assert result['outcomes'].tolist() == ['approve', 'verify', 'review', '']
+
+
+def test_all_matched(scores):
+    result = evaluate_rules(scores, RULE_SET, 'ALL_MATCHED')
+    assert result['rule_ids'].tolist() == ['rule2', 'rule1', 'rule0;rule1', '']
+    assert result['outcomes'].tolist() == ['approve', 'verify', 'review;verify', '']
+
+
+def test_all_matched_many_rules():
+    # more than 63 rules do not fit the bit codes and take the packed bits path
+    frame = pd.DataFrame({'s': np.arange(100, dtype=float)})
+    rule_set = [Rule(f'r{i}', f'$s >= {i}', [f'o{i}']) for i in range(70)]
+    result = evaluate_rules(frame, rule_set, 'ALL_MATCHED')
+    assert result['rule_ids'][0] == 'r0'
+    assert result['rule_ids'][5] == ';'.join(f'r{i}' for i in range(6))
+    assert result['outcomes'][99] == ';'.join(f'o{i}' for i in range(70))
+
+
+def test_no_rules_and_bad_mode(scores):
+    assert evaluate_rules(scores, [])['outcomes'].tolist() == [''] * 4
+    with pytest.raises(ValueError):
+        evaluate_rules(scores, RULE_SET, 'LAST_MATCHED')
+
+
+def test_outcome_summary(scores):
+    summary = outcome_summary(scores.assign(label=[0, 0, 1, 0]), RULE_SET, label_col='label')
+    assert summary.loc['review', 'count'] == 1
+    assert summary.loc['review', 1] == 1
+    assert summary['share'].sum() == pytest.approx(1.0)
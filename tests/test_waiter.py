@@ -0,0 +1,34 @@
+import time
+
+import pytest
+
+from afd_pipeline.waiter import Waiter, WaitFailed
+
+
+def status_of(response):
+    return response
+
+
+def test_wait_all_returns_in_order():
+    waiter = Waiter(initial_delay=0.001, max_delay=0.001)
+    polls = {'a': iter(['PENDING', 'PENDING', 'DONE']), 'b': iter(['DONE'])}
+    waits = [{'name': name, 'poll': lambda name=name: next(polls[name]), 'get_status': status_of,
+              'success': ['DONE'], 'failure': ['FAILED']} for name in ('a', 'b')]
+    assert waiter.wait_all(waits) == ['DONE', 'DONE']
+    assert sorted((r.name, r.outcome, r.polls) for r in waiter.records) == [('a', 'done', 3), ('b', 'done', 1)]
+
+
+def test_wait_all_stops_the_other_waits_on_failure():
+    waiter = Waiter(initial_delay=0.01, max_delay=0.01)
+    waits = [
+        {'name': 'slow', 'poll': lambda: 'PENDING', 'get_status': status_of, 'success': ['DONE'], 'failure': ['FAILED']},
+        {'name': 'broken', 'poll': lambda: 'FAILED', 'get_status': status_of, 'success': ['DONE'], 'failure': ['FAILED']}
+    ]
+    stime = time.monotonic()
+    with pytest.raises(WaitFailed) as e:
+        waiter.wait_all(waits)
+    assert e.value.name == 'broken'
+    # the pending wait is not waited for, and stops polling once it notices the failure
+    while len(waiter.records) < 2 and time.monotonic() - stime < 5:
+        time.sleep(0.01)
+    assert {r.name: r.outcome for r in waiter.records} == {'broken': 'failed', 'slow': 'cancelled'}